@@ -1,3 +1,4 @@
+import logging
 from flask import Flask
 
 
@@ -5,5 +6,18 @@ app = Flask(__name__, instance_relative_config=True)
 
 # Configure the app
 app.config.from_object('demitaja.default_settings.Config')
+# Override with the file named by DEMITAJA_SETTINGS, e.g. to use another database
+app.config.from_envvar('DEMITAJA_SETTINGS', silent=True)
+
+# Log messages of the app to stderr, independently of the logging
+# configured by Scrapy in the crawler process
+logger = logging.getLogger('demitaja')
+logger.setLevel(app.config['LOG_LEVEL'])
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s [%(name)s] %(levelname)s: %(message)s'))
+    logger.addHandler(handler)
+    logger.propagate = False
 
 import demitaja.views
+import demitaja.commands
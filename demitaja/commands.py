@@ -0,0 +1,300 @@
+"""Command line interface of the app (flask <command>)."""
+
+import click
+import gzip
+import json
+import sys
+import threading
+import time
+from sqlalchemy import inspect, text
+from sqlalchemy.sql.elements import TextClause
+from demitaja import app
+from demitaja.database import (db_session, engine, read_engine, init_db, upgrade_db, compress_postings,
+                               get_db_size, vacuum)
+from demitaja.utils import queries, search
+from demitaja.utils.backends import sql_backend, compare_backends
+from demitaja.utils.aliases import add_alias
+from demitaja.utils.aggregates import (definitions, counter_tables, rebuild_aggregates,
+                                       check_aggregates)
+from demitaja.utils.salaries import rebuild_salaries
+from demitaja.utils.utils import bump_data_version, create_postings, read_postings
+from demitaja.utils.synthetic import PostingGenerator
+from demitaja.utils.lookup import city_cache, tech_cache
+
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create all the tables."""
+    init_db()
+
+
+@app.cli.command('upgrade-db')
+def upgrade_db_command():
+    """Create missing tables and indexes in the existing database."""
+    indexed = not search.search_enabled() or 'postings_fts' in inspect(engine).get_table_names()
+    created = upgrade_db()
+    if created:
+        bump_data_version()
+        db_session.commit()
+    new_aggregates = [table for table in definitions if table.name in created]
+    if new_aggregates:
+        rebuild_aggregates(new_aggregates)
+        click.echo('Aggregates rebuilt: ' + ', '.join(table.name for table in new_aggregates))
+    if 'salary_histograms' in created:
+        rebuild_salaries_command.callback()
+    if not indexed:
+        rebuild_search_index_command.callback()
+
+
+@app.cli.command('compress-postings')
+def compress_postings_command():
+    """Compress bodies of the existing postings and shrink the database."""
+    if engine.dialect.name != 'sqlite':
+        click.echo('Compressing postings in place requires SQLite')
+        raise SystemExit(1)
+    size = get_db_size()
+    compressed = compress_postings()
+    vacuum()
+    click.echo('Compressed {} postings; database size {:.1f} MB -> {:.1f} MB'.format(
+        compressed, size / 2**20, get_db_size() / 2**20))
+
+
+@app.cli.command('import-postings')
+@click.argument('paths', nargs=-1, required=True, type=click.Path(allow_dash=True))
+@click.option('--batch-size', default=500, show_default=True, help='Postings per transaction.')
+def import_postings_command(paths, batch_size):
+    """Import raw postings (one JSON per line, e.g. dump of the crawler)
+    from the files (gzipped if ending with .gz; - for stdin).
+    """
+    for path in paths:
+        if path == '-':
+            lines = sys.stdin
+        elif path.endswith('.gz'):
+            lines = gzip.open(path, 'rt', encoding='utf-8')
+        else:
+            lines = open(path, encoding='utf-8')
+        invalid = []
+        with lines:
+            # postings are read and inserted one batch at a time
+            added = create_postings(read_postings(lines, invalid), batch_size=batch_size)
+        click.echo('{}: {} postings added, {} invalid lines{}'.format(
+            path, added, len(invalid), ' ' + str(invalid[:10]) if invalid else ''))
+
+
+@app.cli.command('generate-postings')
+@click.argument('count', type=int)
+@click.option('--seed', default=0, show_default=True, help='Seed of the dataset.')
+@click.option('--first', default=0, show_default=True, help='Number of the first posting.')
+@click.option('--output', '-o', default='-', type=click.File('w'), help='Output file.')
+def generate_postings_command(count, seed, first, output):
+    """Write synthetic raw postings (one JSON per line) to be imported
+    with import-postings.
+    """
+    for posting_raw in PostingGenerator(seed).generate(count, first):
+        output.write(json.dumps(posting_raw) + '\n')
+
+
+@app.cli.command('benchmark')
+@click.option('--sizes', default='1000,10000', show_default=True,
+              help='Comma separated numbers of postings at which to benchmark.')
+@click.option('--runs', default=5, show_default=True, help='Runs of each measurement.')
+@click.option('--seed', default=0, show_default=True, help='Seed of the dataset.')
+@click.option('--output', '-o', default='benchmark.json', show_default=True, type=click.Path(),
+              help='File to which the results are written (JSON).')
+@click.option('--compare', 'baseline', type=click.File(),
+              help='Results of a previous benchmark to compare with.')
+def benchmark_command(sizes, runs, seed, output, baseline):
+    """Time the queries, ingest and endpoints on a growing synthetic
+    dataset. Requires an empty database, e.g. set DEMITAJA_SETTINGS to
+    a config file with its own DB_URL.
+    """
+    from demitaja.models import Posting
+    from demitaja.utils.benchmark import Benchmark, get_metadata, compare
+    init_db()
+    if db_session.query(Posting.id).first() is not None:
+        click.echo('The database is not empty')
+        raise SystemExit(1)
+    # statements logged by echo would dominate the timings
+    echo = engine.echo, read_engine.echo
+    engine.echo = read_engine.echo = False
+    try:
+        benchmark = Benchmark(PostingGenerator(seed), runs=runs)
+        results = benchmark.run([int(size) for size in sizes.split(',')], app.test_client())
+    finally:
+        engine.echo, read_engine.echo = echo
+    with open(output, 'w') as f:
+        json.dump({'metadata': get_metadata(), 'results': results}, f, indent=1)
+    click.echo('Results written to ' + output)
+    if baseline:
+        click.echo('{:>9} {:<9} {:<60} {:>10} {:>10} {:>6}'.format(
+            'size', 'kind', 'name', 'baseline', 'median', 'ratio'))
+        for size, kind, name, old, new, ratio in compare(results, json.load(baseline)['results']):
+            click.echo('{:>9} {:<9} {:<60} {:10.2f} {:10.2f} {:6.2f}{}'.format(
+                size, kind, name, old, new, ratio, ' !' if ratio > 1.2 else ''))
+
+
+@app.cli.command('add-alias')
+@click.argument('item_type', type=click.Choice(['city', 'tech']))
+@click.argument('alias')
+@click.argument('name')
+def add_alias_command(item_type, alias, name):
+    """Register ALIAS of the city or technology NAME. If ALIAS is an
+    existing city or technology, merge it into NAME: its postings and
+    aliases are moved to NAME in one transaction with the rebuilt
+    aggregates. Run when the crawler is not running; the web app picks
+    up the change with the next data version.
+    """
+    try:
+        merged = add_alias(item_type, alias, name)
+    except ValueError as err:
+        db_session.rollback()
+        click.echo(str(err))
+        raise SystemExit(1)
+    if merged:
+        rebuild_aggregates(commit=False)
+        rebuild_salaries(commit=False)
+    # the merge, aggregates and salaries are committed together
+    db_session.commit()
+    if merged:
+        click.echo('Merged {} into {}'.format(alias, name))
+    city_cache.invalidate()
+    tech_cache.invalidate()
+    click.echo('Added alias {} of {}'.format(alias, name))
+
+
+@app.cli.command('rebuild-aggregates')
+def rebuild_aggregates_command():
+    """Recompute the aggregate tables from scratch."""
+    # committed with the aggregates
+    bump_data_version()
+    rebuild_aggregates()
+    click.echo('Aggregates rebuilt')
+
+
+@app.cli.command('recount')
+def recount_command():
+    """Recompute the posting counters (total, per technology and per
+    city) from scratch; much faster than rebuild-aggregates.
+    """
+    bump_data_version()
+    rebuild_aggregates(counter_tables)
+    click.echo('Counters rebuilt')
+
+
+@app.cli.command('rebuild-salaries')
+def rebuild_salaries_command():
+    """Normalize the salaries and recompute the salary histograms."""
+    bump_data_version()
+    rebuild_salaries()
+    click.echo('Salaries rebuilt')
+
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Index all the postings for the full-text search."""
+    if not search.search_enabled():
+        click.echo('Full-text search requires SQLite')
+        raise SystemExit(1)
+    bump_data_version()
+    search.rebuild_index()
+    click.echo('Search index rebuilt')
+
+
+@app.cli.command('check-aggregates')
+def check_aggregates_command():
+    """Compare the aggregate tables with the association tables."""
+    errors = check_aggregates()
+    for name, count in sorted(errors.items()):
+        click.echo('{}: {} rows differ'.format(name, count))
+    if errors:
+        raise SystemExit(1)
+    click.echo('Aggregates are consistent')
+
+
+@app.cli.command('check-plans')
+def check_plans_command():
+    """Check that each query in demitaja.utils.queries uses indexes.
+    SQLite only: prints EXPLAIN QUERY PLAN of every query and exits
+    with status 1 if any of them scans a table without an index.
+    """
+    full_scans = 0
+    for name, query in sorted(vars(queries).items()):
+        if not isinstance(query, TextClause):
+            continue
+        binds = query.compile().binds
+        params = {key: [''] if bind.expanding else '' for key, bind in binds.items()}
+        explain = text('EXPLAIN QUERY PLAN ' + query.text).bindparams(
+            *[bind for bind in binds.values() if bind.expanding])
+        plan = db_session.execute(explain, params).fetchall()
+        # last column of each row holds the description of the step
+        steps = [row[-1] for row in plan]
+        # SCAN CONSTANT ROW is the single row of a SELECT without FROM
+        scans = [step for step in steps if step.startswith('SCAN') and 'INDEX' not in step
+                 and step != 'SCAN CONSTANT ROW']
+        full_scans += len(scans)
+        click.echo('{}: {}'.format(name, 'FULL SCAN' if scans else 'ok'))
+        for step in steps:
+            click.echo('    ' + step)
+    if full_scans:
+        raise SystemExit(1)
+
+
+@app.cli.command('check-concurrent-reads')
+@click.option('--seconds', default=5.0, help='Duration of the write transaction [s].')
+@click.option('--max-read', default=1.0, help='Max duration of a request [s].')
+def check_concurrent_reads_command(seconds, max_read):
+    """Check that the web tier keeps reading during a long ingest
+    transaction. Holds a write transaction rewriting all the postings
+    (rolled back at the end) while the dashboard is requested over and
+    over; exits with status 1 if any request fails or takes longer than
+    max-read.
+    """
+    from demitaja.views import chart_cache
+    durations, errors = [], []
+
+    def read():
+        client = app.test_client()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            chart_cache.clear()
+            start = time.perf_counter()
+            response = client.get('/api/dashboard?format=data')
+            durations.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    with engine.connect() as conn:
+        transaction = conn.begin()
+        if engine.dialect.name == 'sqlite':
+            # small page cache makes the transaction spill changes into the
+            # database file, as large ingest transactions do
+            conn.execute(text('PRAGMA cache_size=-64'))
+        updated = conn.execute(text('UPDATE postings SET scraped=scraped+1')).rowcount
+        reader = threading.Thread(target=read)
+        reader.start()
+        reader.join()
+        transaction.rollback()
+    click.echo('{} postings locked by the write transaction for {:.1f} s'.format(updated, seconds))
+    click.echo('{} requests: {} failed, max {:.3f} s, median {:.3f} s'.format(
+        len(durations), len(errors), max(durations, default=0),
+        sorted(durations)[len(durations) // 2] if durations else 0))
+    if errors or not durations or max(durations) > max_read:
+        raise SystemExit(1)
+    click.echo('Reads continue during writes')
+
+
+@app.cli.command('compare-backends')
+def compare_backends_command():
+    """Check that the SQL backend and the analytics engine return
+    identical results for every query.
+    """
+    from demitaja.utils.engine import AnalyticsEngine
+    analytics = AnalyticsEngine()
+    analytics.load()
+    differences = compare_backends(sql_backend, analytics)
+    for name, params, result, other_result in differences:
+        click.echo('{}({}):\n    sql:   {}\n    numpy: {}'.format(
+            name, params, result, other_result))
+    if differences:
+        raise SystemExit(1)
+    click.echo('Backends return identical results')
@@ -1,65 +1,189 @@
+import argparse
+import logging
 import scrapy
 import json
 import time
-from urllib.parse import urljoin
+from email.utils import formatdate
+from urllib.parse import urljoin, urlencode
+from scrapy import signals
 from scrapy.crawler import CrawlerProcess
-from demitaja.utils.utils import create_posting, get_posting
+from demitaja import app
+from demitaja.crawlers.dedup import load_known_postings
+from demitaja.crawlers.state import get_last_crawls, set_last_crawl
+from demitaja.utils.lookup import city_cache, tech_cache
+from demitaja.utils.metrics import metrics
+from demitaja.utils.utils import extract_posting
+
+
+logger = logging.getLogger(__name__)
 
 
 class FluffSpider(scrapy.Spider):
+    """This class defines spider crawling the postings found by searches
+    of the given categories, each with the same additional criteria,
+    e.g. categories 'backend,frontend' and criteria 'city=krakow'.
+    Raw data of the crawled postings can be appended to a dump file
+    (one JSON per line) to be imported later with flask import-postings.
+    The searches are crawled concurrently. Search results are requested
+    only if modified since the last complete crawl of the search and only
+    postings which are not in the database yet are requested.
+    Attributes:
+        categories (str): comma separated categories; FLUFF_CATEGORIES
+            setting by default
+        criteria (str): additional search criteria; FLUFF_CRITERIA
+            setting by default
+        dump_path (str): path of the dump file; FLUFF_DUMP setting
+            by default, no dump if empty
+        dump (file): the open dump file or None
+        started (int): timestamp of the start of the crawl
+        last_crawls (dict): criteria of each search -> timestamp of its
+            last complete crawl
+        failed_searches (set): criteria of the searches whose results
+            or postings could not be downloaded
+    """
     name = "quotes"
+    # not modified search results are handled by parse
+    handle_httpstatus_list = [304]
+    categories = None
+    criteria = None
+    dump_path = None
+    dump = None
     custom_settings = {
         'AUTOTHROTTLE_ENABLED': True,
-        'AUTOTHROTTLE_DEBUG': True
+        'AUTOTHROTTLE_DEBUG': True,
+        # postings are saved by the writer thread of the pipeline
+        'ITEM_PIPELINES': {'demitaja.crawlers.pipelines.PostingWriterPipeline': 300},
+        'POSTING_WRITER_QUEUE_SIZE': 1000,
+        'POSTING_WRITER_BATCH_SIZE': 100,
+        'POSTING_WRITER_FLUSH_INTERVAL': 1.0,
+        'FLUFF_CATEGORIES': ['backend'],
+        'FLUFF_CRITERIA': '',
+        'FLUFF_DUMP': ''
     }
     base_url = 'https://nofluffjobs.com'
 
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(FluffSpider, cls).from_crawler(crawler, *args, **kwargs)
+        crawler.signals.connect(spider.spider_opened, signal=signals.spider_opened)
+        return spider
+
+    def spider_opened(self, spider):
+        """Load web ids of the postings which are already in the database"""
+        self.known_postings = load_known_postings()
+        logger.info('Known postings: %s', len(self.known_postings))
+        dump_path = self.dump_path or self.crawler.settings.get('FLUFF_DUMP')
+        if dump_path:
+            self.dump = open(dump_path, 'a', encoding='utf-8')
+
+    def get_searches(self):
+        """Return list of criteria of the searches to be crawled"""
+        settings = self.crawler.settings
+        categories = self.categories.split(',') if self.categories else \
+            settings.getlist('FLUFF_CATEGORIES')
+        criteria = self.criteria if self.criteria is not None else settings.get('FLUFF_CRITERIA')
+        return ['category={} {}'.format(category.strip(), criteria).strip()
+                for category in categories if category.strip()]
+
     def start_requests(self):
-        urls = [
-            urljoin(FluffSpider.base_url, 'api/search/posting?criteria=category%3Dbackend')
-            ]
-        for url in urls:
-            yield scrapy.Request(url=url, callback=self.parse)
+        self.started = int(time.time())
+        self.failed_searches = set()
+        self.searches = self.get_searches()
+        self.last_crawls = get_last_crawls(self.searches)
+        for search in self.searches:
+            url = urljoin(FluffSpider.base_url, 'api/search/posting?' + urlencode({'criteria': search}))
+            headers = {}
+            if search in self.last_crawls:
+                headers['If-Modified-Since'] = formatdate(self.last_crawls[search], usegmt=True)
+            # search results change between crawls, so never filter them as seen
+            yield scrapy.Request(url=url, callback=self.parse, errback=self.download_failed,
+                                 headers=headers, meta={'search': search}, dont_filter=True)
 
     def parse(self, response):
         """Parse basic data on all the postings and create requests for
         those which are seen for the first time by the app.
         """
-        for posting in json.loads(response.text)['postings']:
-            if not get_posting(posting['id']):
-                url = urljoin(FluffSpider.base_url, 'api/postingNew/' + posting['id'])
-                yield scrapy.Request(url, callback=self.parse_posting)
-                # break
+        if response.status == 304:
+            logger.info('Not modified since the last crawl: %s', response.meta['search'])
+            return
+        web_ids = [posting['id'] for posting in json.loads(response.text)['postings']]
+        for web_id in self.known_postings.get_new(web_ids):
+            url = urljoin(FluffSpider.base_url, 'api/postingNew/' + web_id)
+            yield scrapy.Request(url, callback=self.parse_posting, errback=self.download_failed,
+                                 meta={'search': response.meta['search']})
 
     def parse_posting(self, response):
-        """Parse full text of the posting and make a new posting
-        entry in the database.
+        """Parse full text of the posting and yield the posting
+        to be saved in the database by the item pipeline.
         """
         try:
             posting_raw = json.loads(response.text)
-            posting = {
-                'web_id': posting_raw['id'],
-                'title': posting_raw['title'],
-                'posted': int(posting_raw['posted']/1000),
-                'scraped': int(time.time()),
-                'text': json.dumps(posting_raw),
-                'salaries': posting_raw['essentials']['salary']['types'],
-                'salary_currency': posting_raw['essentials']['salary']['currency'],
-                'salary_period': posting_raw['essentials']['salary']['period'],
-                'cities': [loc['city'] for loc in posting_raw['location']['places']],
-                'techs_must': [must['value'] for must in posting_raw['requirements']['musts']
-                               if must['type'] == 'main'],
-                'techs_nice': [nice['value'] for nice in posting_raw['requirements']['nices']
-                               if nice['type'] == 'main']
-            }
-            create_posting(posting)
+            posting = extract_posting(posting_raw)
+            if self.dump:
+                self.dump.write(json.dumps(posting_raw) + '\n')
+            self.known_postings.add(posting['web_id'])
+            yield posting
         except KeyError as err:
-            print('Missing posting data:', err)
+            logger.warning('Missing posting data: %s', err)
+        except TypeError as err:
+            logger.warning('Invalid posting data: %s', err)
 
+    def download_failed(self, failure):
+        """Mark search of the failed request as incomplete, so that it is
+        crawled in full next time
+        """
+        search = failure.request.meta.get('search')
+        self.failed_searches.add(search)
+        logger.warning('Download failed (search %s): %s', search, failure.value)
 
-def main():
-    process = CrawlerProcess({
+    def closed(self, reason):
+        """Record complete crawl of the searches, report efficiency of the
+        city and technology caches and write the metrics to METRICS_TEXTFILE.
+        A search is complete if all its downloads succeeded and the
+        writer saved all the postings; otherwise postings missed by the
+        crawl would be skipped by the next one.
+        """
+        if reason == 'finished' and getattr(self, 'searches', None):
+            # pipelines are closed before the spider
+            failed = self.crawler.stats.get_value('posting_writer/postings_failed', 0)
+            complete = [search for search in self.searches
+                        if search not in self.failed_searches] if not failed else []
+            if complete:
+                set_last_crawl(complete, self.started)
+            if len(complete) < len(self.searches):
+                logger.warning('Incomplete crawl of %s searches (%s postings not saved)',
+                               len(self.searches) - len(complete), failed)
+        if self.dump:
+            self.dump.close()
+        logger.info('City cache: %s', city_cache.stats())
+        logger.info('Technology cache: %s', tech_cache.stats())
+        if app.config['METRICS_TEXTFILE']:
+            metrics.write(app.config['METRICS_TEXTFILE'])
+
+
+def main(args=None):
+    """Crawl the postings.
+
+    With --jobdir, requests pending when the crawl is interrupted
+    (e.g. with a single Ctrl-C) are saved in the directory and the crawl
+    resumes when started again with the same directory.
+    """
+    parser = argparse.ArgumentParser(description='Crawl job postings.')
+    parser.add_argument('--categories', help='comma separated categories, e.g. backend,frontend')
+    parser.add_argument('--criteria', help="additional search criteria, e.g. 'city=krakow'")
+    parser.add_argument('--jobdir', help='directory persisting state of the crawl')
+    parser.add_argument('--dump', help='file to which raw data of the crawled postings is appended')
+    args = parser.parse_args(args)
+    settings = {
         'USER_AGENT': 'Mozilla/4.0 (compatible; MSIE 7.0; Windows NT 5.1)'
-    })
-    process.crawl(FluffSpider)
+    }
+    if args.jobdir:
+        settings['JOBDIR'] = args.jobdir
+    process = CrawlerProcess(settings)
+    process.crawl(FluffSpider, categories=args.categories, criteria=args.criteria,
+                  dump_path=args.dump)
     process.start()
+
+
+if __name__ == '__main__':
+    main()
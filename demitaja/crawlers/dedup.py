@@ -0,0 +1,100 @@
+"""In-memory sets of postings already stored in the database."""
+
+import hashlib
+import math
+from demitaja import app
+from demitaja.utils.utils import count_postings, get_known_web_ids, get_posting_web_ids
+
+
+class BloomFilter(object):
+    """This class defines a Bloom filter of strings: a compact set which
+    may report a small fraction of non-members as members but never
+    misses a member.
+    Attributes:
+        size (int): number of bits in the filter
+        hashes (int): number of bits set per member
+        bits (bytearray): bit array of the filter
+        count (int): number of members added
+    """
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, item):
+        """Yield positions of the bits of the item (double hashing)"""
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item):
+        for pos in self.positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self.positions(item))
+
+    def __len__(self):
+        return self.count
+
+
+class KnownPostings(object):
+    """This class defines set of the web ids of the postings which are
+    already in the database or were seen during the crawl. Stored web ids
+    are kept in a set or, above KNOWN_POSTINGS_BLOOM_THRESHOLD postings,
+    in a Bloom filter whose positives are confirmed in the database, so
+    that a false positive never makes a new posting skipped.
+    Attributes:
+        stored (set or BloomFilter): web ids of the stored postings
+        exact (bool): True if stored is a set
+        seen (set): web ids added during the crawl
+        confirmed (int): number of Bloom filter positives looked up
+            in the database
+    """
+    def __init__(self, stored, exact):
+        self.stored = stored
+        self.exact = exact
+        self.seen = set()
+        self.confirmed = 0
+
+    def add(self, web_id):
+        self.seen.add(web_id)
+
+    def get_new(self, web_ids):
+        """Return list of the web ids which are not known, in their order;
+        Bloom filter positives are checked with a single query
+        """
+        candidates = [web_id for web_id in web_ids if web_id not in self.seen]
+        if self.exact:
+            return [web_id for web_id in candidates if web_id not in self.stored]
+        positives = {web_id for web_id in candidates if web_id in self.stored}
+        self.confirmed += len(positives)
+        stored = get_known_web_ids(positives)
+        return [web_id for web_id in candidates if web_id not in stored]
+
+    def __contains__(self, web_id):
+        return not self.get_new([web_id])
+
+    def __len__(self):
+        return len(self.stored) + len(self.seen)
+
+
+def load_known_postings():
+    """Load web ids of all the postings in the database.
+
+    Returns KnownPostings keeping the web ids in a set or, if there are
+    more postings than KNOWN_POSTINGS_BLOOM_THRESHOLD, in a Bloom filter
+    sized for twice as many postings. The web ids are streamed from the
+    database, so that the filter is the only copy kept in memory.
+    """
+    count = count_postings()
+    if count <= app.config['KNOWN_POSTINGS_BLOOM_THRESHOLD']:
+        return KnownPostings(set(get_posting_web_ids()), exact=True)
+    known = BloomFilter(2 * count, app.config['KNOWN_POSTINGS_ERROR_RATE'])
+    for web_id in get_posting_web_ids():
+        known.add(web_id)
+    return KnownPostings(known, exact=False)
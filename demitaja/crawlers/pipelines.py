@@ -0,0 +1,176 @@
+"""Item pipelines of the crawlers."""
+
+import logging
+import threading
+import time
+from queue import Queue, Full, Empty
+from twisted.internet import defer, reactor, threads
+from demitaja.database import db_session
+from demitaja.utils.utils import commit_batch
+
+
+logger = logging.getLogger(__name__)
+
+# Sentinel telling the writer thread to stop
+STOP = object()
+
+
+class PostingWriterPipeline(object):
+    """This class defines pipeline saving the postings yielded by the
+    spider to the database in a dedicated writer thread, so that the
+    reactor never waits for the database. Postings are passed to the
+    thread through a bounded queue and inserted in batches. When the queue
+    is full, new postings wait outside of it and the spider is slowed down
+    until the writer catches up.
+    Attributes:
+        queue_size (int): max number of postings waiting for the writer
+        batch_size (int): max number of postings per transaction
+        flush_interval (float): max time a posting waits for the rest
+            of its batch [s]
+        queue (Queue): postings waiting for the writer
+        waiting (list): tuples (posting, deferred) of the postings which
+            did not fit into the queue
+        added (int): number of postings added to the database
+        failed (int): number of postings which could not be saved
+        write_time (float): total time spent writing the batches [s]
+    """
+    def __init__(self, queue_size=1000, batch_size=100, flush_interval=1.0, stats=None):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats = stats
+        self.queue = Queue(queue_size)
+        self.waiting = []
+        self.added = 0
+        self.failed = 0
+        self.write_time = 0.0
+        self.thread = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(queue_size=settings.getint('POSTING_WRITER_QUEUE_SIZE', 1000),
+                   batch_size=settings.getint('POSTING_WRITER_BATCH_SIZE', 100),
+                   flush_interval=settings.getfloat('POSTING_WRITER_FLUSH_INTERVAL', 1.0),
+                   stats=crawler.stats)
+
+    def open_spider(self, spider):
+        self.thread = threading.Thread(target=self.run, name='posting-writer', daemon=True)
+        self.thread.start()
+
+    def process_item(self, item, spider):
+        """Queue posting for the writer. Return the posting or, if the
+        queue is full, deferred fired when the posting gets into the queue.
+        """
+        if not self.waiting:
+            try:
+                self.queue.put_nowait(item)
+                return item
+            except Full:
+                pass
+        d = defer.Deferred()
+        self.waiting.append((item, d))
+        return d
+
+    def release(self):
+        """Move waiting postings into the queue; runs in the reactor thread"""
+        while self.waiting:
+            item, d = self.waiting[0]
+            try:
+                self.queue.put_nowait(item)
+            except Full:
+                return
+            self.waiting.pop(0)
+            d.callback(item)
+
+    def close_spider(self, spider):
+        """Save the remaining postings and stop the writer.
+        Return deferred fired when the writer is done.
+        """
+        return threads.deferToThread(self.stop)
+
+    def stop(self):
+        # never wait for room in the queue if the writer is gone
+        while self.thread.is_alive():
+            try:
+                self.queue.put(STOP, timeout=1)
+                break
+            except Full:
+                pass
+        self.thread.join()
+        logger.info('Posting writer: %s postings added, %s failed, %.1f postings/s while writing',
+                    self.added, self.failed, self.added / self.write_time if self.write_time else 0)
+
+    ##########
+    # Writer #
+    ##########
+
+    def run(self):
+        """Insert postings from the queue in batches until stopped"""
+        try:
+            stop = False
+            while not stop:
+                batch, stop = self.get_batch()
+                # let the waiting postings into the freed queue
+                reactor.callFromThread(self.release)
+                if batch:
+                    try:
+                        self.write(batch)
+                    except Exception:
+                        # the writer must outlive any bad batch, or the
+                        # spider waits forever for room in the queue
+                        db_session.rollback()
+                        logger.exception('Posting writer: batch of %s postings failed', len(batch))
+                        self.failed += len(batch)
+                        self.inc_stat('postings_failed', len(batch))
+        finally:
+            db_session.remove()
+
+    def get_batch(self):
+        """Take up to batch_size postings from the queue, waiting at most
+        flush_interval for more postings after the first one.
+        Return list of postings and True if the writer is to stop.
+        """
+        item = self.queue.get()
+        if item is STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=timeout)
+            except Empty:
+                break
+            if item is STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def write(self, batch):
+        """Insert batch; if the batch fails, insert its postings one by one
+        so that only the bad postings are lost.
+        """
+        start = time.perf_counter()
+        added = commit_batch(batch)
+        if added is None:
+            added = 0
+            for item in batch:
+                item_added = commit_batch([item])
+                if item_added is None:
+                    self.failed += 1
+                    self.inc_stat('postings_failed')
+                else:
+                    added += item_added
+        elapsed = time.perf_counter() - start
+        self.write_time += elapsed
+        self.added += added
+        self.inc_stat('postings_added', added)
+        logger.debug('Posting writer: batch of %s postings written in %.3f s, %s queued',
+                     len(batch), elapsed, self.queue.qsize())
+
+    def inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value('posting_writer/' + key, count)
@@ -0,0 +1,22 @@
+"""Crawl state persisted between the runs of the crawler."""
+
+from demitaja.database import db_session
+from demitaja.models import crawl_state
+
+
+def get_last_crawls(searches):
+    """Return dict mapping criteria of each search to timestamp of its
+    last complete crawl; searches never crawled are omitted.
+    """
+    rows = db_session.execute(crawl_state.select().where(
+        crawl_state.c.criteria.in_(searches))).fetchall()
+    db_session.commit()
+    return {row[0]: row[1] for row in rows}
+
+
+def set_last_crawl(searches, timestamp):
+    """Record complete crawl of the searches started at the timestamp"""
+    db_session.execute(crawl_state.delete().where(crawl_state.c.criteria.in_(searches)))
+    db_session.execute(crawl_state.insert(),
+                       [{'criteria': search, 'last_crawl': timestamp} for search in searches])
+    db_session.commit()
@@ -1,15 +1,100 @@
 """Database settings."""
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
+import logging
+from urllib.parse import quote
+from flask import has_request_context
+from sqlalchemy import bindparam, create_engine, event, inspect, text
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, scoped_session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from demitaja import app
+from demitaja.utils.metrics import instrument_engine
 
 
-engine = create_engine(app.config['DB_URL'], echo=True)
+logger = logging.getLogger(__name__)
+
+
+def get_read_url(url):
+    """Return URL of the database for the web tier: DB_READ_URL if set,
+    otherwise read-only URL of the SQLite database file, or None if the
+    web tier uses the write engine.
+    """
+    if app.config['DB_READ_URL']:
+        return app.config['DB_READ_URL']
+    url = make_url(url)
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:') \
+            or url.database.startswith('file:'):
+        return None
+    return 'sqlite:///file:{}?mode=ro&uri=true'.format(quote(url.database))
+
+
+def get_engine(url, read_only=False):
+    """Create engine configured by the DB_* and SQLITE_* settings"""
+    url = make_url(url)
+    options = {'echo': app.config['SQL_ECHO']}
+    if url.get_backend_name() == 'sqlite':
+        # wait for locks held by other connections instead of failing at once
+        options['connect_args'] = {'timeout': app.config['SQLITE_BUSY_TIMEOUT']}
+    else:
+        options.update(pool_size=app.config['DB_POOL_SIZE'],
+                       max_overflow=app.config['DB_MAX_OVERFLOW'],
+                       pool_pre_ping=app.config['DB_POOL_PRE_PING'],
+                       pool_recycle=app.config['DB_POOL_RECYCLE'])
+    new_engine = create_engine(url, **options)
+    if url.get_backend_name() == 'sqlite' and not read_only:
+        event.listen(new_engine, 'connect', disable_implicit_begin)
+        event.listen(new_engine, 'begin', begin_transaction)
+        if app.config['SQLITE_WAL']:
+            event.listen(new_engine, 'connect', set_wal_mode)
+    instrument_engine(new_engine)
+    return new_engine
+
+
+def disable_implicit_begin(dbapi_connection, connection_record):
+    """Stop pysqlite from emitting BEGIN only before the first DML
+    statement; see begin_transaction
+    """
+    dbapi_connection.isolation_level = None
+
+
+def begin_transaction(conn):
+    """Emit BEGIN when SQLAlchemy begins a transaction, so that a SAVEPOINT
+    (e.g. inserting new cities) is nested in the transaction and rolled
+    back with it instead of committed on its RELEASE
+    """
+    conn.execute(text('BEGIN'))
+
+
+def set_wal_mode(dbapi_connection, connection_record):
+    """Switch SQLite database to WAL mode so that readers do not block the
+    writer and the writer does not block the readers
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    # durable enough in WAL mode and much faster than FULL
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+
+class RoutingSession(Session):
+    """This class defines session using the read engine while handling
+    web requests, which only read, and the write engine otherwise
+    (crawler, commands).
+    """
+    def get_bind(self, *args, **kwargs):
+        if has_request_context():
+            return read_engine
+        return engine
+
+
+# Engines writing (crawler, commands) and reading (web tier)
+engine = get_engine(app.config['DB_URL'])
+read_url = get_read_url(app.config['DB_URL'])
+read_engine = get_engine(read_url, read_only=True) if read_url else engine
 db_session = scoped_session(sessionmaker(autocommit=False,
                                          autoflush=False,
-                                         bind=engine))
+                                         class_=RoutingSession))
 
 Base = declarative_base()
 Base.query = db_session.query_property()
@@ -19,4 +104,122 @@ def init_db():
     """Initialize database."""
     import demitaja.models
     Base.metadata.create_all(bind=engine)
-    print('Done!')
+    logger.info('Done!')
+
+
+# Indexes of older versions replaced by other indexes, e.g. by the
+# (count DESC, id) indexes of the counters; upgrade_db drops them so that
+# inserts do not maintain both
+superseded_indexes = {
+    'tech_counts': ['ix_tech_counts_count'],
+    'city_counts': ['ix_city_counts_count']
+}
+
+
+def upgrade_db():
+    """Upgrade existing database in place.
+    Create missing tables, columns and indexes; drop duplicate rows of the
+    association tables so that their unique indexes can be created and
+    drop the superseded indexes.
+    Return names of the created tables (list).
+    """
+    import demitaja.models
+    existing = set(inspect(engine).get_table_names())
+    created = [table.name for table in Base.metadata.sorted_tables
+               if table.name not in existing]
+    Base.metadata.create_all(bind=engine)
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if table.name in created:
+            continue
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                add_column(table, column)
+    for table in Base.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for name in superseded_indexes.get(table.name, []):
+            if name in existing:
+                with engine.begin() as conn:
+                    conn.execute(text('DROP INDEX IF EXISTS ' + name))
+                logger.info('Dropped index %s', name)
+        missing = [index for index in table.indexes if index.name not in existing]
+        if not missing:
+            continue
+        if not table.primary_key:
+            remove_duplicates(table)
+        for index in missing:
+            try:
+                index.create(bind=engine)
+                logger.info('Created index %s', index.name)
+            except IntegrityError:
+                logger.warning('Could not create index %s: table %s has duplicate values',
+                               index.name, table.name)
+    logger.info('Done!')
+    return created
+
+
+def add_column(table, column):
+    """Add nullable column to an existing table"""
+    with engine.begin() as conn:
+        conn.execute(text('ALTER TABLE {} ADD COLUMN {} {}'.format(
+            table.name, column.name, column.type.compile(dialect=engine.dialect))))
+    logger.info('Added column %s.%s', table.name, column.name)
+
+
+def remove_duplicates(table):
+    """Remove duplicate rows from a table without primary key"""
+    columns = table.c.keys()
+    with engine.begin() as conn:
+        rows = conn.execute(text('SELECT DISTINCT {} FROM {}'.format(
+            ', '.join(columns), table.name))).fetchall()
+        count = conn.execute(text('SELECT COUNT(*) FROM ' + table.name)).scalar()
+        if count > len(rows):
+            conn.execute(table.delete())
+            conn.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+            logger.info('Removed %s duplicate rows from %s', count - len(rows), table.name)
+
+
+def compress_postings(batch_size=1000):
+    """Compress bodies of the postings stored before they were compressed.
+    Return number of compressed postings (int).
+    """
+    from demitaja.models import Posting
+    postings = Posting.__table__
+    # the body passes through CompressedText which compresses it
+    update = postings.update().where(postings.c.id == bindparam('posting_id')).values(
+        text=bindparam('body'))
+    compressed = 0
+    last_id = 0
+    while True:
+        # read raw values to tell the uncompressed ones
+        rows = db_session.execute(text(
+            'SELECT id, text FROM postings WHERE id>:last_id ORDER BY id LIMIT :limit'),
+            {'last_id': last_id, 'limit': batch_size}).fetchall()
+        if not rows:
+            break
+        rows_str = [{'posting_id': row[0], 'body': row[1]} for row in rows if isinstance(row[1], str)]
+        if rows_str:
+            db_session.execute(update, rows_str)
+            db_session.commit()
+            compressed += len(rows_str)
+        last_id = rows[-1][0]
+    return compressed
+
+
+def get_db_size():
+    """Return size of the SQLite database in bytes (int)"""
+    with engine.connect() as conn:
+        page_count = conn.execute(text('PRAGMA page_count')).scalar()
+        page_size = conn.execute(text('PRAGMA page_size')).scalar()
+    return page_count * page_size
+
+
+def vacuum():
+    """Rebuild the SQLite database file to release the free pages"""
+    # VACUUM cannot run in the transaction begun by the engine
+    conn = engine.raw_connection()
+    try:
+        conn.cursor().execute('VACUUM')
+    finally:
+        conn.close()
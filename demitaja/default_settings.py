@@ -5,7 +5,75 @@ class Config(object):
     DEBUG = False
     DB_URL = 'sqlite:///' + pkg_resources.resource_filename(
         'demitaja', 'data/demitaja.db')
+    # Database of the web tier, which only reads; by default DB_URL
+    # opened read-only
+    DB_READ_URL = None
+    # Connection pool of the server databases (e.g. PostgreSQL): number of
+    # kept connections, max number of extra connections, checking of the
+    # connections before use and max age of a connection [s]
+    DB_POOL_SIZE = 5
+    DB_MAX_OVERFLOW = 10
+    DB_POOL_PRE_PING = True
+    DB_POOL_RECYCLE = 3600
+    # SQLite: WAL mode lets the web tier read while the crawler writes;
+    # max time a connection waits for a lock [s]
+    SQLITE_WAL = True
+    SQLITE_BUSY_TIMEOUT = 30
     APP_URL = 'http://localhost:5000'
+    # Level of the app's log messages and whether SQL statements are logged
+    LOG_LEVEL = 'INFO'
+    SQL_ECHO = False
+    # Add Server-Timing header (SQL, chart rendering and total time) to
+    # the responses; metrics are served at /metrics in any case
+    SERVER_TIMING = False
+    # File to which the crawler writes its metrics when it finishes, e.g.
+    # for the textfile collector of the Prometheus node exporter
+    METRICS_TEXTFILE = None
+    # Cache-Control of the pages and API responses, which carry ETag and
+    # Last-Modified of the data version; e.g. 'public, max-age=300' lets
+    # a reverse proxy serve repeat views for 5 minutes
+    CACHE_CONTROL = 'no-cache'
+    # Backend answering the chart queries: 'sql' or 'numpy'
+    # (in-memory analytics engine, requires numpy)
+    QUERY_BACKEND = 'sql'
+    # Rendered charts cache: max number of charts and their total size
+    # kept in memory, and optional directory shared between processes
+    CHART_CACHE_ENTRIES = 256
+    CHART_CACHE_BYTES = 64 * 1024 * 1024
+    CHART_CACHE_DIR = None
+    # Chart rendering pool: number of worker processes (0 renders charts
+    # in the request thread), max number of queued charts and timeout [s]
+    CHART_WORKERS = 2
+    CHART_QUEUE_SIZE = 16
+    CHART_TIMEOUT = 10
+    # Default and max resolution of the png charts
+    CHART_DPI = 300
+    CHART_MAX_DPI = 600
+    # Max number of buckets of a trend
+    TREND_MAX_BUCKETS = 1000
+    # Salaries are normalized to monthly salaries in SALARY_CURRENCY using
+    # value of each currency in SALARY_CURRENCY and number of each period
+    # in a month; run flask rebuild-salaries after changing them
+    SALARY_CURRENCY = 'PLN'
+    SALARY_EXCHANGE_RATES = {'PLN': 1.0, 'EUR': 4.3, 'USD': 3.9, 'GBP': 4.9, 'CHF': 4.3}
+    SALARY_PERIODS = {'hour': 168, 'day': 21, 'week': 4.33, 'month': 1, 'year': 1 / 12}
+    # Max relative error of the salary percentiles; run flask
+    # rebuild-salaries after changing it
+    SALARY_HISTOGRAM_ERROR = 0.01
+    # Default and max number of postings per page of the search results
+    SEARCH_PER_PAGE = 20
+    SEARCH_MAX_PER_PAGE = 100
+    # Max number of technologies and of cities compared by /api/compare
+    COMPARE_MAX_ITEMS = 10
+    # Max number of suggestions of /api/suggest; min trigram similarity of
+    # a suggested name and of a name substituted for an unknown one
+    SUGGEST_LIMIT = 10
+    SUGGEST_MIN_SIMILARITY = 0.3
+    DID_YOU_MEAN_MIN_SIMILARITY = 0.4
+    # Crawler keeps web ids of known postings in a set up to this size
+    # and in a Bloom filter with the given false positive rate above it
+    KNOWN_POSTINGS_BLOOM_THRESHOLD = 1000000
+    KNOWN_POSTINGS_ERROR_RATE = 1e-6
 
 
 class DevelopmentConfig(Config):
@@ -1,15 +1,38 @@
 """SQLAlchemy model and table definitions."""
 
-from sqlalchemy import Table, Column, ForeignKey, Integer, String
-from sqlalchemy.orm import relationship
+import zlib
+from sqlalchemy import DDL, Table, Column, ForeignKey, Index, Integer, LargeBinary, String, event
+from sqlalchemy.orm import deferred, relationship
+from sqlalchemy.types import TypeDecorator
 from demitaja.database import Base
 
 
+class CompressedText(TypeDecorator):
+    """This class defines text column stored compressed with zlib.
+    Values stored uncompressed before the column was compressed
+    are returned as they are.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.compress(value.encode('utf-8'))
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, str):
+            return value
+        return zlib.decompress(value).decode('utf-8')
+
+
 postings_cities_assoc = Table(
     'postings_cities',
     Base.metadata,
     Column('posting_id', Integer, ForeignKey('postings.id')),
-    Column('city_id', Integer, ForeignKey('cities.id'))
+    Column('city_id', Integer, ForeignKey('cities.id')),
+    Index('ix_postings_cities_posting_id_city_id', 'posting_id', 'city_id', unique=True),
+    Index('ix_postings_cities_city_id_posting_id', 'city_id', 'posting_id')
 )
 
 
@@ -17,7 +40,9 @@ postings_must_assoc = Table(
     'postings_techs_must',
     Base.metadata,
     Column('posting_id', Integer, ForeignKey('postings.id')),
-    Column('must_id', Integer, ForeignKey('technologies.id'))
+    Column('must_id', Integer, ForeignKey('technologies.id')),
+    Index('ix_postings_techs_must_posting_id_must_id', 'posting_id', 'must_id', unique=True),
+    Index('ix_postings_techs_must_must_id_posting_id', 'must_id', 'posting_id')
 )
 
 
@@ -25,7 +50,9 @@ postings_nice_assoc = Table(
     'postings_techs_nice',
     Base.metadata,
     Column('posting_id', Integer, ForeignKey('postings.id')),
-    Column('nice_id', Integer, ForeignKey('technologies.id'))
+    Column('nice_id', Integer, ForeignKey('technologies.id')),
+    Index('ix_postings_techs_nice_posting_id_nice_id', 'posting_id', 'nice_id', unique=True),
+    Index('ix_postings_techs_nice_nice_id_posting_id', 'nice_id', 'posting_id')
 )
 
 
@@ -38,15 +65,16 @@ class Posting(Base):
         title (str): job title
         posted (int): posted timestamp
         scraped (int): scraped timestamp
-        text (str): posting's full text
+        text (str): posting's full text; stored compressed and loaded
+            only when accessed
     """
     __tablename__ = 'postings'
     id = Column(Integer, primary_key=True)
-    web_id = Column(String(80), nullable=False)
+    web_id = Column(String(80), nullable=False, unique=True, index=True)
     title = Column(String(80), nullable=False)
     posted = Column(Integer, nullable=False)
     scraped = Column(Integer, nullable=False)
-    text = Column(String(5000), nullable=False)
+    text = deferred(Column(CompressedText, nullable=False))
     cities = relationship("City",
                           secondary=postings_cities_assoc,
                           back_populates="postings")
@@ -72,7 +100,7 @@ class City(Base):
     __tablename__ = 'cities'
     id = Column(Integer, primary_key=True)
     name = Column(String(80), nullable=False)
-    name_ascii = Column(String(80), nullable=False)
+    name_ascii = Column(String(80), nullable=False, unique=True, index=True)
     postings = relationship("Posting",
                             secondary=postings_cities_assoc,
                             back_populates="cities")
@@ -89,7 +117,7 @@ class Technology(Base):
     __tablename__ = 'technologies'
     id = Column(Integer, primary_key=True)
     name = Column(String(80), nullable=False)
-    name_ascii = Column(String(80), nullable=False)
+    name_ascii = Column(String(80), nullable=False, unique=True, index=True)
     postings_must = relationship("Posting",
                                  secondary=postings_must_assoc,
                                  back_populates="techs_must")
@@ -109,14 +137,195 @@ class Salary(Base):
        salary_to (int): max salary
        salary_currency (str): currency of the salary
        salary_period (str): salary period
+       salary_from_norm (int): min salary per month in SALARY_CURRENCY
+       salary_to_norm (int): max salary per month in SALARY_CURRENCY
     """
     __tablename__ = 'salaries'
     id = Column(Integer, primary_key=True)
-    posting_id = Column(Integer, ForeignKey('postings.id'))
+    posting_id = Column(Integer, ForeignKey('postings.id'), index=True)
     employment_type_ascii = Column(String(80))
     salary_from = Column(Integer)
     salary_to = Column(Integer)
     salary_currency = Column(String(80))
     salary_period = Column(String(80))
+    # None if the currency or period of the salary is unknown
+    salary_from_norm = Column(Integer)
+    salary_to_norm = Column(Integer)
     posting = relationship("Posting",
                            back_populates="salaries")
+
+
+# Alternative names of the cities and technologies, e.g. Warsaw for Warszawa;
+# postings with an alias are assigned to the item the alias refers to
+cities_aliases = Table(
+    'cities_aliases',
+    Base.metadata,
+    Column('id', Integer, primary_key=True),
+    Column('city_id', Integer, ForeignKey('cities.id'), nullable=False),
+    Column('alias_ascii', String(80), nullable=False, unique=True)
+)
+
+
+technologies_aliases = Table(
+    'technologies_aliases',
+    Base.metadata,
+    Column('id', Integer, primary_key=True),
+    Column('tech_id', Integer, ForeignKey('technologies.id'), nullable=False),
+    Column('alias_ascii', String(80), nullable=False, unique=True)
+)
+
+
+# Aggregates of the association tables maintained on ingest;
+# count is the number of postings with the given combination of items
+# (technologies are must technologies unless stated otherwise).
+# Total number of postings; name is the name of the total ('postings')
+total_counts = Table(
+    'total_counts',
+    Base.metadata,
+    Column('name', String(40), primary_key=True),
+    Column('count', Integer, nullable=False)
+)
+
+
+tech_counts = Table(
+    'tech_counts',
+    Base.metadata,
+    Column('tech_id', Integer, ForeignKey('technologies.id'), primary_key=True),
+    Column('count', Integer, nullable=False)
+)
+# top-N reads the index in the order of ORDER BY count DESC, tech_id
+Index('ix_tech_counts_count_desc', tech_counts.c.count.desc(), tech_counts.c.tech_id)
+
+
+# count of postings with tech as nice
+tech_nice_counts = Table(
+    'tech_nice_counts',
+    Base.metadata,
+    Column('tech_id', Integer, ForeignKey('technologies.id'), primary_key=True),
+    Column('count', Integer, nullable=False)
+)
+# top-N reads the index in the order of ORDER BY count DESC, tech_id
+Index('ix_tech_nice_counts_count_desc', tech_nice_counts.c.count.desc(), tech_nice_counts.c.tech_id)
+
+
+city_counts = Table(
+    'city_counts',
+    Base.metadata,
+    Column('city_id', Integer, ForeignKey('cities.id'), primary_key=True),
+    Column('count', Integer, nullable=False)
+)
+# top-N reads the index in the order of ORDER BY count DESC, city_id
+Index('ix_city_counts_count_desc', city_counts.c.count.desc(), city_counts.c.city_id)
+
+
+tech_city_counts = Table(
+    'tech_city_counts',
+    Base.metadata,
+    Column('tech_id', Integer, ForeignKey('technologies.id'), primary_key=True),
+    Column('city_id', Integer, ForeignKey('cities.id'), primary_key=True),
+    Column('count', Integer, nullable=False),
+    Index('ix_tech_city_counts_city_id_tech_id', 'city_id', 'tech_id')
+)
+
+
+# count of postings requiring both tech and other
+tech_pair_counts = Table(
+    'tech_pair_counts',
+    Base.metadata,
+    Column('tech_id', Integer, ForeignKey('technologies.id'), primary_key=True),
+    Column('other_id', Integer, ForeignKey('technologies.id'), primary_key=True),
+    Column('count', Integer, nullable=False)
+)
+
+
+tech_pair_city_counts = Table(
+    'tech_pair_city_counts',
+    Base.metadata,
+    Column('tech_id', Integer, ForeignKey('technologies.id'), primary_key=True),
+    Column('city_id', Integer, ForeignKey('cities.id'), primary_key=True),
+    Column('other_id', Integer, ForeignKey('technologies.id'), primary_key=True),
+    Column('count', Integer, nullable=False)
+)
+
+
+# Daily rollups of the postings by the day they were posted;
+# day is the number of days since the epoch (posted // 86400)
+daily_counts = Table(
+    'daily_counts',
+    Base.metadata,
+    Column('day', Integer, primary_key=True),
+    Column('count', Integer, nullable=False)
+)
+
+
+daily_tech_counts = Table(
+    'daily_tech_counts',
+    Base.metadata,
+    Column('tech_id', Integer, ForeignKey('technologies.id'), primary_key=True),
+    Column('day', Integer, primary_key=True),
+    Column('count', Integer, nullable=False)
+)
+
+
+daily_city_counts = Table(
+    'daily_city_counts',
+    Base.metadata,
+    Column('city_id', Integer, ForeignKey('cities.id'), primary_key=True),
+    Column('day', Integer, primary_key=True),
+    Column('count', Integer, nullable=False)
+)
+
+
+daily_tech_city_counts = Table(
+    'daily_tech_city_counts',
+    Base.metadata,
+    Column('tech_id', Integer, ForeignKey('technologies.id'), primary_key=True),
+    Column('city_id', Integer, ForeignKey('cities.id'), primary_key=True),
+    Column('day', Integer, primary_key=True),
+    Column('count', Integer, nullable=False)
+)
+
+
+# Histograms of the normalized salaries (midpoints of the salary ranges)
+# per employment type in postings with the tech as must and/or in the city;
+# tech_id or city_id is 0 for all technologies or all cities.
+# Salary s falls into bucket ceil(log(s, gamma)), see demitaja.utils.salaries
+salary_histograms = Table(
+    'salary_histograms',
+    Base.metadata,
+    Column('tech_id', Integer, primary_key=True),
+    Column('city_id', Integer, primary_key=True),
+    Column('employment_type_ascii', String(80), primary_key=True),
+    Column('bucket', Integer, primary_key=True),
+    Column('count', Integer, nullable=False)
+)
+
+
+# Time of the last complete crawl of each search of the crawler;
+# criteria is the search criteria, e.g. 'category=backend'
+crawl_state = Table(
+    'crawl_state',
+    Base.metadata,
+    Column('criteria', String(200), primary_key=True),
+    Column('last_crawl', Integer, nullable=False)
+)
+
+
+# Marker of the data served by the web tier; name is the name of the
+# marker ('data'), version is bumped by every change of the postings,
+# items or aggregates and modified is the time of the last change
+data_versions = Table(
+    'data_versions',
+    Base.metadata,
+    Column('name', String(40), primary_key=True),
+    Column('version', Integer, nullable=False),
+    Column('modified', Integer, nullable=False)
+)
+
+
+# Full-text index of the title and description of the postings (SQLite only);
+# rowid is id of the posting, see demitaja.utils.search
+event.listen(Base.metadata, 'after_create', DDL(
+    "CREATE VIRTUAL TABLE IF NOT EXISTS postings_fts "
+    "USING fts5(title, description, tokenize='unicode61 remove_diacritics 2')"
+).execute_if(dialect='sqlite'))
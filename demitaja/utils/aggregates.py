@@ -0,0 +1,177 @@
+"""Aggregate tables of the postings' technologies and cities
+and their daily rollups."""
+
+from collections import Counter
+from sqlalchemy import text
+from demitaja.database import db_session
+from demitaja.models import (total_counts, tech_counts, tech_nice_counts, city_counts, tech_city_counts,
+                             tech_pair_counts, tech_pair_city_counts, daily_counts,
+                             daily_tech_counts, daily_city_counts, daily_tech_city_counts)
+
+
+SECONDS_PER_DAY = 86400
+
+
+# Counters of the postings per item and in total
+counter_tables = (total_counts, tech_counts, tech_nice_counts, city_counts)
+
+# Queries computing each aggregate table from the postings and association tables;
+# selected columns are in the order of the table's columns
+definitions = {
+    total_counts: (
+        "SELECT 'postings', COUNT(*) "
+        "FROM postings "
+        "HAVING COUNT(*)>0"
+    ),
+    tech_counts: (
+        "SELECT must_id, COUNT(*) "
+        "FROM postings_techs_must "
+        "GROUP BY must_id"
+    ),
+    tech_nice_counts: (
+        "SELECT nice_id, COUNT(*) "
+        "FROM postings_techs_nice "
+        "GROUP BY nice_id"
+    ),
+    city_counts: (
+        "SELECT city_id, COUNT(*) "
+        "FROM postings_cities "
+        "GROUP BY city_id"
+    ),
+    tech_city_counts: (
+        "SELECT pt.must_id, pc.city_id, COUNT(*) "
+        "FROM postings_techs_must pt "
+        "JOIN postings_cities pc "
+            "ON pt.posting_id=pc.posting_id "
+        "GROUP BY pt.must_id, pc.city_id"
+    ),
+    tech_pair_counts: (
+        "SELECT pt1.must_id, pt2.must_id, COUNT(*) "
+        "FROM postings_techs_must pt1 "
+        "JOIN postings_techs_must pt2 "
+            "ON pt1.posting_id=pt2.posting_id "
+            "AND pt1.must_id<>pt2.must_id "
+        "GROUP BY pt1.must_id, pt2.must_id"
+    ),
+    tech_pair_city_counts: (
+        "SELECT pt1.must_id, pc.city_id, pt2.must_id, COUNT(*) "
+        "FROM postings_techs_must pt1 "
+        "JOIN postings_techs_must pt2 "
+            "ON pt1.posting_id=pt2.posting_id "
+            "AND pt1.must_id<>pt2.must_id "
+        "JOIN postings_cities pc "
+            "ON pt1.posting_id=pc.posting_id "
+        "GROUP BY pt1.must_id, pc.city_id, pt2.must_id"
+    ),
+    daily_counts: (
+        "SELECT posted/86400, COUNT(*) "
+        "FROM postings "
+        "GROUP BY posted/86400"
+    ),
+    daily_tech_counts: (
+        "SELECT pt.must_id, p.posted/86400, COUNT(*) "
+        "FROM postings_techs_must pt "
+        "JOIN postings p "
+            "ON pt.posting_id=p.id "
+        "GROUP BY pt.must_id, p.posted/86400"
+    ),
+    daily_city_counts: (
+        "SELECT pc.city_id, p.posted/86400, COUNT(*) "
+        "FROM postings_cities pc "
+        "JOIN postings p "
+            "ON pc.posting_id=p.id "
+        "GROUP BY pc.city_id, p.posted/86400"
+    ),
+    daily_tech_city_counts: (
+        "SELECT pt.must_id, pc.city_id, p.posted/86400, COUNT(*) "
+        "FROM postings_techs_must pt "
+        "JOIN postings_cities pc "
+            "ON pt.posting_id=pc.posting_id "
+        "JOIN postings p "
+            "ON pt.posting_id=p.id "
+        "GROUP BY pt.must_id, pc.city_id, p.posted/86400"
+    )
+}
+
+
+def update_aggregates(postings):
+    """Add postings to the aggregate tables.
+    Must be called within the transaction inserting the postings.
+
+    Args:
+        postings (list): tuples (posted, city_ids, must_ids, nice_ids) of
+            each new posting; ids must not repeat within a posting
+    """
+    counters = {table: Counter() for table in definitions}
+    for posted, city_ids, must_ids, nice_ids in postings:
+        day = posted // SECONDS_PER_DAY
+        counters[total_counts][('postings',)] += 1
+        counters[tech_nice_counts].update((tech_id,) for tech_id in nice_ids)
+        counters[daily_counts][(day,)] += 1
+        counters[city_counts].update((city_id,) for city_id in city_ids)
+        counters[daily_city_counts].update((city_id, day) for city_id in city_ids)
+        counters[tech_counts].update((tech_id,) for tech_id in must_ids)
+        counters[daily_tech_counts].update((tech_id, day) for tech_id in must_ids)
+        for tech_id in must_ids:
+            counters[tech_city_counts].update((tech_id, city_id) for city_id in city_ids)
+            counters[daily_tech_city_counts].update(
+                (tech_id, city_id, day) for city_id in city_ids)
+            for other_id in must_ids:
+                if other_id == tech_id:
+                    continue
+                counters[tech_pair_counts][(tech_id, other_id)] += 1
+                counters[tech_pair_city_counts].update(
+                    (tech_id, city_id, other_id) for city_id in city_ids)
+    for table, counter in counters.items():
+        increment(table, counter)
+
+
+def increment(table, counter):
+    """Increment counts of an aggregate table.
+
+    Args:
+        table (Table): aggregate table
+        counter (Counter): primary key tuple -> increment
+    """
+    if not counter:
+        return
+    keys = [column.name for column in table.primary_key.columns]
+    # upsert supported by both SQLite (3.24+) and PostgreSQL (9.5+)
+    query = text(
+        "INSERT INTO {table} ({keys}, count) "
+        "VALUES ({values}, :count) "
+        "ON CONFLICT ({keys}) "
+        "DO UPDATE SET count={table}.count+excluded.count".format(
+            table=table.name,
+            keys=', '.join(keys),
+            values=', '.join(':' + key for key in keys)))
+    db_session.execute(query, [dict(zip(keys, key), count=count)
+                               for key, count in counter.items()])
+
+
+def rebuild_aggregates(tables=None, commit=True):
+    """Recompute the aggregate tables (all by default) from the
+    association tables; with commit=False the caller commits
+    """
+    for table in tables or definitions:
+        db_session.execute(table.delete())
+        db_session.execute(text("INSERT INTO {} ({}) {}".format(
+            table.name, ', '.join(table.c.keys()), definitions[table])))
+    if commit:
+        db_session.commit()
+
+
+def check_aggregates():
+    """Compare the aggregate tables with the association tables.
+
+    Returns:
+        dict mapping name of each inconsistent table to the number of
+        rows which differ from the recomputed aggregates
+    """
+    errors = {}
+    for table, definition in definitions.items():
+        stored = set(tuple(row) for row in db_session.execute(table.select()))
+        computed = set(tuple(row) for row in db_session.execute(text(definition)))
+        if stored != computed:
+            errors[table.name] = len(stored ^ computed)
+    return errors
@@ -0,0 +1,98 @@
+"""Aliases of the cities and technologies and merging of duplicate items."""
+
+from sqlalchemy import text
+from demitaja.database import db_session
+from demitaja.models import (City, Technology, cities_aliases, technologies_aliases,
+                             postings_cities_assoc, postings_must_assoc, postings_nice_assoc,
+                             tech_counts, tech_nice_counts, city_counts, tech_city_counts,
+                             tech_pair_counts, tech_pair_city_counts, daily_tech_counts,
+                             daily_city_counts, daily_tech_city_counts, salary_histograms)
+from demitaja.utils.lookup import city_cache, tech_cache
+from demitaja.utils.utils import bump_data_version, normalize_string
+
+
+# Model, column of the aliases table, columns of the association tables
+# referring to the items and cache of each item type
+item_types = {
+    'city': (City, cities_aliases.c.city_id, [postings_cities_assoc.c.city_id], city_cache),
+    'tech': (Technology, technologies_aliases.c.tech_id,
+             [postings_must_assoc.c.must_id, postings_nice_assoc.c.nice_id], tech_cache)
+}
+
+# Columns of the aggregate tables and salary histograms referring to the
+# items of each type; rows of a merged item are deleted before the item
+aggregate_columns = {
+    'city': [city_counts.c.city_id, tech_city_counts.c.city_id, tech_pair_city_counts.c.city_id,
+             daily_city_counts.c.city_id, daily_tech_city_counts.c.city_id,
+             salary_histograms.c.city_id],
+    'tech': [tech_counts.c.tech_id, tech_nice_counts.c.tech_id, tech_city_counts.c.tech_id,
+             tech_pair_counts.c.tech_id, tech_pair_counts.c.other_id,
+             tech_pair_city_counts.c.tech_id, tech_pair_city_counts.c.other_id,
+             daily_tech_counts.c.tech_id, daily_tech_city_counts.c.tech_id,
+             salary_histograms.c.tech_id]
+}
+
+
+def add_alias(item_type, alias, name):
+    """Register alias of the item. If the alias is the name of another
+    item, the duplicate item is merged into the item.
+    Does not commit; if the duplicate was merged, the aggregate tables
+    and salary histograms must be rebuilt.
+
+    Args:
+        item_type (str): tech or city
+        alias (str): alias of the item
+        name (str): name or alias of the item
+
+    Returns:
+        True if a duplicate item was merged into the item
+
+    Raises:
+        ValueError: if the item is not in the database or the alias
+            is its name
+    """
+    model, alias_column, columns, cache = item_types[item_type]
+    aliases = alias_column.table
+    name_ascii = cache.resolve(normalize_string(name))
+    item = db_session.query(model.id).filter(model.name_ascii == name_ascii).first()
+    if item is None:
+        raise ValueError('Not found: {}'.format(name))
+    alias_ascii = normalize_string(alias)
+    if alias_ascii == name_ascii:
+        raise ValueError('{} is the name of the item'.format(alias))
+    duplicate = db_session.query(model.id).filter(model.name_ascii == alias_ascii).first()
+    if duplicate is not None:
+        merge(item_type, duplicate.id, item.id)
+    # the alias may have referred to another item
+    db_session.execute(aliases.delete().where(aliases.c.alias_ascii == alias_ascii))
+    db_session.execute(aliases.insert(), {alias_column.name: item.id, 'alias_ascii': alias_ascii})
+    # requests by the alias are answered differently now
+    bump_data_version()
+    return duplicate is not None
+
+
+def merge(item_type, duplicate_id, item_id):
+    """Move postings and aliases of the duplicate item to the item and
+    delete the duplicate, with a few bulk statements. Aggregate rows of
+    the duplicate are deleted; the rows of the item are not updated.
+    Does not commit.
+    """
+    model, alias_column, columns, cache = item_types[item_type]
+    params = {'duplicate': duplicate_id, 'item': item_id}
+    for column in columns:
+        names = {'table': column.table.name, 'column': column.name}
+        # postings with both items keep a single row
+        db_session.execute(text(
+            "DELETE FROM {table} "
+            "WHERE {column}=:duplicate "
+                "AND posting_id IN (SELECT posting_id FROM {table} WHERE {column}=:item)".format(**names)
+        ), params)
+        db_session.execute(text(
+            "UPDATE {table} SET {column}=:item WHERE {column}=:duplicate".format(**names)
+        ), params)
+    db_session.execute(alias_column.table.update().where(
+        alias_column == duplicate_id).values({alias_column.name: item_id}))
+    # no row may refer to the duplicate when it is deleted
+    for column in aggregate_columns[item_type]:
+        db_session.execute(column.table.delete().where(column == duplicate_id))
+    db_session.execute(model.__table__.delete().where(model.id == duplicate_id))
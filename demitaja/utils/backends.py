@@ -0,0 +1,122 @@
+"""Backends answering the chart queries.
+
+Each backend has one method per query in demitaja.utils.queries taking
+normalized names of the requested items and returning list of tuples
+(or a single tuple or None for single-row queries) of the same shape
+as the SQL query.
+"""
+
+import threading
+from sqlalchemy import text
+from demitaja import app
+from demitaja.database import db_session
+from demitaja.utils import queries
+from demitaja.utils.utils import get_data_version
+
+
+class SqlBackend(object):
+    """This class answers the chart queries with the SQL queries
+    in demitaja.utils.queries.
+    """
+    def all(self, query, **params):
+        return [tuple(row) for row in db_session.execute(query, params)]
+
+    def one(self, query, **params):
+        rows = self.all(query, **params)
+        return rows[0] if rows else None
+
+    def total(self):
+        return self.one(queries.total)[0]
+
+    def techs(self):
+        return self.all(queries.techs)
+
+    def cities(self):
+        return self.all(queries.cities)
+
+    def tech(self, tech):
+        return self.one(queries.tech, tech=tech)
+
+    def city(self, city):
+        return self.one(queries.city, city=city)
+
+    def techs_count(self, techs):
+        return self.all(queries.techs_count, techs=techs)
+
+    def cities_count(self, cities):
+        return self.all(queries.cities_count, cities=cities)
+
+    def cities_tech(self, tech):
+        return self.all(queries.cities_tech, tech=tech)
+
+    def techs_city(self, city):
+        return self.all(queries.techs_city, city=city)
+
+    def tech_city(self, tech, city):
+        return self.one(queries.tech_city, tech=tech, city=city)
+
+    def techs_tech(self, tech):
+        return self.all(queries.techs_tech, tech=tech)
+
+    def techs_tech_count(self, tech, techs):
+        return self.all(queries.techs_tech_count, tech=tech, techs=techs)
+
+    def techs_tech_city(self, tech, city):
+        return self.all(queries.techs_tech_city, tech=tech, city=city)
+
+
+sql_backend = SqlBackend()
+analytics_engine = None
+engine_lock = threading.Lock()
+
+
+def get_backend():
+    """Return backend selected by QUERY_BACKEND config variable.
+    The in-memory analytics engine is (re)loaded whenever the data
+    version of the database changes, e.g. after a crawl.
+    """
+    global analytics_engine
+    if app.config['QUERY_BACKEND'] != 'numpy':
+        return sql_backend
+    version = get_data_version()
+    if analytics_engine is None or analytics_engine.version != version:
+        with engine_lock:
+            if analytics_engine is None or analytics_engine.version != version:
+                # import here so that numpy is needed only by this backend
+                from demitaja.utils.engine import AnalyticsEngine
+                engine = AnalyticsEngine()
+                engine.load()
+                analytics_engine = engine
+    return analytics_engine
+
+
+def compare_backends(backend, other):
+    """Run every query for every technology and city on both backends.
+    Return list of (query_name, params, result, other_result) of the
+    queries whose results differ.
+    """
+    techs = [row.name_ascii for row in db_session.execute(
+        text('SELECT name_ascii FROM technologies'))] + ['']
+    cities = [row.name_ascii for row in db_session.execute(
+        text('SELECT name_ascii FROM cities'))] + ['']
+    calls = [('total', {}), ('techs', {}), ('cities', {}),
+             ('techs_count', {'techs': techs}), ('cities_count', {'cities': cities})]
+    for tech in techs:
+        calls += [('tech', {'tech': tech}),
+                  ('cities_tech', {'tech': tech}),
+                  ('techs_tech', {'tech': tech}),
+                  ('techs_tech_count', {'tech': tech, 'techs': techs})]
+        calls += [(name, {'tech': tech, 'city': city})
+                  for name in ('tech_city', 'techs_tech_city') for city in cities]
+    for city in cities:
+        calls += [('city', {'city': city}), ('techs_city', {'city': city})]
+    differences = []
+    for name, params in calls:
+        result = getattr(backend, name)(**params)
+        other_result = getattr(other, name)(**params)
+        if name.endswith('_count'):
+            # order of rows of these queries is arbitrary
+            result, other_result = sorted(result), sorted(other_result)
+        if result != other_result:
+            differences.append((name, params, result, other_result))
+    return differences
@@ -0,0 +1,192 @@
+"""Benchmarks of the queries, ingest and endpoints on synthetic data.
+
+The database is grown with synthetic postings (see
+demitaja.utils.synthetic) to each of the requested sizes and at each size
+every named query of demitaja.utils.queries, single and bulk ingest and
+the endpoints are timed. Results are plain dicts which can be saved as
+JSON and compared between commits.
+"""
+
+import logging
+import platform
+import statistics
+import subprocess
+import time
+import sqlalchemy
+from sqlalchemy.sql.elements import TextClause
+from demitaja import app
+from demitaja.database import db_session, engine
+from demitaja.utils import queries
+from demitaja.utils.backends import sql_backend
+from demitaja.utils.utils import create_postings, extract_posting, normalize_string
+
+
+logger = logging.getLogger(__name__)
+
+# Endpoints timed at each size; {tech} and {city} are replaced with the
+# names of the most common technology and city
+ENDPOINTS = [
+    '/',
+    '/api/cities',
+    '/api/cities?req_tech={tech}',
+    '/api/techs',
+    '/api/techs?req_city={city}',
+    '/api/techs-tech?req_tech={tech}',
+    '/api/techs-tech?req_tech={tech}&req_city={city}',
+    '/api/cities?req_tech={tech}&format=data',
+    '/api/charts-data?req_tech={tech}&req_city={city}',
+    '/api/dashboard?req_tech={tech}&req_city={city}',
+    '/api/trends?req_tech={tech}&granularity=week',
+    '/api/salaries?req_tech={tech}&req_city={city}',
+    '/api/search?q={tech}',
+    '/api/compare?req_tech={tech}&req_city={city}',
+    '/api/suggest?type=tech&q={tech}',
+    '/metrics',
+]
+
+
+def get_commit():
+    """Return hash of the current git commit or None"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=app.root_path).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(func, runs):
+    """Call func runs times; return list of durations [s]"""
+    times = []
+    for i in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def summarize(times):
+    """Return statistics of the durations in milliseconds"""
+    return {'runs': len(times),
+            'min_ms': min(times) * 1000,
+            'median_ms': statistics.median(times) * 1000,
+            'max_ms': max(times) * 1000}
+
+
+class Benchmark(object):
+    """This class defines benchmark growing an empty database with
+    synthetic postings.
+    Attributes:
+        generator (PostingGenerator): source of the postings
+        runs (int): number of runs of each timed query and endpoint
+        batch_size (int): number of postings per transaction of bulk ingest
+        size (int): number of postings generated so far
+        results (list): dict of each measurement
+    """
+    def __init__(self, generator, runs=5, batch_size=500):
+        self.generator = generator
+        self.runs = runs
+        self.batch_size = batch_size
+        self.size = 0
+        self.results = []
+
+    def record(self, kind, name, times, **extra):
+        result = dict(size=self.size, kind=kind, name=name, **summarize(times))
+        result.update(extra)
+        self.results.append(result)
+        logger.info('{size:>9} {kind:<9} {name:<60} {median_ms:10.2f} ms'.format(**result))
+
+    def postings(self, count):
+        """Generate the next count postings"""
+        scraped = int(time.time())
+        postings = (extract_posting(raw, scraped)
+                    for raw in self.generator.generate(count, self.size))
+        self.size += count
+        return postings
+
+    def run(self, sizes, client):
+        """Grow the database to each of the sizes and time everything"""
+        for size in sorted(sizes):
+            if size > self.size:
+                self.bench_bulk_ingest(size - self.size)
+            self.bench_single_ingest()
+            self.bench_queries()
+            self.bench_endpoints(client)
+        return self.results
+
+    def bench_bulk_ingest(self, count):
+        postings = self.postings(count)
+        times = measure(lambda: create_postings(postings, self.batch_size), 1)
+        self.record('ingest', 'bulk', times, postings=count,
+                    postings_per_s=count / times[0] if times[0] else None)
+
+    def bench_single_ingest(self):
+        postings = self.postings(self.runs)
+        times = measure(lambda: create_postings([next(postings)], 1), self.runs)
+        self.record('ingest', 'single', times)
+
+    def get_params(self):
+        """Return values of the bind parameters of the queries"""
+        techs = [normalize_string(name) for name, count in sql_backend.techs()]
+        cities = [normalize_string(name) for name, count in sql_backend.cities()]
+        day = self.generator.start // 86400
+        ids = dict(db_session.execute(sqlalchemy.text(
+            "SELECT name_ascii, id FROM technologies WHERE name_ascii IN :techs").bindparams(
+                sqlalchemy.bindparam('techs', expanding=True)), {'techs': techs[:3]}).fetchall())
+        city_ids = dict(db_session.execute(sqlalchemy.text(
+            "SELECT name_ascii, id FROM cities WHERE name_ascii IN :cities").bindparams(
+                sqlalchemy.bindparam('cities', expanding=True)), {'cities': cities[:3]}).fetchall())
+        return {'tech': techs[0], 'city': cities[0], 'techs': techs, 'cities': cities,
+                'start': day, 'end': day + self.size * self.generator.interval // 86400,
+                'tech_id': ids[techs[0]], 'city_id': city_ids[cities[0]],
+                # comparison of the three most common technologies and cities
+                'names': techs[:3] + cities[:3], 'tech_ids': list(ids.values()),
+                'other_ids': list(ids.values()), 'city_ids': list(city_ids.values())}
+
+    def bench_queries(self):
+        params = self.get_params()
+        for name in sorted(dir(queries)):
+            query = getattr(queries, name)
+            if not isinstance(query, TextClause):
+                continue
+            query_params = {key: params[key] for key in query.compile().binds}
+            times = measure(lambda: db_session.execute(query, query_params).fetchall(), self.runs)
+            self.record('query', name, times)
+        db_session.commit()
+
+    def bench_endpoints(self, client):
+        from demitaja.views import chart_cache
+        params = self.get_params()
+        for endpoint in ENDPOINTS:
+            path = endpoint.format(tech=params['tech'], city=params['city'])
+
+            def get():
+                response = client.get(path)
+                assert response.status_code < 400, (path, response.status_code)
+
+            def get_cold():
+                chart_cache.clear()
+                get()
+            self.record('endpoint', path, measure(get_cold, self.runs))
+            self.record('cached', path, measure(get, self.runs))
+
+
+def get_metadata():
+    """Return description of the benchmarked code and environment"""
+    return {'commit': get_commit(),
+            'timestamp': int(time.time()),
+            'python': platform.python_version(),
+            'sqlalchemy': sqlalchemy.__version__,
+            'database': engine.dialect.name}
+
+
+def compare(results, baseline):
+    """Compare median times of the results with the baseline results.
+    Return list of tuples (size, kind, name, baseline_ms, median_ms, ratio).
+    """
+    old = {(r['size'], r['kind'], r['name']): r['median_ms'] for r in baseline}
+    rows = []
+    for r in results:
+        key = (r['size'], r['kind'], r['name'])
+        if key in old and old[key]:
+            rows.append(key + (old[key], r['median_ms'], r['median_ms'] / old[key]))
+    return rows
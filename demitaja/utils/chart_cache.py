@@ -0,0 +1,165 @@
+"""Cache of rendered charts."""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class ChartCache(object):
+    """This class defines LRU cache of rendered charts bounded by both
+    number of entries and their total size, with an optional on-disk
+    tier which can be shared between worker processes.
+
+    Keys are tuples whose last element is the data version of the
+    database, a string which never repeats for different data (see
+    demitaja.views.get_data_tag). When a key of a new version is seen,
+    charts of the other versions are dropped from memory and disk.
+    Attributes:
+        max_entries (int): max number of charts kept in memory
+        max_bytes (int): max total size of charts kept in memory
+        directory (str): directory of the on-disk tier or None
+        entries (OrderedDict): key -> (chart, size) in LRU order
+        size (int): total size of the charts kept in memory
+        hits (int), disk_hits (int), misses (int): lookup counters
+        renders (int): number of rendered charts
+        render_time (float): total time spent rendering charts [s]
+        version: data version of the latest key seen
+    """
+    def __init__(self, max_entries, max_bytes, directory=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.renders = 0
+        self.render_time = 0.0
+        self.lock = threading.Lock()
+        self.version = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get_or_render(self, key, render):
+        """Return chart from the cache; if not cached, render and cache it.
+
+        Args:
+            key (tuple): key of the chart ending with the data version
+            render (callable): function returning the chart
+
+        Returns:
+            the chart
+        """
+        found, chart = self.get(key)
+        if found:
+            return chart
+        start = time.perf_counter()
+        chart = render()
+        with self.lock:
+            self.renders += 1
+            self.render_time += time.perf_counter() - start
+        self.set(key, chart)
+        return chart
+
+    def get(self, key):
+        """Return tuple (found, chart)"""
+        self.check_version(key[-1])
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, self.entries[key][0]
+        if self.directory:
+            try:
+                with open(self.get_path(key), 'rb') as f:
+                    chart = pickle.load(f)
+            except (OSError, pickle.PickleError, EOFError):
+                pass
+            else:
+                with self.lock:
+                    self.disk_hits += 1
+                self.set_memory(key, chart)
+                return True, chart
+        with self.lock:
+            self.misses += 1
+        return False, None
+
+    def set(self, key, chart):
+        """Add chart to the cache"""
+        self.check_version(key[-1])
+        self.set_memory(key, chart)
+        if self.directory:
+            self.set_disk(key, chart)
+
+    def set_memory(self, key, chart):
+        size = len(chart) if isinstance(chart, (str, bytes)) else len(pickle.dumps(chart))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (chart, size)
+            self.size += size
+            # evict least recently used charts
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self.size -= self.entries.popitem(last=False)[1][1]
+
+    def check_version(self, version):
+        """Drop charts of other data versions when the version changes"""
+        if version == self.version:
+            return
+        with self.lock:
+            self.version = version
+            for key in [key for key in self.entries if key[-1] != version]:
+                self.size -= self.entries.pop(key)[1]
+        if self.directory:
+            self.prune_disk(version)
+
+    def set_disk(self, key, chart):
+        # write to temporary file first so that readers never see partial files
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(chart, f)
+            os.replace(tmp_path, self.get_path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def prune_disk(self, version):
+        """Remove charts of other data versions from the disk"""
+        prefix = '{}-'.format(version)
+        for name in os.listdir(self.directory):
+            if name.endswith('.chart') and not name.startswith(prefix):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def get_path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, '{}-{}.chart'.format(key[-1], digest))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """Return cache statistics (dict)"""
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'renders': self.renders,
+                'render_time': round(self.render_time, 6),
+                'avg_render_time': round(self.render_time / self.renders, 6) if self.renders else 0
+            }
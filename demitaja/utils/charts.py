@@ -4,9 +4,14 @@ from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.figure import Figure
 from io import BytesIO
 import base64
+import threading
 
 
-def bar_single(items, total, title=None, highlight=None):
+# Figures reused by the charts rendered in each thread
+figures = threading.local()
+
+
+def bar_single(items, total, title=None, highlight=None, fmt='base64', dpi=300):
     """Create single bar chart.
 
     Args:
@@ -15,12 +20,16 @@ def bar_single(items, total, title=None, highlight=None):
         total (int): total number of job postings in the database
         title (str): title of the chart
         highlight (int): position in items of the item to be highlighted
+        fmt (str): format of the chart, see get_chart
+        dpi (int): resolution of the png chart
 
     Returns:
-        base64 encoded bar chart (str).
+        bar chart in the requested format.
     """
     # restructure data
     names, values = zip(*items)
+    if fmt == 'data':
+        return get_chart_data(names, [(None, values, total)], title, highlight)
     # normalize values
     values = [val / total * 100 for val in values]
     # set colours
@@ -35,10 +44,10 @@ def bar_single(items, total, title=None, highlight=None):
     ax.set_xticklabels(names, rotation='vertical')
     ax.set_title(title)
     ax.set_ylabel('% of all job postings')
-    return get_chart_base64(fig)
+    return get_chart(fig, fmt, dpi)
 
 
-def bar_double(items, total, title=None, legend=None, highlight=None):
+def bar_double(items, total, title=None, legend=None, highlight=None, fmt='base64', dpi=300):
     """Create double bar chart.
 
     Args:
@@ -53,12 +62,17 @@ def bar_double(items, total, title=None, legend=None, highlight=None):
         title (str): title of the chart
         legend (tuple): (series1_name, series2_name)
         highlight (int): position in items of the item to be highlighted
+        fmt (str): format of the chart, see get_chart
+        dpi (int): resolution of the png chart
 
     Returns:
-        base64 encoded bar chart (str).
+        bar chart in the requested format.
     """
     # restructure data
     names, values1, values2 = zip(*items)
+    if fmt == 'data':
+        return get_chart_data(names, [(legend[0], values1, total[0]), (legend[1], values2, total[1])],
+                              title, highlight)
     # normalize values
     values1 = [val / total[0] * 100 for val in values1]
     values2 = [val / total[1] * 100 for val in values2]
@@ -76,35 +90,134 @@ def bar_double(items, total, title=None, legend=None, highlight=None):
     ax.set_title(title)
     ax.set_ylabel('% of all job postings')
     ax.legend()
-    return get_chart_base64(fig)
+    return get_chart(fig, fmt, dpi)
+
+
+def bar_grouped(names, series, totals, title=None, ylabel=None, fmt='base64', dpi=300):
+    """Create grouped bar chart.
+
+    Args:
+        names (list): names of the groups
+        series (list): list of tuples (series_name, values) where values
+            are numbers of job postings with the series' item in each group
+        totals (list): number of job postings in each group
+        title (str): title of the chart
+        ylabel (str): label of the y axis
+        fmt (str): format of the chart, see get_chart
+        dpi (int): resolution of the png chart
+
+    Returns:
+        bar chart in the requested format.
+    """
+    # normalize values
+    percents = [[val / total * 100 if total else 0 for val, total in zip(values, totals)]
+                for name, values in series]
+    if fmt == 'data':
+        return {
+            'title': title,
+            'labels': list(names),
+            'ylabel': ylabel,
+            'totals': list(totals),
+            'series': [{'name': name, 'counts': list(values), 'values': values_percent}
+                       for (name, values), values_percent in zip(series, percents)]
+        }
+    colors = ['#2f4b7c', '#ff7c43', '#665191', '#f95d6a', '#a05195',
+              '#ffa600', '#d45087', '#003f5c', '#7a5195', '#ef5675']
+    # create chart
+    fig, ax = create_figure()
+    width = 0.8 / len(series)
+    for i, ((name, values), values_percent) in enumerate(zip(series, percents)):
+        ax.bar([x + i * width for x in range(len(names))], values_percent,
+               color=colors[i % len(colors)], width=width, label=name)
+    ax.set_xticks([x + width * (len(series) - 1) / 2 for x in range(len(names))])
+    ax.set_xticklabels(names, rotation='vertical')
+    ax.set_title(title)
+    ax.set_ylabel(ylabel)
+    ax.legend()
+    return get_chart(fig, fmt, dpi)
 
 
 def create_figure():
-    """Create new Figure and add an Axes to it
+    """Get Figure with a single empty Axes.
+    The Figure is created once per thread and reused by the next charts.
 
     Returns:
         instance of matplotlib.figure.Figure
         instance of matplotlib.axes.Axes
     """
-    fig = Figure(tight_layout=True)
-    # Attach canvas to figure
-    FigureCanvasAgg(fig)
+    fig = getattr(figures, 'fig', None)
+    if fig is None:
+        fig = Figure(tight_layout=True)
+        # Attach canvas to figure
+        FigureCanvasAgg(fig)
+        figures.fig = fig
+    else:
+        fig.clf()
     # Add Axes to figure
     ax = fig.add_subplot(111)
     return fig, ax
 
 
-def get_chart_base64(fig):
+def get_chart_data(names, series, title, highlight):
+    """Build chart data for the browser to draw the chart
+
+    Args:
+        names (tuple): names of the items
+        series (list): list of tuples (series_name, values, total) where
+            values are numbers of job postings with each item and total
+            is the number to which the values are normalized
+        title (str): title of the chart
+        highlight (int): position in items of the item to be highlighted
+
+    Returns:
+        chart data (dict)
+    """
+    return {
+        'title': title,
+        'labels': list(names),
+        'highlight': highlight,
+        'ylabel': '% of all job postings',
+        'series': [{'name': name,
+                    'counts': list(values),
+                    'total': total,
+                    'values': [val / total * 100 for val in values]}
+                   for name, values, total in series]
+    }
+
+
+def get_chart(fig, fmt, dpi):
+    """Save chart in the requested format
+
+    Args:
+        fig (object): instance of matplotlib.figure.Figure
+        fmt (str): base64 (base64 encoded png), png (bytes) or svg (str)
+        dpi (int): resolution of the png chart
+
+    Returns:
+        chart in the requested format
+    """
+    if fmt == 'base64':
+        return get_chart_base64(fig, dpi)
+    buf = BytesIO()
+    fig.savefig(buf, format=fmt, dpi=dpi)
+    fig.clf()
+    chart = buf.getvalue()
+    buf.close()
+    return chart.decode('utf-8') if fmt == 'svg' else chart
+
+
+def get_chart_base64(fig, dpi=300):
     """Save chart to buffer and encode in Base64 scheme
 
     Args:
         fig (object): instance of matplotlib.figure.Figure
+        dpi (int): resolution of the chart
 
     Returns:
         Base64 encoded chart object (str)
     """
     buf = BytesIO()
-    fig.savefig(buf, format='png', dpi=300)
+    fig.savefig(buf, format='png', dpi=dpi)
     fig.clf()
     image_base64 = base64.b64encode(buf.getvalue()).decode('utf-8').replace('\n', '')
     buf.close()
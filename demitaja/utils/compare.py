@@ -0,0 +1,126 @@
+"""Side-by-side comparison of several technologies and/or cities.
+
+The requested names are resolved with one IN query per item type and the
+whole comparison matrix is read from the aggregate tables with one query
+per matrix: postings requiring each technology in each city and postings
+requiring each pair of the technologies.
+"""
+
+from demitaja.database import db_session
+from demitaja.utils import queries
+from demitaja.utils.lookup import city_cache, tech_cache
+from demitaja.utils.suggest import did_you_mean, normalize_query
+
+
+def get_names(value):
+    """Split comma separated names; drop empty and repeated names"""
+    names = []
+    for name in value.split(','):
+        name_ascii = normalize_query(name)
+        if name_ascii and name_ascii not in names:
+            names.append(name_ascii)
+    return names
+
+
+def resolve(item_type, names):
+    """Resolve normalized names (or aliases) of the items of the type
+    (tech or city) with one query. Aliases are resolved by the name cache
+    in memory; names it does not know are looked up by the same query.
+
+    Returns:
+        list of tuples (name_ascii, id, name, count) of the items found,
+            in the requested order without repetitions
+        list of tuples (name, suggestion) of the names which were not
+            found; suggestion is the name of the item the user probably
+            meant or None, see demitaja.utils.suggest.did_you_mean
+    """
+    cache = tech_cache if item_type == 'tech' else city_cache
+    query = queries.techs_by_name if item_type == 'tech' else queries.cities_by_name
+    resolved = {name: cache.resolve_cached(name) for name in names}
+    found = {row[0]: tuple(row) for row in db_session.execute(
+        query, {'names': list(set(resolved.values()))})}
+    items, not_found = [], []
+    for name in names:
+        item = found.get(resolved[name])
+        if item is None:
+            not_found.append((name, did_you_mean(item_type, name)))
+        elif item not in items:
+            items.append(item)
+    return items, not_found
+
+
+def get_comparison(techs, cities):
+    """Compare the technologies and cities.
+
+    Args:
+        techs (list): normalized names of the technologies
+        cities (list): normalized names of the cities
+
+    Returns:
+        comparison (dict):
+            techs, cities: lists of dicts with name, name_ascii and
+                number of postings (count) of each item
+            tech_city: number of postings requiring each technology
+                (rows) in each city (columns)
+            tech_pairs: number of postings requiring both technologies
+                of each pair; the diagonal holds the counts of the
+                technologies
+        list of tuples (name, suggestion) of the names which were not
+            found, see resolve
+    """
+    tech_items, techs_not_found = resolve('tech', techs) if techs else ([], [])
+    city_items, cities_not_found = resolve('city', cities) if cities else ([], [])
+    tech_ids = [item[1] for item in tech_items]
+    city_ids = [item[1] for item in city_items]
+    tech_city, tech_pairs = {}, {}
+    if tech_ids and city_ids:
+        tech_city = {(tech_id, city_id): count for tech_id, city_id, count in db_session.execute(
+            queries.compare_tech_city, {'tech_ids': tech_ids, 'city_ids': city_ids})}
+    if len(tech_ids) > 1:
+        tech_pairs = {(tech_id, other_id): count for tech_id, other_id, count in db_session.execute(
+            queries.compare_tech_pairs, {'tech_ids': tech_ids, 'other_ids': tech_ids})}
+    for name_ascii, tech_id, name, count in tech_items:
+        tech_pairs[(tech_id, tech_id)] = count
+    comparison = {
+        'techs': [{'name': name, 'name_ascii': name_ascii, 'count': count}
+                  for name_ascii, item_id, name, count in tech_items],
+        'cities': [{'name': name, 'name_ascii': name_ascii, 'count': count}
+                   for name_ascii, item_id, name, count in city_items],
+        'tech_city': [[tech_city.get((tech_id, city_id), 0) for city_id in city_ids]
+                      for tech_id in tech_ids],
+        'tech_pairs': [[tech_pairs.get((tech_id, other_id), 0) for other_id in tech_ids]
+                       for tech_id in tech_ids]
+    }
+    return comparison, techs_not_found + cities_not_found
+
+
+def get_chart(comparison, total):
+    """Get chart of the comparison: share of the technologies in each of
+    the cities, share of the technologies in the postings requiring each
+    of the technologies or share of the cities in all the postings.
+
+    Args:
+        comparison (dict): see get_comparison
+        total (int): total number of postings
+
+    Returns:
+        tuple (chart_type, args, kwargs), see Dashboard.chart
+    """
+    techs, cities = comparison['techs'], comparison['cities']
+    tech_names = [tech['name'] for tech in techs]
+    if techs and cities:
+        return ('bar_grouped',
+                ([city['name'] for city in cities],
+                 [(tech['name'], row) for tech, row in zip(techs, comparison['tech_city'])],
+                 [city['count'] for city in cities]),
+                {'title': 'Technologies in the cities',
+                 'ylabel': '% of job postings in the city'})
+    if techs:
+        return ('bar_grouped',
+                (tech_names,
+                 [(tech['name'], row) for tech, row in zip(techs, comparison['tech_pairs'])],
+                 [tech['count'] for tech in techs]),
+                {'title': 'Technologies required together',
+                 'ylabel': '% of job postings requiring the technology'})
+    return ('bar_single', ([(city['name'], city['count']) for city in cities], total),
+            {'title': 'Job postings in the cities'})
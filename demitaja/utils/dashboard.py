@@ -0,0 +1,216 @@
+"""Data of the charts for the requested technology and city."""
+
+from demitaja.utils.utils import normalize_string, check_item
+
+
+class Dashboard(object):
+    """This class resolves the technology and city requested by a request
+    once and builds data of all the charts, running each distinct query
+    at most once.
+    Attributes:
+        backend (object): backend answering the queries,
+            see demitaja.utils.backends
+        tech_name_ascii, city_name_ascii (str): normalized requested names
+        tech_name, city_name (str): database names of the requested items
+            or None if the item was not requested or is not in the database
+        tech_count (int): number of postings with the tech as must
+        city_count (int): number of postings in the city
+        results (dict): results of the queries run so far
+    """
+    charts = ('cities', 'techs', 'techs-tech')
+
+    def __init__(self, backend, request):
+        self.backend = backend
+        self.results = {}
+        # req_tech
+        self.tech_name_ascii, self.tech_name, self.tech_count = check_item(request, 'tech', self)
+        # req_city
+        self.city_name_ascii, self.city_name, self.city_count = check_item(request, 'city', self)
+
+    def query(self, name, **params):
+        """Run query of the backend unless it has already been run.
+        Return a copy of the result so that it can be modified.
+        """
+        key = (name, tuple(sorted((key, tuple(val) if isinstance(val, list) else val)
+                                  for key, val in params.items())))
+        if key not in self.results:
+            self.results[key] = getattr(self.backend, name)(**params)
+        result = self.results[key]
+        return list(result) if isinstance(result, list) else result
+
+    def tech(self, tech):
+        return self.query('tech', tech=tech)
+
+    def city(self, city):
+        return self.query('city', city=city)
+
+    @property
+    def total_postings(self):
+        """Total number of postings in the database"""
+        return self.query('total')
+
+    def chart(self, name):
+        """Get chart of the given name.
+
+        Returns:
+            None if there is no chart for the request or tuple
+            (chart_type, args, kwargs) where chart_type is name of the
+            function in demitaja.utils.charts and args and kwargs are
+            its arguments
+        """
+        return getattr(self, name.replace('-', '_') + '_chart')()
+
+    def cities_chart(self):
+        """Cities chart"""
+        tech_name_ascii, tech_name, tech_count = self.tech_name_ascii, self.tech_name, self.tech_count
+        city_name_ascii, city_name, city_count = self.city_name_ascii, self.city_name, self.city_count
+        if tech_name:
+            # Get 5 cities with most postings with req_tech as must
+            cities_tech = self.query('cities_tech', tech=tech_name_ascii)
+            # Get total number of job postings for each city in cities_tech
+            req_cities = [normalize_string(city[0]) for city in cities_tech]
+            if city_name and city_name_ascii not in req_cities:
+                # Get number of postings in req_city with req_tech as must
+                tech_city = self.query('tech_city', city=city_name_ascii, tech=tech_name_ascii)
+                if tech_city:
+                    # Append tech_city to req_cities and cities_tech
+                    req_cities.append(city_name_ascii)
+                    cities_tech.append((tech_city[1], tech_city[0], tech_city[2]))
+            cities_all = self.query('cities_count', cities=req_cities)
+            # Build tuple (no_of_postings_all, no_of_postings_req_tech)
+            total = (self.total_postings, tech_count)
+            # Build list of tuples (city_name, no_of_postings_all_techs, no_of_postings_req_tech)
+            cities_dict = dict(cities_all)
+            items = [[city[0], cities_dict[city[0]], city[2]] for city in cities_tech]
+            return ('bar_double', (items, total),
+                    {'title': 'Cities with most {} job postings'.format(tech_name),
+                     'legend': ('All technologies', tech_name)})
+        elif city_name:
+            # Build city tuple
+            city = (city_name, city_count)
+            # Get number of job postings for each of top 10 cities
+            cities = self.query('cities')
+            # Get index of req_city in cities
+            # If req_city is not in cities, append it
+            try:
+                city_index = cities.index(city)
+            except ValueError:
+                cities.append(city)
+                cities.sort(key=lambda x: x[1], reverse=True)
+                city_index = cities.index(city)
+            return ('bar_single', (cities, self.total_postings),
+                    {'title': 'Cities with most job postings',
+                     'highlight': city_index})
+        # Get number of job postings for each of top 10 cities
+        cities = self.query('cities')
+        return ('bar_single', (cities, self.total_postings),
+                {'title': 'Cities with most job postings'})
+
+    def techs_chart(self):
+        """Technologies chart"""
+        tech_name_ascii, tech_name, tech_count = self.tech_name_ascii, self.tech_name, self.tech_count
+        city_name_ascii, city_name, city_count = self.city_name_ascii, self.city_name, self.city_count
+        if city_name:
+            # Get number of postings of top 5 technologies in req_city
+            techs_city = self.query('techs_city', city=city_name_ascii)
+            # Get total number of job postings for each technology in techs_city
+            req_techs = [normalize_string(tech[0]) for tech in techs_city]
+            if tech_name and tech_name_ascii not in req_techs:
+                # Get number of postings in req_city with req_tech as must
+                tech_city = self.query('tech_city', city=city_name_ascii, tech=tech_name_ascii)
+                if tech_city:
+                    # Append tech_city to req_techs and techs_city
+                    req_techs.append(tech_name_ascii)
+                    techs_city.append(tech_city)
+            techs_all = self.query('techs_count', techs=req_techs)
+            # Build tuple (no_of_postings_all, no_of_postings_req_city)
+            total = (self.total_postings, city_count)
+            # Build list of tuples (tech_name, no_of_postings_all_cities, no_of_postings_req_city)
+            techs_dict = dict(techs_all)
+            items = [[tech[0], techs_dict[tech[0]], tech[2]] for tech in techs_city]
+            return ('bar_double', (items, total),
+                    {'title': 'Most in-demand technologies in {}'.format(city_name),
+                     'legend': ('All cities', city_name)})
+        elif tech_name:
+            # Get number of job postings with req_tech as must
+            tech = (tech_name, tech_count)
+            # Get number of job postings for each of top 10 technologies
+            techs = self.query('techs')
+            # Get index of req_tech in techs
+            # If req_tech not in techs, append it
+            try:
+                tech_index = techs.index(tech)
+            except ValueError:
+                techs.append(tech)
+                techs.sort(key=lambda x: x[1], reverse=True)
+                tech_index = techs.index(tech)
+            return ('bar_single', (techs, self.total_postings),
+                    {'title': 'Most in-demand technologies',
+                     'highlight': tech_index})
+        # Get number of job postings for each of top 10 technologies
+        techs = self.query('techs')
+        return ('bar_single', (techs, self.total_postings),
+                {'title': 'Most in-demand technologies'})
+
+    def techs_tech_chart(self):
+        """Techs tech chart"""
+        tech_name_ascii, tech_name, tech_count = self.tech_name_ascii, self.tech_name, self.tech_count
+        city_name_ascii, city_name = self.city_name_ascii, self.city_name
+        if city_name and tech_name:
+            # Get number of postings in req_city with req_tech as must
+            tech_city = self.query('tech_city', city=city_name_ascii, tech=tech_name_ascii)
+            if not tech_city:
+                # no postings with req_tech in req_city
+                return None
+            # Technologies most often required in postings requiring req_tech in req_city
+            techs_tech_city = self.query('techs_tech_city', city=city_name_ascii, tech=tech_name_ascii)
+            if not techs_tech_city:
+                return None
+            # Get total number of job postings for techs in techs_tech_city
+            req_techs_tech = [normalize_string(tech[0]) for tech in techs_tech_city]
+            techs_tech_all = self.query('techs_tech_count', tech=tech_name_ascii, techs=req_techs_tech)
+            # Build tuple (no_of_postings_req_tech, no_of_postings_req_tech_req_city)
+            total = (tech_count, tech_city[2])
+            # Build list of tuples (tech_name, no_of_postings_tech_req_tech, no_of_postings_tech_req_tech_req_city)
+            techs_tech_dict = dict(techs_tech_all)
+            items = [[tech[0], techs_tech_dict[tech[0]], tech[3]] for tech in techs_tech_city]
+            return ('bar_double', (items, total),
+                    {'title': 'Technologies most often required  in {} job postings'.format(tech_name),
+                     'legend': ('All cities', city_name)})
+        elif tech_name:
+            # Top 5 technologies required in postings requiring req_tech
+            techs_tech = self.query('techs_tech', tech=tech_name_ascii)
+            if not techs_tech:
+                return None
+            items = [(tech[0], tech[2]) for tech in techs_tech]
+            return ('bar_single', (items, tech_count),
+                    {'title': 'Technologies most often required in {} job postings'.format(tech_name)})
+        # no data for chart if no req_tech
+        return None
+
+    def charts_data(self):
+        """Charts data in textual format; variables of charts-data.html"""
+        tech_name_ascii, tech_name = self.tech_name_ascii, self.tech_name
+        city_name_ascii, city_name = self.city_name_ascii, self.city_name
+        data = {
+            'tech_name': tech_name,
+            'city_name': city_name,
+            'tech_count': self.tech_count,
+            'city_count': self.city_count
+        }
+        if city_name:
+            # Technologies most in-demand in req_city
+            data['techs_city'] = self.query('techs_city', city=city_name_ascii)
+        if tech_name:
+            # Cities with most job postings requiring req_tech
+            data['cities_tech'] = self.query('cities_tech', tech=tech_name_ascii)
+            # Technologies most often required in postings requiring req_tech
+            data['techs_tech'] = self.query('techs_tech', tech=tech_name_ascii)
+        if city_name and tech_name:
+            # Demand for req_tech in req_city
+            data['tech_city'] = self.query('tech_city', city=city_name_ascii, tech=tech_name_ascii)
+            if not data['tech_city']:
+                data['tech_city'] = (tech_name, city_name, 0)
+            # Technologies most often required in postings requiring req_tech in req_city
+            data['techs_tech_city'] = self.query('techs_tech_city', city=city_name_ascii, tech=tech_name_ascii)
+        return data
@@ -0,0 +1,188 @@
+"""In-memory analytics engine answering the chart queries with NumPy.
+
+The posting x must technology and posting x city incidence relations are
+held as pairs of int32 arrays (posting index, item index). Every query is
+a count of items over a subset of postings, which is computed with a
+boolean posting mask and numpy.bincount.
+"""
+
+import numpy as np
+from sqlalchemy import text
+from demitaja.database import db_session
+from demitaja.utils.utils import get_data_version
+
+
+class AnalyticsEngine(object):
+    """This class answers the same queries as the SQL backend
+    (see demitaja.utils.backends) from arrays loaded from the database.
+    Attributes:
+        version (int): data version of the database when it was loaded
+        tech_names (list), city_names (list): names of the items by index
+        tech_index (dict), city_index (dict): name_ascii -> index
+        must_posting, must_tech (ndarray): postings_techs_must pairs
+        city_posting, city_city (ndarray): postings_cities pairs
+        tech_counts, city_counts (ndarray): number of postings per item
+        postings (int): number of postings with any technology or city
+        total_postings (int): number of all the postings
+    """
+    def __init__(self):
+        self.version = None
+
+    def load(self):
+        """Load the incidence relations from the database"""
+        self.version = get_data_version()
+        self.total_postings = db_session.execute(text('SELECT COUNT(*) FROM postings')).scalar()
+        self.tech_names, self.tech_index, tech_ids = self.load_items('technologies')
+        self.city_names, self.city_index, city_ids = self.load_items('cities')
+        must = self.load_pairs('SELECT posting_id, must_id FROM postings_techs_must')
+        cities = self.load_pairs('SELECT posting_id, city_id FROM postings_cities')
+        # map ids onto compact indices
+        posting_ids, postings = np.unique(np.concatenate([must[:, 0], cities[:, 0]]),
+                                          return_inverse=True)
+        self.postings = len(posting_ids)
+        self.must_posting = postings[:len(must)].astype(np.int32)
+        self.city_posting = postings[len(must):].astype(np.int32)
+        self.must_tech = np.searchsorted(tech_ids, must[:, 1]).astype(np.int32)
+        self.city_city = np.searchsorted(city_ids, cities[:, 1]).astype(np.int32)
+        self.tech_counts = np.bincount(self.must_tech, minlength=len(self.tech_names))
+        self.city_counts = np.bincount(self.city_city, minlength=len(self.city_names))
+
+    def load_items(self, table):
+        """Load technologies or cities ordered by id.
+        Return list of names, dict name_ascii -> index and array of ids.
+        """
+        rows = db_session.execute(text(
+            'SELECT id, name, name_ascii FROM {} ORDER BY id'.format(table))).fetchall()
+        names = [row.name for row in rows]
+        index = {row.name_ascii: i for i, row in enumerate(rows)}
+        ids = np.array([row.id for row in rows], dtype=np.int64)
+        return names, index, ids
+
+    def load_pairs(self, query):
+        """Load association table into (n, 2) array"""
+        pairs = np.array(db_session.execute(text(query)).fetchall(), dtype=np.int64)
+        return pairs.reshape(-1, 2)
+
+    ###########
+    # Helpers #
+    ###########
+
+    def posting_mask(self, tech=None, city=None):
+        """Return boolean mask of the postings with the tech as must
+        and/or in the city
+        """
+        mask = np.ones(self.postings, dtype=bool)
+        if tech is not None:
+            tech_mask = np.zeros(self.postings, dtype=bool)
+            tech_mask[self.must_posting[self.must_tech == tech]] = True
+            mask &= tech_mask
+        if city is not None:
+            city_mask = np.zeros(self.postings, dtype=bool)
+            city_mask[self.city_posting[self.city_city == city]] = True
+            mask &= city_mask
+        return mask
+
+    def count_techs(self, mask):
+        """Count postings in the mask per must technology"""
+        return np.bincount(self.must_tech[mask[self.must_posting]],
+                           minlength=len(self.tech_names))
+
+    def count_cities(self, mask):
+        """Count postings in the mask per city"""
+        return np.bincount(self.city_city[mask[self.city_posting]],
+                           minlength=len(self.city_names))
+
+    @staticmethod
+    def top(counts, limit, exclude=None):
+        """Return indices of at most limit items with the highest
+        non-zero counts; ties are broken by index (i.e. by id).
+        """
+        counts = counts.copy()
+        if exclude is not None:
+            counts[exclude] = 0
+        # stable sort keeps indices of equal counts in ascending order
+        order = np.argsort(-counts, kind='stable')[:limit]
+        return [int(i) for i in order if counts[i] > 0]
+
+    ###########
+    # Queries #
+    ###########
+
+    def total(self):
+        return self.total_postings
+
+    def techs(self):
+        return [(self.tech_names[i], int(self.tech_counts[i]))
+                for i in self.top(self.tech_counts, 10)]
+
+    def cities(self):
+        return [(self.city_names[i], int(self.city_counts[i]))
+                for i in self.top(self.city_counts, 10)]
+
+    def tech(self, tech):
+        i = self.tech_index.get(tech)
+        if i is None or not self.tech_counts[i]:
+            return None
+        return self.tech_names[i], int(self.tech_counts[i])
+
+    def city(self, city):
+        i = self.city_index.get(city)
+        if i is None or not self.city_counts[i]:
+            return None
+        return self.city_names[i], int(self.city_counts[i])
+
+    def techs_count(self, techs):
+        return [row for row in (self.tech(tech) for tech in set(techs)) if row]
+
+    def cities_count(self, cities):
+        return [row for row in (self.city(city) for city in set(cities)) if row]
+
+    def cities_tech(self, tech):
+        t = self.tech_index.get(tech)
+        if t is None:
+            return []
+        counts = self.count_cities(self.posting_mask(tech=t))
+        return [(self.city_names[i], self.tech_names[t], int(counts[i]))
+                for i in self.top(counts, 5)]
+
+    def techs_city(self, city):
+        c = self.city_index.get(city)
+        if c is None:
+            return []
+        counts = self.count_techs(self.posting_mask(city=c))
+        return [(self.tech_names[i], self.city_names[c], int(counts[i]))
+                for i in self.top(counts, 5)]
+
+    def tech_city(self, tech, city):
+        t, c = self.tech_index.get(tech), self.city_index.get(city)
+        if t is None or c is None:
+            return None
+        count = int(self.posting_mask(tech=t, city=c).sum())
+        if not count:
+            return None
+        return self.tech_names[t], self.city_names[c], count
+
+    def techs_tech(self, tech):
+        t = self.tech_index.get(tech)
+        if t is None:
+            return []
+        counts = self.count_techs(self.posting_mask(tech=t))
+        return [(self.tech_names[i], self.tech_names[t], int(counts[i]))
+                for i in self.top(counts, 5, exclude=t)]
+
+    def techs_tech_count(self, tech, techs):
+        t = self.tech_index.get(tech)
+        if t is None:
+            return []
+        counts = self.count_techs(self.posting_mask(tech=t))
+        indices = {self.tech_index[name] for name in techs if name in self.tech_index}
+        return [(self.tech_names[i], int(counts[i])) for i in indices
+                if i != t and counts[i]]
+
+    def techs_tech_city(self, tech, city):
+        t, c = self.tech_index.get(tech), self.city_index.get(city)
+        if t is None or c is None:
+            return []
+        counts = self.count_techs(self.posting_mask(tech=t, city=c))
+        return [(self.tech_names[i], self.tech_names[t], self.city_names[c], int(counts[i]))
+                for i in self.top(counts, 5, exclude=t)]
@@ -0,0 +1,193 @@
+"""In-process identity maps of cities and technologies."""
+
+import threading
+from sqlalchemy.exc import IntegrityError
+from demitaja.database import db_session
+from demitaja.models import City, Technology, cities_aliases, technologies_aliases
+from demitaja.utils.metrics import metrics, get_samples
+
+
+class NameCache(object):
+    """This class caches ids and names of all the rows of the cities or
+    technologies table keyed by name_ascii, and the aliases of the items.
+    The tables are loaded once and the cache is updated whenever a new row
+    is inserted through it. Lookups by an alias return the item the alias
+    refers to.
+    Attributes:
+        model (class): City or Technology
+        alias_column (Column): column of the aliases table referring to
+            the items
+        items (dict): name_ascii -> (id, name)
+        aliases (dict): alias_ascii -> name_ascii of the item
+        loaded (bool): True if the table has been loaded
+        hits (int): number of lookups answered from the cache
+        misses (int): number of lookups which had to go to the database
+    """
+    def __init__(self, model, alias_column):
+        self.model = model
+        self.alias_column = alias_column
+        self.items = {}
+        self.aliases = {}
+        self.loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+
+    def load(self):
+        """Load all the rows of the table and the aliases into the cache"""
+        model = self.model
+        rows = db_session.query(model.id, model.name, model.name_ascii).all()
+        aliases = self.query_aliases().all()
+        with self.lock:
+            self.items = {row.name_ascii: (row.id, row.name) for row in rows}
+            self.aliases = dict(aliases)
+            self.loaded = True
+
+    def invalidate(self):
+        """Drop the cache; it is reloaded on the next lookup.
+        Must be called after rolling back a transaction which inserted
+        rows through the cache.
+        """
+        with self.lock:
+            self.items = {}
+            self.aliases = {}
+            self.loaded = False
+
+    def lookup(self, name_ascii):
+        """Return (id, name) of the item or None if the item is not cached"""
+        if not self.loaded:
+            self.load()
+        item = self.items.get(self.aliases.get(name_ascii, name_ascii))
+        if item:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return item
+
+    def get_id(self, name_ascii):
+        """Return id of the item or None if the item is not in the database"""
+        item = self.lookup(name_ascii)
+        if not item:
+            item = self.fetch([name_ascii]).get(name_ascii)
+        return item[0] if item else None
+
+    def resolve(self, name_ascii):
+        """Return name_ascii of the item with the name or alias; the name
+        itself if it is not in the database
+        """
+        if self.get_id(name_ascii) is None:
+            return name_ascii
+        return self.aliases.get(name_ascii, name_ascii)
+
+    def resolve_cached(self, name_ascii):
+        """Return name_ascii of the item with the name or alias according
+        to the cache alone, without querying the database; the name itself
+        if it is not an alias in the cache
+        """
+        if not self.loaded:
+            self.load()
+        return self.aliases.get(name_ascii, name_ascii)
+
+    def get_ids(self, names):
+        """Get ids of the items, inserting the missing ones into the database.
+
+        Args:
+            names (dict): name_ascii -> name of each item
+
+        Returns:
+            dict mapping name_ascii of each item to its id
+        """
+        ids = {}
+        missing = []
+        for name_ascii in names:
+            item = self.lookup(name_ascii)
+            if item:
+                ids[name_ascii] = item[0]
+            else:
+                missing.append(name_ascii)
+        if not missing:
+            return ids
+        with self.lock:
+            # the items may have been inserted by another writer
+            found = self.fetch(missing)
+            ids.update((name_ascii, item[0]) for name_ascii, item in found.items())
+            missing = [name_ascii for name_ascii in missing if name_ascii not in found]
+            if not missing:
+                return ids
+            try:
+                with db_session.begin_nested():
+                    db_session.execute(self.model.__table__.insert(),
+                                       [{'name': names[name_ascii], 'name_ascii': name_ascii}
+                                        for name_ascii in missing])
+            except IntegrityError:
+                # another writer inserted some of the items in the meantime
+                for name_ascii in missing:
+                    ids[name_ascii] = self.get_or_create(name_ascii, names[name_ascii])
+                return ids
+            found = self.fetch(missing)
+        ids.update((name_ascii, item[0]) for name_ascii, item in found.items())
+        return ids
+
+    def get_or_create(self, name_ascii, name):
+        """Return id of the item, inserting it into the database if needed.
+        The insert is made within a savepoint so that a concurrent insert
+        of the same item by another writer is resolved into its id.
+        """
+        item_id = self.get_id(name_ascii)
+        if item_id is not None:
+            return item_id
+        with self.lock:
+            try:
+                with db_session.begin_nested():
+                    db_session.execute(self.model.__table__.insert(),
+                                       {'name': name, 'name_ascii': name_ascii})
+            except IntegrityError:
+                pass
+            return self.fetch([name_ascii])[name_ascii][0]
+
+    def fetch(self, names_ascii):
+        """Load given items, found by their names or aliases, from the
+        database into the cache.
+        Return dict name_ascii -> (id, name) of the items found; aliases
+        map to the items they refer to.
+        """
+        model = self.model
+        rows = db_session.query(model.id, model.name, model.name_ascii).filter(
+            model.name_ascii.in_(names_ascii)).all()
+        found = {row.name_ascii: (row.id, row.name) for row in rows}
+        aliases = {}
+        missing = [name_ascii for name_ascii in names_ascii if name_ascii not in found]
+        if missing:
+            aliases = dict(self.query_aliases().filter(
+                self.alias_column.table.c.alias_ascii.in_(missing)).all())
+            if aliases:
+                items = self.fetch(list(set(aliases.values())))
+                found.update((alias_ascii, items[name_ascii])
+                             for alias_ascii, name_ascii in aliases.items())
+        with self.lock:
+            self.items.update((name_ascii, item) for name_ascii, item in found.items()
+                              if name_ascii not in aliases)
+            self.aliases.update(aliases)
+        return found
+
+    def query_aliases(self):
+        """Return query of tuples (alias_ascii, name_ascii of the item)"""
+        aliases = self.alias_column.table
+        return db_session.query(aliases.c.alias_ascii, self.model.name_ascii).join(
+            self.model, self.model.id == self.alias_column)
+
+    def stats(self):
+        """Return hit/miss counters of the cache (dict)"""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.items),
+                'aliases': len(self.aliases)}
+
+
+city_cache = NameCache(City, cities_aliases.c.city_id)
+tech_cache = NameCache(Technology, technologies_aliases.c.tech_id)
+
+
+@metrics.register
+def cache_metrics():
+    """Samples of the city and technology caches"""
+    return (get_samples('name_cache_', city_cache.stats(), ('hits', 'misses'), cache='city')
+            + get_samples('name_cache_', tech_cache.stats(), ('hits', 'misses'), cache='tech'))
@@ -0,0 +1,181 @@
+"""In-process metrics exposed in the Prometheus text format.
+
+SQL statements are counted and timed by SQLAlchemy event listeners;
+statements executed while handling a request are also added to the
+request's totals reported in the optional Server-Timing header (see
+end_request).
+"""
+
+import os
+import threading
+import time
+from flask import g, has_request_context
+
+
+class Metrics(object):
+    """This class defines registry of counters and summaries (sum and
+    count of observations) with labels, and of collectors computing
+    gauges and counters when the metrics are rendered. Names of the
+    counters end with _total.
+    Attributes:
+        prefix (str): prefix of the names of the metrics
+        descriptions (dict): name -> (type, help) of each metric
+        values (dict): (name, labels) -> value of each counter
+        collectors (list): functions returning list of tuples
+            (name, labels, value) of the samples
+    """
+    def __init__(self, prefix='demitaja_'):
+        self.prefix = prefix
+        self.descriptions = {}
+        self.values = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def describe(self, name, kind, text):
+        """Declare metric of the kind counter, summary or gauge"""
+        self.descriptions[name] = (kind, text)
+
+    def inc(self, name, value=1, **labels):
+        """Increment counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Add observation (e.g. duration [s]) to summary"""
+        self.inc(name + '_sum', value, **labels)
+        self.inc(name + '_count', 1, **labels)
+
+    def register(self, collector):
+        """Add function returning samples (list of (name, labels, value))"""
+        self.collectors.append(collector)
+        return collector
+
+    def render(self):
+        """Return all the metrics in the Prometheus text format (str)"""
+        with self.lock:
+            samples = [(name, dict(labels), value) for (name, labels), value in self.values.items()]
+        for collector in self.collectors:
+            samples += collector()
+        by_metric = {}
+        for name, labels, value in samples:
+            metric = name
+            for suffix in ('_sum', '_count'):
+                if name.endswith(suffix) and name[:-len(suffix)] in self.descriptions:
+                    metric = name[:-len(suffix)]
+            by_metric.setdefault(metric, []).append((name, labels, value))
+        lines = []
+        for metric in sorted(by_metric):
+            kind, text = self.descriptions.get(metric, ('untyped', ''))
+            lines.append('# HELP {}{} {}'.format(self.prefix, metric, text))
+            lines.append('# TYPE {}{} {}'.format(self.prefix, metric, kind))
+            for name, labels, value in sorted(by_metric[metric], key=lambda s: (s[0], sorted(s[1].items()))):
+                lines.append('{}{}{} {}'.format(self.prefix, name, format_labels(labels), value))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Write the metrics to a file, e.g. for the textfile collector of
+        the Prometheus node exporter
+        """
+        with open(path + '.tmp', 'w') as f:
+            f.write(self.render())
+        os.replace(path + '.tmp', path)
+
+
+def get_samples(prefix, stats, counters=(), **labels):
+    """Turn statistics (dict) of a cache into samples for a collector;
+    the statistics named in counters only grow and get the _total suffix
+    of the Prometheus counters
+    """
+    return [(prefix + key + ('_total' if key in counters else ''), labels, value)
+            for key, value in stats.items()]
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for key, value in sorted(labels.items())) + '}'
+
+
+metrics = Metrics()
+metrics.describe('sql_statements', 'summary', 'SQL statements and their execution time [s].')
+metrics.describe('http_requests', 'summary', 'HTTP requests and their handling time [s].')
+metrics.describe('http_request_sql_statements_total', 'counter', 'SQL statements executed by the requests.')
+metrics.describe('chart_renders', 'summary', 'Charts rendered and their rendering time [s].')
+metrics.describe('ingest_postings', 'summary', 'Batches of postings inserted and their insertion time [s].')
+metrics.describe('ingest_postings_added_total', 'counter', 'Postings added to the database.')
+metrics.describe('ingest_batches_rolled_back_total', 'counter', 'Batches of postings rolled back.')
+metrics.describe('chart_cache_entries', 'gauge', 'Charts in the memory tier of the chart cache.')
+metrics.describe('chart_cache_bytes', 'gauge', 'Size of the charts in the memory tier of the chart cache.')
+metrics.describe('chart_cache_hits_total', 'counter', 'Chart cache hits in memory.')
+metrics.describe('chart_cache_disk_hits_total', 'counter', 'Chart cache hits on disk.')
+metrics.describe('chart_cache_misses_total', 'counter', 'Chart cache misses.')
+metrics.describe('chart_cache_renders_total', 'counter', 'Charts rendered on chart cache misses.')
+metrics.describe('chart_cache_render_time_total', 'counter', 'Total time of the renders on chart cache misses [s].')
+metrics.describe('chart_cache_avg_render_time', 'gauge', 'Average time of a render on chart cache miss [s].')
+metrics.describe('name_cache_hits_total', 'counter', 'Hits of the city and technology caches.')
+metrics.describe('name_cache_misses_total', 'counter', 'Misses of the city and technology caches.')
+metrics.describe('name_cache_size', 'gauge', 'Items in the city and technology caches.')
+metrics.describe('name_cache_aliases', 'gauge', 'Aliases in the city and technology caches.')
+
+
+###############
+# SQL metrics #
+###############
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    metrics.observe('sql_statements', elapsed)
+    if has_request_context():
+        g.sql_statements = g.get('sql_statements', 0) + 1
+        g.sql_time = g.get('sql_time', 0) + elapsed
+
+
+def instrument_engine(engine):
+    """Count and time SQL statements executed by the engine"""
+    from sqlalchemy import event
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+
+###################
+# Request metrics #
+###################
+
+def start_request():
+    """Start timing the current request"""
+    g.request_start = time.perf_counter()
+
+
+def add_render_time(elapsed):
+    """Add chart rendering time to the current request's totals"""
+    if has_request_context():
+        g.render_time = g.get('render_time', 0) + elapsed
+
+
+def end_request(endpoint, status):
+    """Record the current request.
+    Return timings of the request: dict with total, sql and render time
+    [s] and number of SQL statements.
+    """
+    timings = {
+        'total': time.perf_counter() - g.get('request_start', time.perf_counter()),
+        'sql': g.get('sql_time', 0),
+        'sql_statements': g.get('sql_statements', 0),
+        'render': g.get('render_time', 0)
+    }
+    metrics.observe('http_requests', timings['total'], endpoint=endpoint, status=status)
+    metrics.inc('http_request_sql_statements_total', timings['sql_statements'], endpoint=endpoint)
+    return timings
+
+
+def server_timing(timings):
+    """Format timings of the request as Server-Timing header value"""
+    return 'sql;dur={:.2f};desc="{} statements", render;dur={:.2f}, total;dur={:.2f}'.format(
+        timings['sql'] * 1000, timings['sql_statements'],
+        timings['render'] * 1000, timings['total'] * 1000)
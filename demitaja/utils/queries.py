@@ -1,135 +1,251 @@
-"""SQL queries."""
+"""SQL queries.
+
+All the queries read the aggregate tables maintained on ingest
+(see demitaja.utils.aggregates) instead of joining the association tables.
+Ties in the rankings are broken by id of the item so that the results are
+deterministic.
+"""
 
 import sqlalchemy
 
 
+# Get total number of postings
+total = sqlalchemy.sql.text(
+    "SELECT COALESCE((SELECT count FROM total_counts WHERE name='postings'), 0)"
+)
+
+
 # Get 10 most in-demand technologies
 techs = sqlalchemy.sql.text(
-    "SELECT technologies.name, COUNT(*) AS count "
-    "FROM postings_techs_must "
+    "SELECT technologies.name, tech_counts.count AS count "
+    "FROM tech_counts "
     "JOIN technologies "
-    "ON postings_techs_must.must_id=technologies.id "
-    "GROUP BY technologies.name "
-    "ORDER BY count DESC "
+    "ON tech_counts.tech_id=technologies.id "
+    "ORDER BY count DESC, tech_counts.tech_id "
     "LIMIT 10"
 )
 
 
 # Get 10 cities with most postings
 cities = sqlalchemy.sql.text(
-    "SELECT cities.name, COUNT(*) AS count "
-    "FROM postings_cities "
+    "SELECT cities.name, city_counts.count AS count "
+    "FROM city_counts "
     "JOIN cities "
-    "ON postings_cities.city_id=cities.id "
-    "GROUP BY cities.name "
-    "ORDER BY count DESC "
+    "ON city_counts.city_id=cities.id "
+    "ORDER BY count DESC, city_counts.city_id "
     "LIMIT 10"
 )
 
 # Get number of job postings in a given city
 city = sqlalchemy.sql.text(
-    "SELECT cities.name, COUNT(*) "
-    "FROM postings_cities "
+    "SELECT cities.name, city_counts.count "
+    "FROM city_counts "
     "JOIN cities "
-    "ON postings_cities.city_id=cities.id "
-    "WHERE cities.name_ascii=:city "
-    "GROUP BY cities.name"
+    "ON city_counts.city_id=cities.id "
+    "WHERE cities.name_ascii=:city"
 )
 
 # Get demand for a given technology
 tech = sqlalchemy.sql.text(
-    "SELECT technologies.name, COUNT(*) "
-    "FROM postings_techs_must "
+    "SELECT technologies.name, tech_counts.count "
+    "FROM tech_counts "
     "JOIN technologies "
-    "ON postings_techs_must.must_id=technologies.id "
-    "WHERE technologies.name_ascii=:tech "
-    "GROUP BY technologies.name"
+    "ON tech_counts.tech_id=technologies.id "
+    "WHERE technologies.name_ascii=:tech"
 )
 
+# Get number of job postings in each of given cities
+cities_count = sqlalchemy.sql.text(
+    "SELECT cities.name, city_counts.count "
+    "FROM city_counts "
+    "JOIN cities "
+    "ON city_counts.city_id=cities.id "
+    "WHERE cities.name_ascii IN :cities"
+).bindparams(sqlalchemy.bindparam('cities', expanding=True))
+
+# Get demand for each of given technologies
+techs_count = sqlalchemy.sql.text(
+    "SELECT technologies.name, tech_counts.count "
+    "FROM tech_counts "
+    "JOIN technologies "
+    "ON tech_counts.tech_id=technologies.id "
+    "WHERE technologies.name_ascii IN :techs"
+).bindparams(sqlalchemy.bindparam('techs', expanding=True))
+
 # Get 5 cities with most postings requiring a given technology
 cities_tech = sqlalchemy.sql.text(
-    "SELECT cities.name, technologies.name, COUNT(*) AS count "
-    "FROM postings_cities "
+    "SELECT cities.name, technologies.name, tech_city_counts.count AS count "
+    "FROM tech_city_counts "
     "JOIN cities "
-        "ON postings_cities.city_id=cities.id "
-    "JOIN postings_techs_must "
-        "ON postings_techs_must.posting_id=postings_cities.posting_id "
+        "ON tech_city_counts.city_id=cities.id "
     "JOIN technologies "
-        "ON postings_techs_must.must_id=technologies.id "
+        "ON tech_city_counts.tech_id=technologies.id "
     "WHERE technologies.name_ascii=:tech "
-    "GROUP BY cities.name "
-    "ORDER BY count DESC "
+    "ORDER BY count DESC, tech_city_counts.city_id "
     "LIMIT 5"
 )
 
 # Get 5 most in-demand technologies in a given city
 techs_city = sqlalchemy.sql.text(
-    "SELECT technologies.name, cities.name, COUNT(*) AS count "
-    "FROM postings_cities "
+    "SELECT technologies.name, cities.name, tech_city_counts.count AS count "
+    "FROM tech_city_counts "
     "JOIN cities "
-        "ON postings_cities.city_id=cities.id "
-    "JOIN postings_techs_must "
-        "ON postings_techs_must.posting_id=postings_cities.posting_id "
+        "ON tech_city_counts.city_id=cities.id "
     "JOIN technologies "
-        "ON postings_techs_must.must_id=technologies.id "
+        "ON tech_city_counts.tech_id=technologies.id "
     "WHERE cities.name_ascii=:city "
-    "GROUP BY technologies.name "
-    "ORDER BY count DESC "
+    "ORDER BY count DESC, tech_city_counts.tech_id "
     "LIMIT 5"
 )
 
 # Get demand for a given technology in a given city
 tech_city = sqlalchemy.sql.text(
-    "SELECT technologies.name, cities.name, COUNT(*) AS count "
-    "FROM postings_cities "
+    "SELECT technologies.name, cities.name, tech_city_counts.count AS count "
+    "FROM tech_city_counts "
     "JOIN cities "
-        "ON postings_cities.city_id=cities.id "
-    "JOIN postings_techs_must "
-        "ON postings_techs_must.posting_id=postings_cities.posting_id "
+        "ON tech_city_counts.city_id=cities.id "
     "JOIN technologies "
-        "ON postings_techs_must.must_id=technologies.id "
+        "ON tech_city_counts.tech_id=technologies.id "
     "WHERE cities.name_ascii=:city "
-        "AND technologies.name_ascii=:tech "
-    "GROUP BY technologies.name "
-    "ORDER BY count DESC "
-    "LIMIT 5"
+        "AND technologies.name_ascii=:tech"
 )
 
 # Get 5 technologies most often accompanying a given technology in postings
 techs_tech = sqlalchemy.sql.text(
-    "SELECT t1.name, t2.name, COUNT(*) AS count "
-    "FROM technologies t1 "
-    "JOIN postings_techs_must pt1 "
-        "ON pt1.must_id=t1.id "
-    "JOIN postings_techs_must pt2 "
-        "ON pt1.posting_id=pt2.posting_id "
+    "SELECT t1.name, t2.name, tech_pair_counts.count AS count "
+    "FROM tech_pair_counts "
+    "JOIN technologies t1 "
+        "ON tech_pair_counts.other_id=t1.id "
     "JOIN technologies t2 "
-        "ON pt2.must_id=t2.id "
+        "ON tech_pair_counts.tech_id=t2.id "
     "WHERE t2.name_ascii=:tech "
-        "AND t1.name_ascii<>:tech "
-    "GROUP BY t1.name "
-    "ORDER BY count DESC "
+    "ORDER BY count DESC, tech_pair_counts.other_id "
     "LIMIT 5"
 )
 
+# Get number of postings requiring a given technology together with
+# each of given technologies
+techs_tech_count = sqlalchemy.sql.text(
+    "SELECT t1.name, tech_pair_counts.count "
+    "FROM tech_pair_counts "
+    "JOIN technologies t1 "
+        "ON tech_pair_counts.other_id=t1.id "
+    "JOIN technologies t2 "
+        "ON tech_pair_counts.tech_id=t2.id "
+    "WHERE t2.name_ascii=:tech "
+        "AND t1.name_ascii IN :techs"
+).bindparams(sqlalchemy.bindparam('techs', expanding=True))
+
 # Get 5 technologies most often accompanying a given technology in a given city in postings
 techs_tech_city = sqlalchemy.sql.text(
-    "SELECT t1.name, t2.name, cities.name, COUNT(*) AS count "
-    "FROM technologies t1 "
-    "JOIN postings_techs_must AS pt1 "
-        "ON pt1.must_id=t1.id "
-    "JOIN postings_techs_must AS pt2 "
-        "ON pt1.posting_id=pt2.posting_id "
+    "SELECT t1.name, t2.name, cities.name, tech_pair_city_counts.count AS count "
+    "FROM tech_pair_city_counts "
+    "JOIN technologies t1 "
+        "ON tech_pair_city_counts.other_id=t1.id "
     "JOIN technologies t2 "
-        "ON pt2.must_id=t2.id "
-    "JOIN postings_cities "
-        "ON pt1.posting_id=postings_cities.posting_id "
+        "ON tech_pair_city_counts.tech_id=t2.id "
     "JOIN cities "
-        "ON postings_cities.city_id=cities.id "
+        "ON tech_pair_city_counts.city_id=cities.id "
     "WHERE t2.name_ascii=:tech "
-        "AND t1.name_ascii<>:tech "
         "AND cities.name_ascii=:city "
-    "GROUP BY t1.name "
-    "ORDER BY count DESC "
+    "ORDER BY count DESC, tech_pair_city_counts.other_id "
     "LIMIT 5"
 )
+
+# Get number of postings posted on each day of a given range
+trend = sqlalchemy.sql.text(
+    "SELECT day, count "
+    "FROM daily_counts "
+    "WHERE day BETWEEN :start AND :end"
+)
+
+# Get number of postings requiring a given technology posted on each day of a given range
+trend_tech = sqlalchemy.sql.text(
+    "SELECT daily_tech_counts.day, daily_tech_counts.count "
+    "FROM daily_tech_counts "
+    "JOIN technologies "
+        "ON daily_tech_counts.tech_id=technologies.id "
+    "WHERE technologies.name_ascii=:tech "
+        "AND daily_tech_counts.day BETWEEN :start AND :end"
+)
+
+# Get number of postings in a given city posted on each day of a given range
+trend_city = sqlalchemy.sql.text(
+    "SELECT daily_city_counts.day, daily_city_counts.count "
+    "FROM daily_city_counts "
+    "JOIN cities "
+        "ON daily_city_counts.city_id=cities.id "
+    "WHERE cities.name_ascii=:city "
+        "AND daily_city_counts.day BETWEEN :start AND :end"
+)
+
+# Get number of postings requiring a given technology in a given city
+# posted on each day of a given range
+trend_tech_city = sqlalchemy.sql.text(
+    "SELECT daily_tech_city_counts.day, daily_tech_city_counts.count "
+    "FROM daily_tech_city_counts "
+    "JOIN technologies "
+        "ON daily_tech_city_counts.tech_id=technologies.id "
+    "JOIN cities "
+        "ON daily_tech_city_counts.city_id=cities.id "
+    "WHERE technologies.name_ascii=:tech "
+        "AND cities.name_ascii=:city "
+        "AND daily_tech_city_counts.day BETWEEN :start AND :end"
+)
+
+# Get days of the oldest and newest postings
+# (separate subqueries so that each reads a single row of the primary key)
+trend_range = sqlalchemy.sql.text(
+    "SELECT (SELECT MIN(day) FROM daily_counts), "
+    "(SELECT MAX(day) FROM daily_counts)"
+)
+
+# Get salary histograms of postings with a given technology (or 0) as must
+# in a given city (or 0)
+salary_histogram = sqlalchemy.sql.text(
+    "SELECT employment_type_ascii, bucket, count "
+    "FROM salary_histograms "
+    "WHERE tech_id=:tech_id "
+        "AND city_id=:city_id "
+    "ORDER BY employment_type_ascii, bucket"
+)
+
+# Get name_ascii, id, name and number of postings of each of given technologies
+techs_by_name = sqlalchemy.sql.text(
+    "SELECT technologies.name_ascii, technologies.id, technologies.name, "
+        "COALESCE(tech_counts.count, 0) "
+    "FROM technologies "
+    "LEFT JOIN tech_counts "
+        "ON tech_counts.tech_id=technologies.id "
+    "WHERE technologies.name_ascii IN :names"
+).bindparams(sqlalchemy.bindparam('names', expanding=True))
+
+# Get name_ascii, id, name and number of postings of each of given cities
+cities_by_name = sqlalchemy.sql.text(
+    "SELECT cities.name_ascii, cities.id, cities.name, "
+        "COALESCE(city_counts.count, 0) "
+    "FROM cities "
+    "LEFT JOIN city_counts "
+        "ON city_counts.city_id=cities.id "
+    "WHERE cities.name_ascii IN :names"
+).bindparams(sqlalchemy.bindparam('names', expanding=True))
+
+# Get number of postings requiring each of given technologies (ids)
+# in each of given cities (ids)
+compare_tech_city = sqlalchemy.sql.text(
+    "SELECT tech_id, city_id, count "
+    "FROM tech_city_counts "
+    "WHERE tech_id IN :tech_ids "
+        "AND city_id IN :city_ids"
+).bindparams(sqlalchemy.bindparam('tech_ids', expanding=True),
+             sqlalchemy.bindparam('city_ids', expanding=True))
+
+# Get number of postings requiring both technologies of each pair of given
+# technologies (ids)
+compare_tech_pairs = sqlalchemy.sql.text(
+    "SELECT tech_id, other_id, count "
+    "FROM tech_pair_counts "
+    "WHERE tech_id IN :tech_ids "
+        "AND other_id IN :other_ids"
+).bindparams(sqlalchemy.bindparam('tech_ids', expanding=True),
+             sqlalchemy.bindparam('other_ids', expanding=True))
@@ -0,0 +1,140 @@
+"""Pool of processes rendering charts outside of the request threads."""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+
+class RenderError(Exception):
+    """Chart could not be rendered in time or the pool is overloaded"""
+
+
+def init_worker():
+    """Import matplotlib once per worker process"""
+    # preloaded so that the first chart of each worker is not slower
+    import demitaja.utils.charts  # noqa: F401
+
+
+class WorkerContext(object):
+    """This class defines multiprocessing context of an executor which
+    keeps handles to the worker processes it starts, so that they can be
+    terminated even while busy.
+    Attributes:
+        context: multiprocessing context starting the processes
+        processes (list): processes started so far
+    """
+    def __init__(self, context=None):
+        self.context = context or multiprocessing.get_context()
+        self.processes = []
+
+    def Process(self, *args, **kwargs):
+        process = self.context.Process(*args, **kwargs)
+        self.processes.append(process)
+        return process
+
+    def __getattr__(self, name):
+        return getattr(self.context, name)
+
+
+def terminate(executor, context):
+    """Stop the executor and its worker processes, including busy ones"""
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in context.processes:
+        if process.is_alive():
+            process.terminate()
+
+
+def render_in_worker(chart_type, args, kwargs):
+    """Render chart in a worker process; see demitaja.utils.charts"""
+    from demitaja.utils import charts
+    return getattr(charts, chart_type)(*args, **kwargs)
+
+
+class RenderPool(object):
+    """This class defines pool of worker processes rendering charts.
+    Workers receive only the plain chart data and return the encoded
+    chart. The number of charts waiting for or being rendered is bounded;
+    further charts are rejected until the pool catches up.
+    Attributes:
+        workers (int): number of worker processes; if 0, charts are
+            rendered in the calling thread
+        queue_size (int): max number of charts queued or being rendered
+        timeout (float): max time to wait for a chart [s]
+    """
+    def __init__(self, workers, queue_size, timeout):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(queue_size)
+        self.executor = None
+        self.context = None
+        self.lock = threading.Lock()
+
+    def get_executor(self):
+        """Return the executor and its WorkerContext"""
+        # workers are started on first use, not when the app is imported
+        with self.lock:
+            if self.executor is None:
+                self.context = WorkerContext()
+                self.executor = ProcessPoolExecutor(self.workers, mp_context=self.context,
+                                                    initializer=init_worker)
+            return self.executor, self.context
+
+    def render(self, chart_type, *args, **kwargs):
+        """Render chart.
+
+        Args:
+            chart_type (str): name of the function in demitaja.utils.charts
+            *args, **kwargs: arguments of the function
+
+        Returns:
+            encoded chart
+
+        Raises:
+            RenderError: if the pool is overloaded, a worker died or the
+                chart is not rendered within the timeout
+        """
+        if not self.workers:
+            return render_in_worker(chart_type, args, kwargs)
+        if not self.slots.acquire(blocking=False):
+            raise RenderError('Too many charts waiting to be rendered')
+        executor, context = self.get_executor()
+        try:
+            future = executor.submit(render_in_worker, chart_type, args, kwargs)
+        except BrokenProcessPool:
+            self.slots.release()
+            self.reset(executor, context)
+            raise RenderError('Chart workers died; restarting them')
+        except Exception:
+            self.slots.release()
+            raise
+        # the slot is freed when the worker is done, even after a timeout
+        future.add_done_callback(lambda f: self.slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except BrokenProcessPool:
+            # e.g. a worker was killed by the OOM killer
+            self.reset(executor, context)
+            raise RenderError('Chart workers died; restarting them')
+        except TimeoutError:
+            if not future.cancel():
+                # a running chart cannot be cancelled; free its worker
+                # at the cost of the other charts of the pool
+                self.reset(executor, context)
+            raise RenderError('Chart was not rendered in {} s'.format(self.timeout))
+
+    def reset(self, executor, context):
+        """Terminate the executor started with the context; the next chart
+        starts a new one
+        """
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+        terminate(executor, context)
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+                self.executor = None
@@ -0,0 +1,176 @@
+"""Salary statistics.
+
+Salaries are normalized on ingest to monthly salaries in SALARY_CURRENCY.
+Midpoint of each normalized salary range is counted in logarithmic
+histograms (salary_histograms table) of all the postings, of the postings
+with each must technology, of the postings in each city and of each
+combination of the two. A salary s falls into bucket i = ceil(log(s, gamma))
+where gamma = (1 + a) / (1 - a) and a is SALARY_HISTOGRAM_ERROR, i.e.
+bucket i holds the salaries in (gamma^(i-1), gamma^i]. Estimating each
+salary of the bucket as 2 * gamma^i / (gamma + 1) keeps relative error of
+the percentiles below a. The histograms are mergeable: counts of the
+buckets of a group are sums of counts of the postings in the group,
+so they are maintained by incrementing them on ingest.
+"""
+
+import math
+from collections import Counter
+from sqlalchemy import func, text
+from demitaja import app
+from demitaja.database import db_session
+from demitaja.models import Salary, salary_histograms, postings_cities_assoc, postings_must_assoc
+from demitaja.utils import queries
+from demitaja.utils.aggregates import increment
+
+
+def get_factor(currency, period):
+    """Return factor normalizing salary in the currency per the period to
+    monthly salary in SALARY_CURRENCY or None if the currency or period
+    is unknown.
+    """
+    rate = app.config['SALARY_EXCHANGE_RATES'].get((currency or '').upper())
+    periods = app.config['SALARY_PERIODS'].get((period or '').lower())
+    if rate is None or periods is None:
+        return None
+    return rate * periods
+
+
+def normalize_salary(salary, currency, period):
+    """Normalize salary to monthly salary in SALARY_CURRENCY.
+    Return normalized salary (int) or None if it cannot be normalized.
+    """
+    factor = get_factor(currency, period)
+    if factor is None or salary is None:
+        return None
+    return int(round(salary * factor))
+
+
+def get_gamma():
+    """Return ratio of the bounds of the histogram buckets"""
+    error = app.config['SALARY_HISTOGRAM_ERROR']
+    return (1 + error) / (1 - error)
+
+
+def get_bucket(salary, gamma):
+    """Return histogram bucket of the salary"""
+    return int(math.ceil(math.log(max(salary, 1), gamma)))
+
+
+def get_bucket_value(bucket, gamma):
+    """Return estimate of the salaries in the bucket"""
+    return 2 * gamma ** bucket / (gamma + 1)
+
+
+def count_salaries(postings):
+    """Count salaries of the postings in the histogram buckets.
+
+    Args:
+        postings (iterable): tuples (city_ids, must_ids, salaries) of each
+            posting where salaries are tuples (employment_type_ascii,
+            salary_from_norm, salary_to_norm); ids must not repeat within
+            a posting
+
+    Returns:
+        Counter mapping (tech_id, city_id, employment_type_ascii, bucket)
+        to number of salaries
+    """
+    gamma = get_gamma()
+    counter = Counter()
+    for city_ids, must_ids, salaries in postings:
+        groups = [(0, 0)] + [(tech_id, 0) for tech_id in must_ids] + \
+            [(0, city_id) for city_id in city_ids] + \
+            [(tech_id, city_id) for tech_id in must_ids for city_id in city_ids]
+        for employment_type, salary_from, salary_to in salaries:
+            if salary_from is None or salary_to is None:
+                continue
+            bucket = get_bucket((salary_from + salary_to) / 2, gamma)
+            counter.update((tech_id, city_id, employment_type, bucket)
+                           for tech_id, city_id in groups)
+    return counter
+
+
+def update_salary_histograms(postings):
+    """Add salaries of new postings to the histograms.
+    Must be called within the transaction inserting the postings.
+
+    Args:
+        postings (list): see count_salaries
+    """
+    increment(salary_histograms, count_salaries(postings))
+
+
+def rebuild_salaries(commit=True):
+    """Normalize all the salaries again and recompute the histograms,
+    e.g. after changing the exchange rates. With commit=False the caller
+    commits.
+    """
+    # normalize salaries with one update per currency and period
+    salaries = Salary.__table__
+    pairs = db_session.query(Salary.salary_currency, Salary.salary_period).distinct().all()
+    for currency, period in pairs:
+        factor = get_factor(currency, period)
+        values = {'salary_from_norm': None, 'salary_to_norm': None}
+        if factor is not None:
+            values = {'salary_from_norm': func.round(salaries.c.salary_from * factor),
+                      'salary_to_norm': func.round(salaries.c.salary_to * factor)}
+        db_session.execute(salaries.update().where(
+            (salaries.c.salary_currency == currency) & (salaries.c.salary_period == period)
+        ).values(**values))
+    # recompute the histograms
+    cities, musts = {}, {}
+    for posting_id, city_id in db_session.execute(postings_cities_assoc.select()):
+        cities.setdefault(posting_id, []).append(city_id)
+    for posting_id, tech_id in db_session.execute(postings_must_assoc.select()):
+        musts.setdefault(posting_id, []).append(tech_id)
+    posting_salaries = {}
+    for posting_id, employment_type, salary_from, salary_to in db_session.execute(text(
+            'SELECT posting_id, employment_type_ascii, salary_from_norm, salary_to_norm '
+            'FROM salaries')):
+        posting_salaries.setdefault(posting_id, []).append((employment_type, salary_from, salary_to))
+    counter = count_salaries((cities.get(posting_id, []), musts.get(posting_id, []), rows)
+                             for posting_id, rows in posting_salaries.items())
+    db_session.execute(salary_histograms.delete())
+    increment(salary_histograms, counter)
+    if commit:
+        db_session.commit()
+
+
+def get_percentiles(tech_id=0, city_id=0, percentiles=(25, 50, 75)):
+    """Estimate percentiles of the salaries from the histograms.
+
+    Args:
+        tech_id (int): id of the must technology or 0 for all technologies
+        city_id (int): id of the city or 0 for all cities
+        percentiles (tuple): percentiles to estimate
+
+    Returns:
+        dict mapping each employment type to dict with number of salaries
+        (count) and estimate of each percentile (p<percentile>)
+    """
+    gamma = get_gamma()
+    histograms = {}
+    for employment_type, bucket, count in db_session.execute(
+            queries.salary_histogram, {'tech_id': tech_id, 'city_id': city_id}):
+        histograms.setdefault(employment_type, []).append((bucket, count))
+    stats = {}
+    for employment_type, histogram in histograms.items():
+        total = sum(count for bucket, count in histogram)
+        stats[employment_type] = dict(
+            count=total,
+            **{'p{}'.format(p): int(round(get_bucket_value(
+                get_quantile_bucket(histogram, total, p / 100), gamma)))
+               for p in percentiles})
+    return stats
+
+
+def get_quantile_bucket(histogram, total, q):
+    """Return bucket of the histogram (list of (bucket, count) ordered by
+    bucket) holding the q-quantile of the total salaries
+    """
+    rank = q * (total - 1)
+    seen = 0
+    for bucket, count in histogram:
+        seen += count
+        if seen > rank:
+            return bucket
+    return histogram[-1][0]
@@ -0,0 +1,146 @@
+"""Full-text search of the postings.
+
+Title and description of each posting (extracted from the posting's
+JSON, stripped of HTML) are indexed in the postings_fts SQLite FTS5 table
+whose rowid is id of the posting. The index is kept in sync on ingest and
+the search ranks, filters and paginates the postings in the index.
+Search is available only with SQLite.
+"""
+
+import html
+import json
+import re
+from markupsafe import escape
+from sqlalchemy import text
+from demitaja.database import db_session, engine
+from demitaja.models import Posting
+
+
+# Paths of the fields of the posting's JSON making the description
+DESCRIPTION_FIELDS = (
+    ('details', 'description'),
+    ('requirements', 'description'),
+    ('specs', 'description')
+)
+
+# Markers of the matched terms in the snippets, replaced after escaping
+MATCH_START, MATCH_END = '\x02', '\x03'
+
+insert_query = text(
+    "INSERT INTO postings_fts (rowid, title, description) "
+    "VALUES (:id, :title, :description)"
+)
+
+# Weights of bm25 ranking: title, description
+rank = 'bm25(10.0, 1.0)'
+
+
+def search_enabled():
+    """Return True if the database supports the full-text search"""
+    return engine.dialect.name == 'sqlite'
+
+
+def strip_html(s):
+    """Return plain text of the html"""
+    s = re.sub(r'<[^>]*>', ' ', s)
+    return ' '.join(html.unescape(s).split())
+
+
+def get_description(posting_text):
+    """Extract description from the posting's JSON (str)"""
+    try:
+        posting_raw = json.loads(posting_text)
+    except ValueError:
+        return ''
+    parts = []
+    for path in DESCRIPTION_FIELDS:
+        value = posting_raw
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        if isinstance(value, str):
+            parts.append(strip_html(value))
+    return ' '.join(parts)
+
+
+def index_postings(postings):
+    """Add postings to the full-text index.
+    Must be called within the transaction inserting the postings.
+
+    Args:
+        postings (list): tuples (id, title, text) of the postings
+    """
+    if not postings or not search_enabled():
+        return
+    db_session.execute(insert_query, [
+        {'id': posting_id, 'title': title, 'description': get_description(posting_text)}
+        for posting_id, title, posting_text in postings])
+
+
+def rebuild_index(batch_size=1000):
+    """Index all the postings from scratch"""
+    db_session.execute(text("DELETE FROM postings_fts"))
+    last_id = 0
+    while True:
+        rows = db_session.query(Posting.id, Posting.title, Posting.text).filter(
+            Posting.id > last_id).order_by(Posting.id).limit(batch_size).all()
+        if not rows:
+            break
+        index_postings([tuple(row) for row in rows])
+        last_id = rows[-1].id
+    db_session.commit()
+
+
+def build_match(query):
+    """Build FTS5 query matching postings with all the words of the query.
+    Return None if there are no words in the query.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    # quoted strings cannot be mistaken for FTS5 operators
+    return ' '.join('"{}"'.format(word) for word in words)
+
+
+def search(query, tech=None, city=None, limit=20, offset=0):
+    """Search postings.
+
+    Args:
+        query (str): words which must occur in the title or description
+        tech (str): normalized name of the technology required as must
+        city (str): normalized name of the city
+        limit (int): max number of postings
+        offset (int): number of best matching postings to skip
+
+    Returns:
+        list of dicts with web_id, title, posted timestamp and snippet
+        (escaped html with the matched words in <mark>) of the postings
+        ordered from the best match
+    """
+    match = build_match(query)
+    if match is None:
+        return []
+    conditions = ["postings_fts MATCH :match", "rank MATCH :rank"]
+    if tech:
+        conditions.append(
+            "postings_fts.rowid IN ("
+            "SELECT posting_id FROM postings_techs_must "
+            "WHERE must_id=(SELECT id FROM technologies WHERE name_ascii=:tech))")
+    if city:
+        conditions.append(
+            "postings_fts.rowid IN ("
+            "SELECT posting_id FROM postings_cities "
+            "WHERE city_id=(SELECT id FROM cities WHERE name_ascii=:city))")
+    rows = db_session.execute(text(
+        "SELECT postings.web_id, postings.title, postings.posted, "
+        "snippet(postings_fts, -1, :start, :end, '...', 24) "
+        "FROM postings_fts "
+        "JOIN postings "
+            "ON postings.id=postings_fts.rowid "
+        "WHERE " + " AND ".join(conditions) + " "
+        "ORDER BY rank "
+        "LIMIT :limit OFFSET :offset"
+    ), {'match': match, 'rank': rank, 'tech': tech, 'city': city,
+        'start': MATCH_START, 'end': MATCH_END, 'limit': limit, 'offset': offset})
+    return [{'web_id': web_id, 'title': title, 'posted': posted,
+             'snippet': str(escape(snippet)).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')}
+            for web_id, title, posted, snippet in rows]
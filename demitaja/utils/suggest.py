@@ -0,0 +1,208 @@
+"""Type-ahead suggestions and did-you-mean of technology and city names.
+
+Names and aliases of all the technologies and cities are kept in memory
+in a prefix trie, which completes the beginning of any word of a name,
+and in a trigram index, which finds names similar to a misspelled one.
+Names are ranked by the number of postings of the item. The indexes are rebuilt
+whenever the data version of the database changes, e.g. after a crawl.
+"""
+
+import threading
+from sqlalchemy import text
+from demitaja import app
+from demitaja.database import db_session
+from demitaja.utils.utils import get_data_version, normalize_string
+
+
+# Names and aliases of all the items of each type with the names and
+# number of postings of the items
+names_queries = {
+    'tech': text(
+        "SELECT technologies.name_ascii, technologies.name, COALESCE(tech_counts.count, 0) "
+        "FROM technologies "
+        "LEFT JOIN tech_counts "
+            "ON tech_counts.tech_id=technologies.id "
+        "UNION ALL "
+        "SELECT technologies_aliases.alias_ascii, technologies.name, COALESCE(tech_counts.count, 0) "
+        "FROM technologies_aliases "
+        "JOIN technologies "
+            "ON technologies.id=technologies_aliases.tech_id "
+        "LEFT JOIN tech_counts "
+            "ON tech_counts.tech_id=technologies.id"
+    ),
+    'city': text(
+        "SELECT cities.name_ascii, cities.name, COALESCE(city_counts.count, 0) "
+        "FROM cities "
+        "LEFT JOIN city_counts "
+            "ON city_counts.city_id=cities.id "
+        "UNION ALL "
+        "SELECT cities_aliases.alias_ascii, cities.name, COALESCE(city_counts.count, 0) "
+        "FROM cities_aliases "
+        "JOIN cities "
+            "ON cities.id=cities_aliases.city_id "
+        "LEFT JOIN city_counts "
+            "ON city_counts.city_id=cities.id"
+    )
+}
+
+indexes = {}
+indexes_lock = threading.Lock()
+
+
+def normalize_query(s):
+    """Normalize name typed by the user: normalize_string and collapse
+    the whitespace
+    """
+    return ' '.join(normalize_string(s).split())
+
+
+def get_trigrams(s):
+    """Return set of trigrams of the words of the string, each word padded
+    with two spaces in front and one at the end
+    """
+    trigrams = set()
+    for word in s.split():
+        padded = '  ' + word + ' '
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+class NameIndex(object):
+    """This class defines in-memory index of the names of the items of one
+    type for prefix completion and fuzzy matching.
+    Attributes:
+        version (int): data version of the database the index was built from
+        items (list): tuples (name_ascii, name, count) of the items, most
+            frequent first; name_ascii of an alias comes with name and
+            count of the item it refers to
+        names (dict): name_ascii -> index of the item
+        limit (int): max number of completions kept for each prefix
+        trie (dict): char -> child node; key None holds indices of the
+            first limit items having the node's prefix at a word start
+        trigrams (dict): trigram -> list of indices of the items
+        lengths (list): number of trigrams of each item
+    """
+    def __init__(self, items, version=None, limit=10):
+        self.version = version
+        self.items = sorted(items, key=lambda item: (-item[2], item[0]))
+        self.names = {item[0]: i for i, item in enumerate(self.items)}
+        self.limit = limit
+        self.trie = {None: []}
+        self.trigrams = {}
+        self.lengths = []
+        for i, (name_ascii, name, count) in enumerate(self.items):
+            self.add(i, name_ascii)
+
+    def add(self, i, name_ascii):
+        # completions start at the beginning of any word of the name
+        words = name_ascii.split()
+        for start in range(len(words)):
+            node = self.trie
+            for char in ' '.join(words[start:]):
+                node = node.setdefault(char, {None: []})
+                best = node[None]
+                # the same item may reach the node from several words
+                if len(best) < self.limit and (not best or best[-1] != i):
+                    best.append(i)
+        trigrams = get_trigrams(name_ascii)
+        for trigram in trigrams:
+            self.trigrams.setdefault(trigram, []).append(i)
+        self.lengths.append(len(trigrams))
+
+    def get(self, name_ascii):
+        """Return item (name_ascii, name, count) or None"""
+        i = self.names.get(name_ascii)
+        return None if i is None else self.items[i]
+
+    def find_node(self, prefix):
+        node = self.trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node
+
+    def complete(self, prefix, limit=None):
+        """Return items with a word starting with the prefix, most
+        frequent first
+        """
+        node = self.find_node(prefix)
+        if node is None or not prefix:
+            return []
+        return [self.items[i] for i in node[None][:limit or self.limit]]
+
+    def similar(self, name_ascii, min_similarity, limit=None):
+        """Return items whose names share at least min_similarity of their
+        trigrams (Jaccard index) with the name, most similar first
+        """
+        trigrams = get_trigrams(name_ascii)
+        shared = {}
+        for trigram in trigrams:
+            for i in self.trigrams.get(trigram, ()):
+                shared[i] = shared.get(i, 0) + 1
+        scored = []
+        for i, count in shared.items():
+            similarity = count / (len(trigrams) + self.lengths[i] - count)
+            if similarity >= min_similarity:
+                # more frequent items win ties; items are ordered by frequency
+                scored.append((-similarity, i))
+        scored.sort()
+        return [self.items[i] for score, i in scored[:limit or self.limit]]
+
+    def suggest(self, query, limit=None):
+        """Return completions of the query followed by similar names"""
+        limit = limit or self.limit
+        suggestions, names = [], set()
+        candidates = self.complete(query, limit)
+        if len(candidates) < limit:
+            candidates += self.similar(query, app.config['SUGGEST_MIN_SIMILARITY'], limit)
+        # an item and its aliases are suggested once
+        for item in candidates:
+            if item[1] not in names and len(suggestions) < limit:
+                names.add(item[1])
+                suggestions.append(item)
+        return suggestions
+
+
+def get_index(item_type):
+    """Return NameIndex of the items of the type (tech or city) for the
+    current data version of the database
+    """
+    version = get_data_version()
+    index = indexes.get(item_type)
+    if index is None or index.version != version:
+        with indexes_lock:
+            index = indexes.get(item_type)
+            if index is None or index.version != version:
+                items = [tuple(row) for row in db_session.execute(names_queries[item_type])]
+                index = NameIndex(items, version, app.config['SUGGEST_LIMIT'])
+                indexes[item_type] = index
+    return index
+
+
+def suggest(item_type, query, limit=None):
+    """Return list of (name_ascii, name, count) of the items of the type
+    (tech or city) suggested for the query typed by the user
+    """
+    query = normalize_query(query)
+    if not query:
+        return []
+    return get_index(item_type).suggest(query, limit)
+
+
+def did_you_mean(item_type, name_ascii):
+    """Return name of the item of the type (tech or city) which the user
+    probably meant by the unknown name: the only completion of the name
+    or the most similar item; None if the name (or alias) is known or no
+    item is similar enough. The item is only suggested, never
+    substituted for the requested one.
+    """
+    index = get_index(item_type)
+    name_ascii = normalize_query(name_ascii)
+    if index.get(name_ascii):
+        return None
+    completions = index.complete(name_ascii, 2)
+    if len(completions) == 1:
+        return completions[0][1]
+    similar = index.similar(name_ascii, app.config['DID_YOU_MEAN_MIN_SIMILARITY'], 1)
+    return similar[0][1] if similar else None
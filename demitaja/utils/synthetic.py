@@ -0,0 +1,115 @@
+"""Deterministic synthetic postings for benchmarks and development.
+
+Postings are generated in the raw format of the website's API (see
+demitaja.utils.utils.extract_posting). Technologies and cities are drawn
+from Zipf distributions, so that a few of them occur in most postings as
+on the real website. Each posting depends only on the seed and its
+number, so a dataset can be grown in steps and regenerated exactly.
+"""
+
+import bisect
+import random
+
+
+TECHS = ['JavaScript', 'Java', 'Python', 'SQL', 'Git', 'Docker', 'AWS', 'React', 'TypeScript',
+         'Spring', 'Linux', 'Kubernetes', 'C#', '.NET', 'Angular', 'PHP', 'Go', 'Node.js',
+         'PostgreSQL', 'Kotlin', 'Scala', 'Django', 'Ruby', 'C++', 'Rust']
+CITIES = ['Warszawa', 'Kraków', 'Wrocław', 'Remote', 'Gdańsk', 'Poznań', 'Łódź', 'Katowice',
+          'Lublin', 'Szczecin', 'Bydgoszcz', 'Białystok', 'Rzeszów', 'Toruń', 'Gliwice']
+# currency, period, typical monthly salary in the currency, weight
+SALARY_TYPES = [('PLN', 'Month', 12000, 80), ('EUR', 'Month', 3000, 8),
+                ('USD', 'Month', 3500, 4), ('PLN', 'Hour', 75, 6), ('PLN', 'Day', 600, 2)]
+
+
+def get_names(names, count, prefix):
+    """Return count names: the given names followed by generated ones"""
+    return (names + ['{} {}'.format(prefix, i) for i in range(len(names), count)])[:count]
+
+
+def zipf_weights(count, exponent):
+    """Return cumulative weights of Zipf distribution over count items"""
+    weights, total = [], 0
+    for rank in range(1, count + 1):
+        total += 1 / rank ** exponent
+        weights.append(total)
+    return weights
+
+
+def sample(rng, items, cum_weights, k):
+    """Draw k distinct items with the given cumulative weights"""
+    chosen = []
+    k = min(k, len(items))
+    while len(chosen) < k:
+        item = items[bisect.bisect(cum_weights, rng.random() * cum_weights[-1])]
+        if item not in chosen:
+            chosen.append(item)
+    return chosen
+
+
+class PostingGenerator(object):
+    """This class defines generator of synthetic raw postings.
+    Attributes:
+        seed (int): seed of the dataset
+        techs (list), cities (list): names of the technologies and cities
+        tech_weights (list), city_weights (list): cumulative Zipf weights
+        start (int): posted timestamp of the first posting [s]
+        interval (int): time between the consecutive postings [s]
+    """
+    def __init__(self, seed=0, techs=200, cities=60, exponent=1.1,
+                 start=1546300800, interval=600):
+        self.seed = seed
+        self.techs = get_names(TECHS, techs, 'Tech')
+        self.cities = get_names(CITIES, cities, 'Miasto')
+        self.tech_weights = zipf_weights(len(self.techs), exponent)
+        self.city_weights = zipf_weights(len(self.cities), exponent)
+        self.start = start
+        self.interval = interval
+
+    def generate(self, count, first=0):
+        """Generate count raw postings numbered from first"""
+        for number in range(first, first + count):
+            yield self.posting(number)
+
+    def posting(self, number):
+        """Return raw posting of the given number"""
+        rng = random.Random(self.seed * 1000003 + number)
+        techs = sample(rng, self.techs, self.tech_weights, rng.randint(2, 8))
+        musts = techs[:max(1, len(techs) * 2 // 3)]
+        nices = techs[len(musts):]
+        cities = sample(rng, self.cities, self.city_weights, 1 if rng.random() < 0.8 else 3)
+        web_id = 'SYN-{}-{}'.format(self.seed, number)
+        return {
+            'id': web_id,
+            'title': '{} Developer'.format(musts[0]),
+            'posted': (self.start + number * self.interval) * 1000,
+            'essentials': {'salary': self.salary(rng, len(musts))},
+            'location': {'places': [{'city': city} for city in cities]},
+            'requirements': {
+                'musts': [{'type': 'main', 'value': tech} for tech in musts],
+                'nices': [{'type': 'main', 'value': tech} for tech in nices],
+                'description': '<p>Experience with {}.</p>'.format(', '.join(musts))
+            },
+            'details': {
+                'description': '<p>{} is looking for a {} developer in {}. {}</p>'.format(
+                    web_id, ' / '.join(musts), cities[0],
+                    ' '.join(rng.choice(TECHS) for i in range(rng.randint(20, 120))))
+            }
+        }
+
+    @staticmethod
+    def salary(rng, seniority):
+        """Return salary of the posting; b2b and/or permanent ranges
+        log-normally distributed around the typical salary
+        """
+        types = {}
+        if rng.random() < 0.15:
+            return {'types': types, 'currency': 'PLN', 'period': 'Month'}
+        currency, period, typical, weight = rng.choices(
+            SALARY_TYPES, weights=[t[3] for t in SALARY_TYPES])[0]
+        base = typical * rng.lognormvariate(0, 0.35) * (0.8 + 0.1 * seniority)
+        for employment_type, factor in (('b2b', 1.25), ('permanent', 1.0)):
+            if rng.random() < 0.7:
+                salary_from = int(round(base * factor, -1))
+                types[employment_type] = {'range': [salary_from,
+                                                    int(round(salary_from * rng.uniform(1.1, 1.6), -1))]}
+        return {'types': types, 'currency': currency, 'period': period}
@@ -0,0 +1,114 @@
+"""Demand trends read from the daily rollup tables.
+
+Days are numbered from the epoch (see demitaja.utils.aggregates) and
+grouped into buckets of the requested granularity, so the cost of a trend
+depends on the number of days in the range, not on the number of postings.
+"""
+
+from datetime import date, timedelta
+from demitaja.database import db_session
+from demitaja.utils import queries
+
+
+EPOCH = date(1970, 1, 1)
+GRANULARITIES = ('day', 'week', 'month')
+
+
+def day_to_date(day):
+    """Convert number of days since the epoch to date"""
+    return EPOCH + timedelta(days=day)
+
+
+def date_to_day(d):
+    """Convert date to number of days since the epoch"""
+    return (d - EPOCH).days
+
+
+def bucket_start(d, granularity):
+    """Return first day of the bucket containing the date;
+    weeks start on Monday.
+    """
+    if granularity == 'week':
+        return d - timedelta(days=d.weekday())
+    if granularity == 'month':
+        return d.replace(day=1)
+    return d
+
+
+def next_bucket(d, granularity):
+    """Return first day of the bucket following the bucket starting on d"""
+    if granularity == 'week':
+        return d + timedelta(days=7)
+    if granularity == 'month':
+        return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+    return d + timedelta(days=1)
+
+
+def get_buckets(start, end, granularity):
+    """Return list of the first days of the buckets covering the date range"""
+    buckets = []
+    d = bucket_start(start, granularity)
+    while d <= end:
+        buckets.append(d)
+        d = next_bucket(d, granularity)
+    return buckets
+
+
+def number_of_buckets(start, end, granularity):
+    """Return number of buckets covering the date range"""
+    if granularity == 'week':
+        return (bucket_start(end, 'week') - bucket_start(start, 'week')).days // 7 + 1
+    if granularity == 'month':
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    return (end - start).days + 1
+
+
+def get_date_range():
+    """Return dates of the oldest and newest postings
+    or (None, None) if there are no postings.
+    """
+    oldest, newest = db_session.execute(queries.trend_range).fetchone()
+    if oldest is None:
+        return None, None
+    return day_to_date(oldest), day_to_date(newest)
+
+
+def get_trend(start, end, granularity, tech=None, city=None):
+    """Count postings in each bucket of the date range.
+
+    Args:
+        start, end (date): first and last day of the range
+        granularity (str): day, week or month
+        tech (str): normalized name of the technology required as must
+        city (str): normalized name of the city
+
+    Returns:
+        list of tuples (bucket_start, count, total) where count is
+        number of postings with the tech and/or in the city and total
+        is number of all the postings posted in the bucket
+    """
+    if tech and city:
+        query, params = queries.trend_tech_city, {'tech': tech, 'city': city}
+    elif tech:
+        query, params = queries.trend_tech, {'tech': tech}
+    elif city:
+        query, params = queries.trend_city, {'city': city}
+    else:
+        query, params = queries.trend, {}
+    days = {'start': date_to_day(start), 'end': date_to_day(end)}
+    counts = count_buckets(db_session.execute(query, dict(params, **days)), granularity)
+    totals = counts if query is queries.trend else \
+        count_buckets(db_session.execute(queries.trend, days), granularity)
+    return [(d, counts.get(d, 0), totals.get(d, 0))
+            for d in get_buckets(start, end, granularity)]
+
+
+def count_buckets(rows, granularity):
+    """Sum daily counts into buckets.
+    Return dict first day of bucket -> count.
+    """
+    counts = {}
+    for day, count in rows:
+        d = bucket_start(day_to_date(day), granularity)
+        counts[d] = counts.get(d, 0) + count
+    return counts
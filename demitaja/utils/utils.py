@@ -1,17 +1,34 @@
 # -*- coding: utf-8 -*- python
+import json
+import logging
+import time
 import unicodedata
-from demitaja.models import Posting, City, Technology, Salary
+from itertools import islice
+from sqlalchemy import func
+from demitaja.models import (Posting, Salary, data_versions, postings_cities_assoc,
+                             postings_must_assoc, postings_nice_assoc)
 from demitaja.database import db_session
-from demitaja.utils import queries
+from demitaja.utils.lookup import city_cache, tech_cache
+from demitaja.utils.aggregates import update_aggregates
+from demitaja.utils.salaries import normalize_salary, update_salary_histograms
+from demitaja.utils.search import index_postings
+from demitaja.utils.metrics import metrics
 
 
-def check_item(request, item_type):
-    """"Check if item was requested; if so, check if item is in database
+logger = logging.getLogger(__name__)
+
+
+def check_item(request, item_type, backend=None):
+    """"Check if item was requested; if so, check if item is in database.
+    Aliases are resolved into the items they refer to; for names which
+    are not in the database see demitaja.utils.suggest.did_you_mean.
 
     Args:
         request (Request object)
         item_type (str): type of item to be checked;
             must be either tech or city
+        backend (object): backend answering the queries, see
+            demitaja.utils.backends; sql_backend by default
 
     Returns:
          normalized name of the tech (str)
@@ -21,8 +38,14 @@ def check_item(request, item_type):
     name_ascii = normalize_string(request.args.get('req_' + item_type, ''))
     if not name_ascii:
         return None, None, 0
-    query = getattr(queries, item_type)
-    item = db_session.execute(query, {item_type: name_ascii}).fetchone()
+    if backend is None:
+        # imported here because demitaja.utils.backends imports this module
+        from demitaja.utils.backends import sql_backend
+        backend = sql_backend
+    cache = tech_cache if item_type == 'tech' else city_cache
+    # items requested by an alias are stored under their names
+    name_ascii = cache.resolve(name_ascii)
+    item = getattr(backend, item_type)(name_ascii)
     if not item:
         return name_ascii, None, 0
     return name_ascii, item[0], item[1]
@@ -40,102 +63,306 @@ def normalize_string(s):
     return ''.join((c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn'))
 
 
+def extract_posting(posting_raw, scraped=None):
+    """Extract posting dict from the raw posting data of the website.
+
+    Args:
+        posting_raw (dict): posting as returned by the website's API
+        scraped (int): scraped timestamp; now by default
+
+    Returns:
+        posting dict accepted by create_postings
+
+    Raises:
+        KeyError: if any of the required data is missing
+        TypeError: if any of the data is of a wrong type
+    """
+    posting_d = {
+        'web_id': posting_raw['id'],
+        'title': posting_raw['title'],
+        'posted': int(posting_raw['posted']/1000),
+        'scraped': int(time.time()) if scraped is None else scraped,
+        'text': json.dumps(posting_raw),
+        'salaries': posting_raw['essentials']['salary']['types'],
+        'salary_currency': posting_raw['essentials']['salary']['currency'],
+        'salary_period': posting_raw['essentials']['salary']['period'],
+        'cities': [loc['city'] for loc in posting_raw['location']['places']],
+        'techs_must': [must['value'] for must in posting_raw['requirements']['musts']
+                       if must['type'] == 'main'],
+        'techs_nice': [nice['value'] for nice in posting_raw['requirements']['nices']
+                       if nice['type'] == 'main']
+    }
+    check_posting(posting_d)
+    return posting_d
+
+
+def check_posting(posting_d):
+    """Check types of the data of the posting dict, so that a malformed
+    posting is rejected before it gets into a batch.
+    Raise TypeError if any of the data is of a wrong type.
+    """
+    for key in ('web_id', 'title'):
+        if not isinstance(posting_d[key], str):
+            raise TypeError('{} is not a string'.format(key))
+    # unknown currency or period only leaves the salary unnormalized
+    for key in ('salary_currency', 'salary_period'):
+        if posting_d[key] is not None and not isinstance(posting_d[key], str):
+            raise TypeError('{} is not a string'.format(key))
+    for key in ('cities', 'techs_must', 'techs_nice'):
+        if not all(isinstance(name, str) for name in posting_d[key]):
+            raise TypeError('{} are not strings'.format(key))
+    if not isinstance(posting_d['salaries'], dict):
+        raise TypeError('salaries is not a dict')
+    for employment_type, sal in posting_d['salaries'].items():
+        sal_range = sal['range'] if isinstance(sal, dict) else None
+        if (not isinstance(employment_type, str) or not isinstance(sal_range, list)
+                or len(sal_range) not in (1, 2)
+                or not all(isinstance(value, (int, float)) and not isinstance(value, bool)
+                           for value in sal_range)):
+            raise TypeError('invalid salary of {}'.format(employment_type))
+
+
+def read_postings(lines, invalid):
+    """Generate posting dicts from lines of raw posting JSON.
+
+    Args:
+        lines (iterable): lines of raw posting data (one JSON per line)
+        invalid (list): numbers of the lines (from 1) which are not valid
+            postings are appended to it
+
+    Yields:
+        posting dicts accepted by create_postings
+    """
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield extract_posting(json.loads(line))
+        except (ValueError, KeyError, TypeError):
+            invalid.append(number)
+
+
 def create_posting(posting_d):
-    """Add posting with all its relationships to the database"""
-    # check if this is a new posting
-    posting = get_posting(posting_d['web_id'])
-    if posting:
-        print('Posting already in the db')
-        return
-    # extract cities, technologies and salaries
-    p_cities = posting_d.pop('cities')
-    p_techs_must = posting_d.pop('techs_must')
-    p_techs_nice = posting_d.pop('techs_nice')
-    p_salaries = posting_d.pop('salaries')
-    p_salary_currency = posting_d.pop('salary_currency')
-    p_salary_period = posting_d.pop('salary_period')
-    # insert posting into the postings table
-    posting = Posting(**posting_d)
-    db_session.add(posting)
-    db_session.commit()
-    # append cities and technologies to the posting
-    for name in p_cities:
-        city = get_city(name)
-        posting.cities.append(city)
-    for tech in p_techs_must:
-        must = get_tech(tech)
-        posting.techs_must.append(must)
-    for tech in p_techs_nice:
-        nice = get_tech(tech)
-        posting.techs_nice.append(nice)
-    # create salaries
-    for key, val in p_salaries.items():
-        create_salary(posting.id, key, val, p_salary_currency, p_salary_period)
-    # update posting
-    db_session.add(posting)
-    db_session.commit()
-    print('Added posting to the db!')
-
-
-def create_salary(posting_id, employment_type, sal, sal_currency, sal_period):
-    """Insert salary into the salaries table"""
+    """Add posting with all its relationships to the database.
+    Return number of postings added (int).
+    """
+    return create_postings([posting_d], batch_size=1)
+
+
+def create_postings(postings, batch_size=100):
+    """Add postings with all their relationships to the database.
+
+    Postings are inserted in batches and each batch is committed in
+    a single transaction. If any posting in a batch cannot be inserted,
+    only that batch is rolled back.
+
+    Args:
+        postings (iterable): posting dicts as built by extract_posting
+        batch_size (int): number of postings per transaction
+
+    Returns:
+        number of postings added to the database (int)
+    """
+    added = 0
+    for batch in get_batches(postings, batch_size):
+        added += commit_batch(batch) or 0
+    logger.debug('Added %s postings to the db', added)
+    return added
+
+
+def commit_batch(batch):
+    """Insert batch of postings in its own transaction.
+    Return number of postings added (int) or None if the batch
+    was rolled back.
+    """
+    start = time.perf_counter()
+    try:
+        added = insert_batch(batch)
+        db_session.commit()
+        metrics.observe('ingest_postings', time.perf_counter() - start)
+        metrics.inc('ingest_postings_added_total', added)
+        return added
+    except Exception as err:
+        # whatever went wrong, only this batch is lost
+        db_session.rollback()
+        # cities and technologies inserted by the batch are gone
+        city_cache.invalidate()
+        tech_cache.invalidate()
+        metrics.inc('ingest_batches_rolled_back_total')
+        logger.warning('Batch of %s postings rolled back: %s', len(batch), err)
+        return None
+
+
+def get_batches(items, batch_size):
+    """Split iterable into lists of at most batch_size items"""
+    items = iter(items)
+    while True:
+        batch = list(islice(items, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def insert_batch(batch):
+    """Insert batch of postings with all their relationships
+    using bulk inserts. The caller is responsible for committing.
+    Return number of inserted postings (int).
+    """
+    # skip postings which are already in the db or repeated in the batch
+    known = {row.web_id for row in db_session.query(Posting.web_id).filter(
+        Posting.web_id.in_([posting_d['web_id'] for posting_d in batch]))}
+    postings = []
+    for posting_d in batch:
+        if posting_d['web_id'] not in known:
+            known.add(posting_d['web_id'])
+            postings.append(posting_d)
+    if not postings:
+        return 0
+    # resolve cities and technologies of the whole batch
+    city_ids = get_ids(city_cache, [name for posting_d in postings
+                              for name in posting_d['cities']])
+    tech_ids = get_ids(tech_cache, [name for posting_d in postings
+                                     for name in posting_d['techs_must'] + posting_d['techs_nice']])
+    # insert postings into the postings table
+    columns = [column.name for column in Posting.__table__.columns if column.name != 'id']
+    db_session.execute(Posting.__table__.insert(),
+                       [{key: posting_d[key] for key in columns} for posting_d in postings])
+    posting_ids = dict(db_session.query(Posting.web_id, Posting.id).filter(
+        Posting.web_id.in_([posting_d['web_id'] for posting_d in postings])))
+    # build association and salary rows
+    cities_rows, must_rows, nice_rows, salary_rows = [], [], [], []
+    aggregates, histograms = [], []
+    for posting_d in postings:
+        posting_id = posting_ids[posting_d['web_id']]
+        p_city_ids = unique_ids(city_ids, posting_d['cities'])
+        p_must_ids = unique_ids(tech_ids, posting_d['techs_must'])
+        p_nice_ids = unique_ids(tech_ids, posting_d['techs_nice'])
+        aggregates.append((posting_d['posted'], p_city_ids, p_must_ids, p_nice_ids))
+        for city_id in p_city_ids:
+            cities_rows.append({'posting_id': posting_id, 'city_id': city_id})
+        for tech_id in p_must_ids:
+            must_rows.append({'posting_id': posting_id, 'must_id': tech_id})
+        for tech_id in p_nice_ids:
+            nice_rows.append({'posting_id': posting_id, 'nice_id': tech_id})
+        p_salary_rows = [build_salary(posting_id, key, val,
+                                      posting_d['salary_currency'],
+                                      posting_d['salary_period'])
+                         for key, val in posting_d['salaries'].items()]
+        salary_rows += p_salary_rows
+        histograms.append((p_city_ids, p_must_ids,
+                           [(row['employment_type_ascii'], row['salary_from_norm'], row['salary_to_norm'])
+                            for row in p_salary_rows]))
+    # insert association and salary rows
+    for table, rows in ((postings_cities_assoc, cities_rows),
+                        (postings_must_assoc, must_rows),
+                        (postings_nice_assoc, nice_rows),
+                        (Salary.__table__, salary_rows)):
+        if rows:
+            db_session.execute(table.insert(), rows)
+    update_aggregates(aggregates)
+    update_salary_histograms(histograms)
+    index_postings([(posting_ids[posting_d['web_id']], posting_d['title'], posting_d['text'])
+                    for posting_d in postings])
+    bump_data_version()
+    return len(postings)
+
+
+def get_ids(cache, names):
+    """Get ids of cities or technologies, inserting the missing ones.
+
+    Args:
+        cache (NameCache): city_cache or tech_cache
+        names (list): names of the items
+
+    Returns:
+        dict mapping normalized name of each item to its id
+    """
+    names_ascii = {}
+    for name in names:
+        # the first spelling of the name is the one stored in the db
+        names_ascii.setdefault(normalize_string(name), name)
+    return cache.get_ids(names_ascii)
+
+
+def unique_ids(ids, names):
+    """Map names onto ids, dropping repeated items; keep the order"""
+    result = []
+    for name in names:
+        item_id = ids[normalize_string(name)]
+        if item_id not in result:
+            result.append(item_id)
+    return result
+
+
+def build_salary(posting_id, employment_type, sal, sal_currency, sal_period):
+    """Build row of the salaries table"""
     sal_from = sal['range'][0]
     sal_to = sal['range'][1] if len(sal['range']) == 2 else sal_from
-    salary_dict = {
+    return {
         'posting_id': posting_id,
         'employment_type_ascii': normalize_string(employment_type),
         'salary_from': sal_from,
         'salary_to': sal_to,
         'salary_currency': sal_currency,
-        'salary_period': sal_period
+        'salary_period': sal_period,
+        'salary_from_norm': normalize_salary(sal_from, sal_currency, sal_period),
+        'salary_to_norm': normalize_salary(sal_to, sal_currency, sal_period)
     }
-    salary = Salary(**salary_dict)
-    db_session.add(salary)
-    db_session.commit()
-    print('Added salary to the db!')
 
 
-def get_posting(web_id):
-    """Check if the posting is in the database.
-    Return the posting or None if the posting does not exist.
+def get_data_version():
+    """Return marker which changes whenever the data changes (int),
+    see bump_data_version
     """
-    return Posting.query.filter_by(web_id=web_id).scalar()
+    return get_data_marker()[0]
 
 
-def get_city(name):
-    """Check if the city is already in the database;
-    if not, make a new entry. Return the city.
+def get_data_marker():
+    """Return version of the data (int) and time of its last change
+    (int timestamp or None if the data never changed); a single primary
+    key lookup
     """
-    # TODO cater for alias names:
-    # 1. New table cities_aliases:
-    #   id (integer, primary key)
-    #   city_id (integer, foreign key)
-    #   alias_ascii (string, unique)
-    # 2. Modify get_city():
-    #   if cities query returns None, query cities_aliases:
-    #   .filter_by(alias_ascii=name_ascii)
-    # 3. New command_line tool for adding aliases:
-    #   * adds alias for an existing city
-    #   * if alias in cities, delete alias from cities and update postings_cities
-    name_ascii = normalize_string(name)
-    city = City.query.filter_by(name_ascii=name_ascii).scalar()
-    if not city:
-        city = City(name=name, name_ascii=name_ascii)
-        db_session.add(city)
-        db_session.commit()
-        print('Added city to the db!')
-    return city
+    row = db_session.execute(data_versions.select().where(data_versions.c.name == 'data')).first()
+    if row is None:
+        return 0, None
+    return row.version, row.modified
 
 
-def get_tech(name):
-    """Check if the tech is already in the database;
-    if not, make a new entry. Return the tech.
+def bump_data_version():
+    """Mark the data as changed, e.g. postings added or items merged,
+    so that the caches of the web tier are refreshed.
+    Does not commit; the marker changes with the transaction.
     """
-    name_ascii = normalize_string(name)
-    tech = Technology.query.filter_by(name_ascii=name_ascii).scalar()
-    if not tech:
-        tech = Technology(name=name, name_ascii=name_ascii)
-        db_session.add(tech)
-        db_session.commit()
-        print('Added tech to the db!')
-    return tech
+    now = int(time.time())
+    updated = db_session.execute(data_versions.update().where(data_versions.c.name == 'data').values(
+        version=data_versions.c.version + 1, modified=now)).rowcount
+    if not updated:
+        # versions of databases created before the marker were the
+        # latest posting id
+        version = (db_session.query(func.max(Posting.id)).scalar() or 0) + 1
+        db_session.execute(data_versions.insert(), {'name': 'data', 'version': version, 'modified': now})
+
+
+def get_posting_web_ids(batch_size=10000):
+    """Yield web ids of all the postings in the database, fetched
+    batch_size rows at a time
+    """
+    for row in db_session.query(Posting.web_id).yield_per(batch_size):
+        yield row.web_id
+
+
+def get_known_web_ids(web_ids, batch_size=500):
+    """Return set of the web ids which are in the database; looked up
+    batch_size at a time to stay below the limit of bound parameters
+    """
+    known = set()
+    for batch in get_batches(web_ids, batch_size):
+        known.update(row.web_id for row in db_session.query(Posting.web_id).filter(
+            Posting.web_id.in_(batch)))
+    return known
+
+
+def count_postings():
+    """Return number of postings in the database (int)"""
+    return db_session.query(func.count(Posting.id)).scalar()
+
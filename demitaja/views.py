@@ -1,19 +1,86 @@
-from flask import render_template, request, jsonify
-from sqlalchemy import func
-from sqlalchemy.orm import aliased
-from time import gmtime, strftime
+from flask import render_template, request, jsonify, abort, Response, g
+from time import gmtime, strftime, perf_counter
+from datetime import datetime, timezone
+from werkzeug.http import is_resource_modified
 from demitaja.database import db_session
-from demitaja.models import (Posting, City, Technology, postings_must_assoc,
-                             postings_cities_assoc)
 from demitaja import app
-from demitaja.utils import queries, charts
-from demitaja.utils.utils import normalize_string, check_item
+from demitaja.utils import charts
+from demitaja.utils.backends import get_backend
+from demitaja.utils.chart_cache import ChartCache
+from demitaja.utils.dashboard import Dashboard
+from demitaja.utils.render_pool import RenderPool, RenderError
+from demitaja.utils import trends, salaries, search, suggest, compare
+from demitaja.utils import metrics
+from demitaja.utils.lookup import city_cache, tech_cache
+from demitaja.utils.utils import normalize_string, get_data_marker, check_item
+
+
+chart_cache = ChartCache(app.config['CHART_CACHE_ENTRIES'],
+                         app.config['CHART_CACHE_BYTES'],
+                         app.config['CHART_CACHE_DIR'])
+render_pool = RenderPool(app.config['CHART_WORKERS'],
+                         app.config['CHART_QUEUE_SIZE'],
+                         app.config['CHART_TIMEOUT'])
+
+
+# Endpoints whose responses do not depend on the data only; the others
+# are validated with the data version
+uncached_endpoints = ('static', 'api_stats', 'api_metrics')
+# Data version the name caches were loaded at
+names_version = None
+
+
+@metrics.metrics.register
+def chart_cache_metrics():
+    """Samples of the chart cache"""
+    return metrics.get_samples('chart_cache_', chart_cache.stats(),
+                               ('hits', 'disk_hits', 'misses', 'renders', 'render_time'))
 
 
 ###############################
 # Database session management #
 ###############################
 
+@app.before_request
+def start_request():
+    metrics.start_request()
+
+
+@app.before_request
+def check_not_modified():
+    """Answer request for data which did not change since the client
+    (or a proxy) got it with 304 Not Modified, before any query runs
+    """
+    if not is_cacheable():
+        return None
+    refresh_name_caches()
+    etag, modified = get_validators()
+    if not is_resource_modified(request.environ, etag=etag, last_modified=modified):
+        return add_validators(Response(status=304))
+    return None
+
+
+@app.after_request
+def add_cache_headers(response):
+    """Add ETag, Last-Modified and Cache-Control to successful
+    responses of the endpoints depending on the data
+    """
+    if is_cacheable() and response.status_code == 200:
+        add_validators(response)
+    return response
+
+
+@app.after_request
+def end_request(response):
+    """Record duration and SQL statements of the request; add them to
+    Server-Timing header if SERVER_TIMING is set
+    """
+    timings = metrics.end_request(request.endpoint or 'none', response.status_code)
+    if app.config['SERVER_TIMING']:
+        response.headers['Server-Timing'] = metrics.server_timing(timings)
+    return response
+
+
 @app.teardown_appcontext
 def remove_session(exception=None):
     """Remove database session at the end of each request."""
@@ -24,6 +91,184 @@ def remove_session(exception=None):
 # View functions #
 ##################
 
+def get_chart_format():
+    """Get format of the chart requested by the current request:
+    base64 (default; base64 encoded png in json), data (chart data in json),
+    svg or png, and resolution of the png charts.
+    Abort with 400 if the format is not supported.
+
+    Returns:
+        format (str)
+        dpi (int) or None if not applicable to the format
+    """
+    fmt = request.args.get('format', 'base64')
+    if fmt not in ('base64', 'data', 'svg', 'png'):
+        abort(400, 'Unsupported chart format: {}'.format(fmt))
+    if fmt not in ('base64', 'png'):
+        return fmt, None
+    dpi = request.args.get('dpi', app.config['CHART_DPI'], type=int)
+    return fmt, min(max(dpi, 10), app.config['CHART_MAX_DPI'])
+
+
+def render_chart(chart_type, *args, **kwargs):
+    """Render chart in the format requested by the current request;
+    see demitaja.utils.charts for chart types and their arguments.
+    Charts are rendered in the render pool; chart data is built inline.
+    Abort with 503 if the pool is overloaded or the chart times out.
+    """
+    fmt, dpi = get_chart_format()
+    start = perf_counter()
+    try:
+        if fmt == 'data':
+            return getattr(charts, chart_type)(*args, fmt=fmt, **kwargs)
+        return render_pool.render(chart_type, *args, fmt=fmt, dpi=dpi, **kwargs)
+    except RenderError as err:
+        abort(503, str(err))
+    finally:
+        elapsed = perf_counter() - start
+        metrics.metrics.observe('chart_renders', elapsed, chart=chart_type, format=fmt)
+        metrics.add_render_time(elapsed)
+
+
+def get_dashboard():
+    """Resolve the current request into Dashboard"""
+    return Dashboard(get_backend(), request)
+
+
+def get_request_data_version():
+    """Get data version of the database once per request"""
+    if 'data_version' not in g:
+        g.data_version, g.data_modified = get_data_marker()
+    return g.data_version
+
+
+def is_cacheable():
+    """Check if response to the current request is validated with the
+    data version
+    """
+    return (request.method in ('GET', 'HEAD') and request.endpoint is not None
+            and request.endpoint not in uncached_endpoints)
+
+
+def get_validators():
+    """Get ETag and last modification time (datetime or None) of the
+    data served to the current request
+    """
+    etag = get_data_tag()
+    modified = g.data_modified
+    return etag, datetime.fromtimestamp(modified, timezone.utc) if modified else None
+
+
+def add_validators(response):
+    """Add ETag, Last-Modified and Cache-Control to the response"""
+    etag, modified = get_validators()
+    response.set_etag(etag)
+    if modified:
+        response.last_modified = modified
+    response.headers['Cache-Control'] = app.config['CACHE_CONTROL']
+    return response
+
+
+def refresh_name_caches():
+    """Reload the names of cities and technologies when the data
+    version changes, e.g. after items were merged
+    """
+    global names_version
+    version = get_request_data_version()
+    if version != names_version:
+        city_cache.invalidate()
+        tech_cache.invalidate()
+        names_version = version
+
+
+def get_data_tag():
+    """Get tag of the data served to the current request (str); unlike
+    the version alone, it changes when the database is created again
+    """
+    version = get_request_data_version()
+    return '{}-{}'.format(version, g.data_modified or 0)
+
+
+def get_cache_key(name, chart_format=None):
+    """Get key of the chart cache for the current request"""
+    return (name,
+            normalize_string(request.args.get('req_tech', '')),
+            normalize_string(request.args.get('req_city', '')),
+            chart_format,
+            get_data_tag())
+
+
+def cached_chart(name, get_dashboard):
+    """Return chart for the current request from the chart cache;
+    build the chart if it is not cached.
+
+    Args:
+        name (str): name of the chart, see Dashboard.charts
+        get_dashboard (callable): function returning Dashboard of
+            the current request
+
+    Returns:
+        chart in the requested format
+    """
+    def build_chart():
+        chart = get_dashboard().chart(name)
+        if chart is None:
+            return None
+        chart_type, args, kwargs = chart
+        return render_chart(chart_type, *args, **kwargs)
+    return chart_cache.get_or_render(get_cache_key(name, get_chart_format()), build_chart)
+
+
+def cached_charts_data(get_dashboard):
+    """Return charts data in textual format (html) for the current
+    request from the chart cache; build the data if it is not cached.
+    """
+    return chart_cache.get_or_render(
+        get_cache_key('charts-data'),
+        lambda: render_template('charts-data.html', **get_dashboard().charts_data()))
+
+
+def get_suggestions():
+    """Get names of the items which the user probably meant by the
+    requested tech and city if they are not in the database: dict tech
+    and/or city -> name, see demitaja.utils.suggest.did_you_mean
+    """
+    suggestions = {}
+    for item_type, cache in (('tech', tech_cache), ('city', city_cache)):
+        name_ascii = normalize_string(request.args.get('req_' + item_type, ''))
+        if name_ascii and cache.get_id(name_ascii) is None:
+            suggestion = suggest.did_you_mean(item_type, name_ascii)
+            if suggestion:
+                suggestions[item_type] = suggestion
+    return suggestions
+
+
+def describe_not_found(name, suggestion):
+    """Describe name which is not in the database for a 404 message"""
+    if suggestion:
+        return '{} (did you mean {}?)'.format(name, suggestion)
+    return name
+
+
+def chart_response(name, chart, suggestions=None):
+    """Build response with the chart in the requested format; json
+    responses suggest items for the unknown requested ones (did_you_mean),
+    by default those of get_suggestions
+    """
+    fmt, dpi = get_chart_format()
+    if fmt in ('base64', 'data'):
+        response = {'name': name, fmt: chart}
+        if suggestions is None:
+            suggestions = get_suggestions()
+        if suggestions:
+            response['did_you_mean'] = suggestions
+        return jsonify(response)
+    if chart is None:
+        # no chart for the request
+        return '', 204
+    return Response(chart, mimetype='image/png' if fmt == 'png' else 'image/svg+xml')
+
+
 @app.route('/')
 def home():
     # TODO serve db query results asynchronously via api:
@@ -38,227 +283,225 @@ def home():
     # 5. Each ajax.success with graph data triggers flag for knockout to display the graph
     # 6. html has filter checkboxes allowing the user to specify which graphs are to be displayed
 
-    # Get posted date for the oldest and newest postings
-    dates = db_session.query(func.max(Posting.posted).label('newest'),
-                             func.min(Posting.posted).label('oldest')
-                             ).one()
+    backend = get_backend()
+    # Get posted date for the oldest and newest postings from the daily counts
+    oldest, newest = trends.get_date_range()
     # Template variables
     data = {
         # Get total number of postings in database
-        'total_postings': db_session.query(func.count(Posting.id)).scalar(),
+        'total_postings': backend.total(),
         # Get posted date for the oldest and newest postings
-        'newest':  strftime("%d %b %Y", gmtime(dates.newest)),
-        'oldest': strftime("%d %b %Y", gmtime(dates.oldest)),
+        'newest': newest.strftime("%d %b %Y") if newest else strftime("%d %b %Y", gmtime()),
+        'oldest': oldest.strftime("%d %b %Y") if oldest else strftime("%d %b %Y", gmtime()),
         # Get number of job postings for each of top 10 technologies
-        'techs': db_session.execute(queries.techs).fetchall(),
+        'techs': backend.techs(),
         # Get number of job postings for each of top 10 cities
-        'cities': db_session.execute(queries.cities).fetchall()
+        'cities': backend.cities()
     }
     return render_template('index.html', **data)
 
 
 @app.route('/api/cities')
 def api_cities():
-    """Cities chart"""
-    # Get total number of postings in database
-    total_postings = db_session.query(func.count(Posting.id)).scalar()
-    # req_tech
-    tech_name_ascii, tech_name, tech_count = check_item(request, 'tech')
-    # req_city
-    city_name_ascii, city_name, city_count = check_item(request, 'city')
-
-    if tech_name:
-        # Get 5 cities with most postings with req_tech as must
-        cities_tech = db_session.execute(queries.cities_tech, {'tech': tech_name_ascii}).fetchall()
-        # Get total number of job postings for each city in cities_tech
-        req_cities = [normalize_string(city[0]) for city in cities_tech]
-        if city_name and city_name_ascii not in req_cities:
-                # Get number of postings in req_city with req_tech as must
-                tech_city = db_session.execute(queries.tech_city,
-                                               {'city': city_name_ascii, 'tech': tech_name_ascii}).fetchone()
-                if tech_city:
-                    # Append tech_city to req_cities and cities_tech
-                    req_cities.append(city_name_ascii)
-                    cities_tech.append((tech_city[1], tech_city[0], tech_city[2]))
-        cities_all = db_session.query(City.name, func.count('*')). \
-            join(postings_cities_assoc). \
-            filter(City.name_ascii.in_(req_cities)). \
-            group_by(City.name).all()
-        # Build tuple (no_of_postings_all, no_of_postings_req_tech)
-        total = (total_postings, tech_count)
-        # Build list of tuples (city_name, no_of_postings_all_techs, no_of_postings_req_tech)
-        cities_dict = dict(cities_all)
-        items = [[city[0], cities_dict[city[0]], city[2]] for city in cities_tech]
-        # Build chart
-        chart = charts.bar_double(items,
-                                  total,
-                                  title='Cities with most {} job postings'.format(tech_name),
-                                  legend=('All technologies', tech_name))
-    elif city_name:
-        # Build city tuple
-        city = (city_name, city_count)
-        # Get number of job postings for each of top 10 cities
-        cities = db_session.execute(queries.cities).fetchall()
-        # Get index of req_city in cities
-        # If req_city is not in cities, append it
-        try:
-            city_index = cities.index(city)
-        except ValueError:
-            cities.append(city)
-            cities.sort(key=lambda x: x[1], reverse=True)
-            city_index = cities.index(city)
-        # Build chart
-        chart = charts.bar_single(cities,
-                                  total_postings,
-                                  title='Cities with most job postings',
-                                  highlight=city_index)
-
-    else:
-        # Get number of job postings for each of top 10 cities
-        cities = db_session.execute(queries.cities).fetchall()
-        # Build chart
-        chart = charts.bar_single(cities,
-                                  total_postings,
-                                  title='Cities with most job postings')
-    return jsonify(name='cities', base64=chart)
+    """Cities chart; see get_chart_format for the supported formats"""
+    return chart_response('cities', cached_chart('cities', get_dashboard))
 
 
 @app.route('/api/techs')
 def api_techs():
-    """Technologies chart"""
-    # Get total number of postings in database
-    total_postings = db_session.query(func.count(Posting.id)).scalar()
-    # req_tech
-    tech_name_ascii, tech_name, tech_count = check_item(request, 'tech')
-    # req_city
-    city_name_ascii, city_name, city_count = check_item(request, 'city')
-
-    if city_name:
-        # Get number of postings of top 5 technologies in req_city
-        techs_city = db_session.execute(queries.techs_city, {'city': city_name_ascii}).fetchall()
-        # Get total number of job postings for each technology in techs_city
-        req_techs = [normalize_string(tech[0]) for tech in techs_city]
-        if tech_name and tech_name_ascii not in req_techs:
-            # Get number of postings in req_city with req_tech as must
-            tech_city = db_session.execute(queries.tech_city,
-                                           {'city': city_name_ascii, 'tech': tech_name_ascii}).fetchone()
-            if tech_city:
-                # Append tech_city to req_cities and cities_tech
-                req_techs.append(tech_name_ascii)
-                techs_city.append(tech_city)
-        techs_all = db_session.query(Technology.name, func.count('*')). \
-            join(postings_must_assoc). \
-            filter(Technology.name_ascii.in_(req_techs)). \
-            group_by(Technology.name).all()
-        # Build tuple (no_of_postings_all, no_of_postings_req_city)
-        total = (total_postings, city_count)
-        # Build list of tuples (tech_name, no_of_postings_all_cities, no_of_postings_req_city)
-        techs_dict = dict(techs_all)
-        items = [[tech[0], techs_dict[tech[0]], tech[2]] for tech in techs_city]
-        # Build chart
-        chart = charts.bar_double(items,
-                                  total,
-                                  title='Most in-demand technologies in {}'.format(city_name),
-                                  legend=('All cities', city_name))
-    elif tech_name:
-        # Get number of job postings with req_tech as must
-        tech = (tech_name, tech_count)
-        # Get number of job postings for each of top 10 technologies
-        techs = db_session.execute(queries.techs).fetchall()
-        # Get index of req_tech in techs
-        # If req_tech not in techs, append it
-        try:
-            tech_index = techs.index(tech)
-        except ValueError:
-            techs.append(tech)
-            techs.sort(key=lambda x: x[1], reverse=True)
-            tech_index = techs.index(tech)
-        # Build chart
-        chart = charts.bar_single(techs,
-                                  total_postings,
-                                  title='Most in-demand technologies',
-                                  highlight=tech_index)
-    else:
-        # Get number of job postings for each of top 10 technologies
-        techs = db_session.execute(queries.techs).fetchall()
-        # Build chart
-        chart = charts.bar_single(techs,
-                                  total_postings,
-                                  title='Most in-demand technologies')
-    return jsonify(name='techs', base64=chart)
+    """Technologies chart; see get_chart_format for the supported formats"""
+    return chart_response('techs', cached_chart('techs', get_dashboard))
 
 
 @app.route('/api/techs-tech')
 def api_techs_tech():
-    """Techs tech chart"""
-    # req_tech
-    tech_name_ascii, tech_name, tech_count = check_item(request, 'tech')
-    # req_city
-    city_name_ascii, city_name, city_count = check_item(request, 'city')
-
-    if city_name and tech_name:
-        # Get number of postings in req_city with req_tech as must
-        tech_city = db_session.execute(queries.tech_city,
-                                       {'city': city_name_ascii, 'tech': tech_name_ascii}).fetchone()
-        # Technologies most often required in postings requiring req_tech in req_city
-        techs_tech_city = db_session.execute(queries.techs_tech_city,
-                                             {'city': city_name_ascii, 'tech': tech_name_ascii}).fetchall()
-        # Get total number of job postings for techs in techs_tech_city
-        req_techs_tech = [normalize_string(tech[0]) for tech in techs_tech_city]
-        t_alias, pm_alias = aliased(Technology), aliased(postings_must_assoc)
-        techs_tech_all = db_session.query(Technology.name, func.count('*')). \
-            join(postings_must_assoc). \
-            join(pm_alias, pm_alias.c.posting_id == postings_must_assoc.c.posting_id). \
-            join(t_alias, t_alias.id == pm_alias.c.must_id). \
-            filter(Technology.name_ascii.in_(req_techs_tech)). \
-            filter(t_alias.name_ascii == tech_name_ascii). \
-            group_by(Technology.name).all()
-        # Build tuple (no_of_postings_req_tech, no_of_postings_req_tech_req_city)
-        total = (tech_count, tech_city[2])
-        # Build list of tuples (tech_name, no_of_postings_tech_req_tech, no_of_postings_tech_req_tech_req_city)
-        techs_tech_dict = dict(techs_tech_all)
-        items = [[tech[0], techs_tech_dict[tech[0]], tech[3]] for tech in techs_tech_city]
-        # Build chart
-        chart = charts.bar_double(items,
-                                  total,
-                                  title='Technologies most often required  in {} job postings'.format(tech_name),
-                                  legend=('All cities', city_name))
-    elif tech_name:
-        # Top 5 technologies required in postings requiring req_tech
-        techs_tech = db_session.execute(queries.techs_tech, {'tech': tech_name_ascii}).fetchall()
-        items = [(tech[0], tech[2]) for tech in techs_tech]
-        chart = charts.bar_single(items,
-                                  tech_count,
-                                  title='Technologies most often required in {} job postings'.format(tech_name))
-    else:
-        # no data for chart if no req_tech
-        chart = None
-    return jsonify(name='techs-tech', base64=chart)
+    """Techs tech chart; see get_chart_format for the supported formats"""
+    return chart_response('techs-tech', cached_chart('techs-tech', get_dashboard))
 
 
 @app.route('/api/charts-data')
 def api_charts_data():
     """Charts data in textual format. This is just to confirm that the charts are correct."""
-    data = {}  # container for template variables
-    # req_tech
-    tech_name_ascii, tech_name, data['tech_count'] = check_item(request, 'tech')
-    # req_city
-    city_name_ascii, city_name, data['city_count'] = check_item(request, 'city')
-    data['tech_name'], data['city_name'] = tech_name, city_name
-    if city_name:
-        # Technologies most in-demand in req_city
-        data['techs_city'] = db_session.execute(queries.techs_city, {'city': city_name_ascii}).fetchall()
-    if tech_name:
-        # Cities with most job postings requiring req_tech
-        data['cities_tech'] = db_session.execute(queries.cities_tech, {'tech': tech_name_ascii}).fetchall()
-        # Technologies most often required in postings requiring req_tech
-        data['techs_tech'] = db_session.execute(queries.techs_tech, {'tech': tech_name_ascii}).fetchall()
-    if city_name and tech_name:
-        # Demand for req_tech in req_city
-        data['tech_city'] = db_session.execute(queries.tech_city, {'city': city_name_ascii, 'tech': tech_name_ascii}).fetchone()
-        if not data['tech_city']:
-            data['tech_city'] = (tech_name, city_name, 0)
-        # Technologies most often required in postings requiring req_tech in req_city
-        data['techs_tech_city'] = db_session.execute(queries.techs_tech_city,
-                                                     {'city': city_name_ascii, 'tech': tech_name_ascii}).fetchall()
-    return render_template('charts-data.html', **data)
+    return cached_charts_data(get_dashboard)
+
+
+@app.route('/api/dashboard')
+def api_dashboard():
+    """All the charts and the charts data in textual format for the
+    requested tech and city. The request is resolved once and shared
+    by all the charts. Supported chart formats are base64, data and svg.
+    """
+    fmt, dpi = get_chart_format()
+    if fmt == 'png':
+        abort(400, 'Binary charts cannot be embedded in json')
+    # build dashboard only if any of the charts is not cached
+    dashboard = []
+
+    def get_shared_dashboard():
+        if not dashboard:
+            dashboard.append(get_dashboard())
+        return dashboard[0]
+
+    response = {'charts': {name: cached_chart(name, get_shared_dashboard) for name in Dashboard.charts},
+                'charts_data': cached_charts_data(get_shared_dashboard)}
+    suggestions = get_suggestions()
+    if suggestions:
+        response['did_you_mean'] = suggestions
+    return jsonify(response)
+
+
+def get_requested_items():
+    """Resolve the tech and city requested by the current request;
+    abort with 404 if any of them is not in the database.
+
+    Returns:
+        normalized and database name of the tech or None if not requested
+        normalized and database name of the city or None if not requested
+    """
+    backend = get_backend()
+    tech_name_ascii, tech_name, tech_count = check_item(request, 'tech', backend)
+    if tech_name_ascii and not tech_name:
+        abort(404, 'Technology not found: {}'.format(describe_not_found(
+            request.args['req_tech'], suggest.did_you_mean('tech', tech_name_ascii))))
+    city_name_ascii, city_name, city_count = check_item(request, 'city', backend)
+    if city_name_ascii and not city_name:
+        abort(404, 'City not found: {}'.format(describe_not_found(
+            request.args['req_city'], suggest.did_you_mean('city', city_name_ascii))))
+    return tech_name_ascii, tech_name, city_name_ascii, city_name
+
+
+def get_date_arg(name, default):
+    """Get date (YYYY-MM-DD) from the query string; abort with 400 if invalid"""
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        abort(400, 'Invalid date {}: {}'.format(name, value))
+
+
+@app.route('/api/trends')
+def api_trends():
+    """Number of postings with the requested tech and/or in the requested
+    city posted in each day, week or month (granularity) between start and
+    end (YYYY-MM-DD; by default the dates of the oldest and newest postings).
+    The first and last buckets only count the days within the range.
+    """
+    granularity = request.args.get('granularity', 'week')
+    if granularity not in trends.GRANULARITIES:
+        abort(400, 'Unsupported granularity: {}'.format(granularity))
+    tech_name_ascii, tech_name, city_name_ascii, city_name = get_requested_items()
+    oldest, newest = trends.get_date_range()
+    start = get_date_arg('start', oldest)
+    end = get_date_arg('end', newest)
+    if start is None or end is None or start > end:
+        buckets = []
+    else:
+        if trends.number_of_buckets(start, end, granularity) > app.config['TREND_MAX_BUCKETS']:
+            abort(400, 'Too many buckets; use coarser granularity or shorter range')
+        buckets = trends.get_trend(start, end, granularity, tech=tech_name_ascii, city=city_name_ascii)
+    return jsonify(tech=tech_name, city=city_name, granularity=granularity,
+                   start=start and start.isoformat(), end=end and end.isoformat(),
+                   buckets=[{'start': d.isoformat(), 'count': count, 'total': total}
+                            for d, count, total in buckets])
+
+
+@app.route('/api/salaries')
+def api_salaries():
+    """25th, 50th and 75th percentiles of the monthly salaries in
+    SALARY_CURRENCY in postings with the requested tech as must and/or
+    in the requested city for each employment type.
+    """
+    tech_name_ascii, tech_name, city_name_ascii, city_name = get_requested_items()
+    tech_id = tech_cache.get_id(tech_name_ascii) if tech_name else 0
+    city_id = city_cache.get_id(city_name_ascii) if city_name else 0
+    return jsonify(tech=tech_name, city=city_name,
+                   currency=app.config['SALARY_CURRENCY'], period='month',
+                   salaries=salaries.get_percentiles(tech_id, city_id))
+
+
+@app.route('/api/search')
+def api_search():
+    """Postings with all the words of the query (q) in the title or
+    description, optionally with the requested tech as must and/or in the
+    requested city, ordered from the best match; page (from 1) of per_page
+    postings.
+    """
+    if not search.search_enabled():
+        abort(501, 'Full-text search requires SQLite')
+    query = request.args.get('q', '')
+    if not search.build_match(query):
+        abort(400, 'Query has no words to search for')
+    tech_name_ascii, tech_name, city_name_ascii, city_name = get_requested_items()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = request.args.get('per_page', app.config['SEARCH_PER_PAGE'], type=int)
+    per_page = min(max(per_page, 1), app.config['SEARCH_MAX_PER_PAGE'])
+    # one extra posting tells if there is a next page
+    postings = search.search(query, tech=tech_name_ascii, city=city_name_ascii,
+                             limit=per_page + 1, offset=(page - 1) * per_page)
+    return jsonify(query=query, tech=tech_name, city=city_name, page=page, per_page=per_page,
+                   has_next=len(postings) > per_page, postings=postings[:per_page])
+
+
+@app.route('/api/compare')
+def api_compare():
+    """Comparison of several technologies (req_tech) and/or cities
+    (req_city), each a comma separated list of names, as one chart; with
+    format=data the whole comparison matrix and the chart data.
+    See get_chart_format for the supported formats.
+    """
+    techs = compare.get_names(request.args.get('req_tech', ''))
+    cities = compare.get_names(request.args.get('req_city', ''))
+    if not techs and not cities:
+        abort(400, 'No technologies or cities to compare')
+    if len(techs) > app.config['COMPARE_MAX_ITEMS'] or len(cities) > app.config['COMPARE_MAX_ITEMS']:
+        abort(400, 'Too many items; at most {} technologies and {} cities'.format(
+            app.config['COMPARE_MAX_ITEMS'], app.config['COMPARE_MAX_ITEMS']))
+    fmt, dpi = get_chart_format()
+
+    def build_comparison():
+        comparison, not_found = compare.get_comparison(techs, cities)
+        if not_found:
+            abort(404, 'Not found: {}'.format(', '.join(
+                describe_not_found(name, suggestion) for name, suggestion in not_found)))
+        chart_type, args, kwargs = compare.get_chart(comparison, get_backend().total())
+        chart = render_chart(chart_type, *args, **kwargs)
+        if fmt == 'data':
+            return dict(comparison, chart=chart)
+        return chart
+    # unknown names are reported with their suggestions by the 404 of
+    # build_comparison; req_tech and req_city are lists, not single names
+    return chart_response('compare', chart_cache.get_or_render(
+        get_cache_key('compare', (fmt, dpi)), build_comparison), suggestions={})
+
+
+@app.route('/api/suggest')
+def api_suggest():
+    """Technologies (type=tech, default) or cities (type=city) with a word
+    starting with the query (q), most frequent first, followed by the
+    names most similar to the query; at most limit names.
+    """
+    item_type = request.args.get('type', 'tech')
+    if item_type not in ('tech', 'city'):
+        abort(400, 'Unsupported type: {}'.format(item_type))
+    limit = request.args.get('limit', app.config['SUGGEST_LIMIT'], type=int)
+    limit = min(max(limit, 1), app.config['SUGGEST_LIMIT'])
+    query = request.args.get('q', '')
+    return jsonify(query=query, type=item_type,
+                   suggestions=[{'name': name, 'name_ascii': name_ascii, 'count': count}
+                                for name_ascii, name, count in suggest.suggest(item_type, query, limit)])
+
+
+@app.route('/api/stats')
+def api_stats():
+    """Statistics of the in-process caches"""
+    return jsonify(chart_cache=chart_cache.stats())
+
+
+@app.route('/metrics')
+def api_metrics():
+    """Metrics of the requests, SQL statements, chart rendering, caches
+    and ingest in the Prometheus text format
+    """
+    return Response(metrics.metrics.render(), mimetype='text/plain; version=0.0.4')
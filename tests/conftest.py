@@ -0,0 +1,44 @@
+"""Fixtures of the tests: the app configured with a temporary SQLite
+database holding synthetic postings.
+"""
+
+import os
+import shutil
+import tempfile
+import pytest
+
+# the database is chosen when demitaja is imported
+directory = tempfile.mkdtemp(prefix='demitaja-tests-')
+settings_path = os.path.join(directory, 'settings.cfg')
+with open(settings_path, 'w') as f:
+    f.write("DB_URL = 'sqlite:///{}'\n".format(os.path.join(directory, 'demitaja.db')))
+    f.write("CHART_WORKERS = 0\n")
+    f.write("SQLITE_BUSY_TIMEOUT = 5\n")
+    f.write("LOG_LEVEL = 'WARNING'\n")
+os.environ['DEMITAJA_SETTINGS'] = settings_path
+
+from demitaja import app  # noqa: E402
+from demitaja.database import db_session, init_db  # noqa: E402
+from demitaja.utils.synthetic import PostingGenerator  # noqa: E402
+from demitaja.utils.utils import create_postings, extract_posting  # noqa: E402
+
+POSTINGS = 300
+
+
+@pytest.fixture(scope='session')
+def postings_db():
+    """Database with POSTINGS synthetic postings of 20 technologies and
+    8 cities
+    """
+    init_db()
+    generator = PostingGenerator(seed=1, techs=20, cities=8)
+    create_postings((extract_posting(raw, scraped=0) for raw in generator.generate(POSTINGS)),
+                    batch_size=100)
+    yield
+    db_session.remove()
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+@pytest.fixture
+def client(postings_db):
+    return app.test_client()
@@ -0,0 +1,33 @@
+from demitaja import app
+from demitaja.database import db_session
+from demitaja.models import Technology
+from demitaja.utils.aggregates import check_aggregates
+from demitaja.utils.synthetic import PostingGenerator
+from demitaja.utils.utils import create_postings, extract_posting
+
+
+def get_postings(count, seed):
+    generator = PostingGenerator(seed=seed, techs=20, cities=8)
+    return [extract_posting(raw, scraped=0) for raw in generator.generate(count)]
+
+
+def test_aggregates_consistent_after_ingest(postings_db):
+    assert check_aggregates() == {}
+    # the items of the new postings are already counted
+    assert create_postings(get_postings(20, seed=5), batch_size=7) == 20
+    assert check_aggregates() == {}
+
+
+def test_aggregates_consistent_after_rolled_back_batch(postings_db):
+    postings = get_postings(10, seed=6)
+    postings[-1]['title'] = None
+    assert create_postings(postings, batch_size=5) == 5
+    assert check_aggregates() == {}
+
+
+def test_aggregates_consistent_after_add_alias(postings_db):
+    result = app.test_cli_runner().invoke(args=['add-alias', 'tech', 'Kotlin', 'PostgreSQL'])
+    assert result.exit_code == 0, result.output
+    assert 'Merged Kotlin into PostgreSQL' in result.output
+    assert db_session.query(Technology).filter_by(name_ascii='kotlin').count() == 0
+    assert check_aggregates() == {}
@@ -0,0 +1,52 @@
+from sqlalchemy import text
+from demitaja import app
+from demitaja.database import db_session
+from demitaja.models import City, cities_aliases, postings_cities_assoc, technologies_aliases
+from demitaja.utils.aggregates import check_aggregates
+from demitaja.utils.aliases import aggregate_columns
+from demitaja.utils.utils import get_data_marker
+
+
+def add_alias(*args):
+    return app.test_cli_runner().invoke(args=['add-alias'] + list(args))
+
+
+def get_city_id(name_ascii):
+    return db_session.query(City.id).filter_by(name_ascii=name_ascii).scalar()
+
+
+def get_posting_ids(city_id):
+    return {row[0] for row in db_session.execute(postings_cities_assoc.select().where(
+        postings_cities_assoc.c.city_id == city_id))}
+
+
+def test_merge_duplicate_city(postings_db):
+    duplicate_id, item_id = get_city_id('katowice'), get_city_id('lodz')
+    assert add_alias('city', 'Kattowitz', 'Katowice').exit_code == 0
+    posting_ids = get_posting_ids(duplicate_id) | get_posting_ids(item_id)
+    result = add_alias('city', 'Katowice', 'Łódź')
+    assert result.exit_code == 0, result.output
+    assert get_city_id('katowice') is None
+    assert get_posting_ids(item_id) == posting_ids
+    # aliases of the duplicate refer to the item, and so does its name
+    aliases = dict(db_session.query(cities_aliases.c.alias_ascii, cities_aliases.c.city_id).all())
+    assert aliases == {'kattowitz': item_id, 'katowice': item_id}
+    for column in aggregate_columns['city']:
+        assert not db_session.execute(column.table.select().where(column == duplicate_id)).first()
+    assert db_session.execute(text('PRAGMA foreign_key_check')).fetchall() == []
+    assert check_aggregates() == {}
+    response = app.test_client().get('/api/cities?req_city=Katowice&format=data')
+    assert response.status_code == 200 and 'did_you_mean' not in response.get_json()
+
+
+def test_failed_add_alias_changes_nothing(postings_db):
+    aliases = [set(db_session.execute(table.select())) for table in (cities_aliases, technologies_aliases)]
+    marker = get_data_marker()
+    db_session.commit()
+    for args in (('city', 'Gotham', 'Nowhere'), ('tech', 'Python', 'python')):
+        result = add_alias(*args)
+        assert result.exit_code == 1
+    assert 'Not found: Nowhere' in add_alias('city', 'Gotham', 'Nowhere').output
+    assert [set(db_session.execute(table.select())) for table in (cities_aliases, technologies_aliases)] \
+        == aliases
+    assert get_data_marker() == marker
@@ -0,0 +1,26 @@
+import pytest
+from flask import request
+from sqlalchemy import text
+from demitaja import app
+from demitaja.database import db_session
+from demitaja.utils.backends import sql_backend, compare_backends
+from demitaja.utils.utils import check_item
+
+
+def test_total(postings_db):
+    assert sql_backend.total() == db_session.execute(text('SELECT COUNT(*) FROM postings')).scalar()
+
+
+def test_analytics_engine_matches_sql_backend(postings_db):
+    pytest.importorskip('numpy')
+    from demitaja.utils.engine import AnalyticsEngine
+    analytics = AnalyticsEngine()
+    analytics.load()
+    assert analytics.total() == sql_backend.total()
+    assert compare_backends(sql_backend, analytics) == []
+
+
+def test_check_item_defaults_to_sql_backend(postings_db):
+    with app.test_request_context('/?req_tech=Python&req_city=atlantis'):
+        assert check_item(request, 'tech') == ('python', 'Python', sql_backend.tech('python')[1])
+        assert check_item(request, 'city') == ('atlantis', None, 0)
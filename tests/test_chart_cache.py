@@ -0,0 +1,46 @@
+import os
+from demitaja.database import db_session
+from demitaja.utils.chart_cache import ChartCache
+from demitaja.utils.utils import bump_data_version
+from demitaja.views import chart_cache
+
+
+def test_lru_eviction():
+    cache = ChartCache(max_entries=2, max_bytes=1000)
+    for name in ('a', 'b', 'c'):
+        cache.set((name, '1-0'), name * 10)
+    assert cache.get(('a', '1-0')) == (False, None)
+    assert cache.get(('c', '1-0')) == (True, 'c' * 10)
+    # charts larger than the cache are not kept
+    cache.set(('big', '1-0'), 'x' * 2000)
+    assert cache.get(('big', '1-0')) == (False, None)
+
+
+def test_new_version_drops_old_charts(tmp_path):
+    cache = ChartCache(max_entries=10, max_bytes=1000, directory=str(tmp_path))
+    cache.set(('techs', '1-100'), 'old')
+    assert cache.get(('techs', '1-100')) == (True, 'old')
+    assert cache.get(('techs', '2-200')) == (False, None)
+    assert cache.stats()['entries'] == 0
+    assert os.listdir(str(tmp_path)) == []
+    # nor does another process find the old charts on the disk
+    assert ChartCache(10, 1000, str(tmp_path)).get(('techs', '1-100')) == (False, None)
+
+
+def test_disk_tier_is_shared(tmp_path):
+    ChartCache(10, 1000, str(tmp_path)).set(('techs', '1-100'), 'chart')
+    cache = ChartCache(10, 1000, str(tmp_path))
+    assert cache.get(('techs', '1-100')) == (True, 'chart')
+    assert cache.stats()['disk_hits'] == 1
+
+
+def test_data_version_bump_invalidates_charts(client):
+    url = '/api/techs?format=data'
+    first = client.get(url)
+    renders = chart_cache.stats()['renders']
+    assert client.get(url).get_json() == first.get_json()
+    assert chart_cache.stats()['renders'] == renders
+    bump_data_version()
+    db_session.commit()
+    assert client.get(url).get_json() == first.get_json()
+    assert chart_cache.stats()['renders'] == renders + 1
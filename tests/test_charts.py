@@ -0,0 +1,48 @@
+import base64
+import pytest
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+@pytest.mark.parametrize('url', ['/api/cities', '/api/techs?req_city=krakow',
+                                 '/api/techs-tech?req_tech=python'])
+def test_base64(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    assert base64.b64decode(response.get_json()['base64']).startswith(PNG_SIGNATURE)
+
+
+def test_base64_is_default_format(client):
+    assert client.get('/api/cities?format=base64').get_json() == client.get('/api/cities').get_json()
+
+
+def test_data(client):
+    data = client.get('/api/cities?format=data').get_json()
+    assert data['name'] == 'cities'
+    assert isinstance(data['data'], dict)
+
+
+def test_svg(client):
+    response = client.get('/api/cities?format=svg')
+    assert response.mimetype == 'image/svg+xml'
+    assert b'<svg' in response.data
+
+
+def test_png(client):
+    response = client.get('/api/cities?format=png&dpi=50')
+    assert response.mimetype == 'image/png'
+    assert response.data.startswith(PNG_SIGNATURE)
+    # charts of different resolutions are cached separately
+    assert client.get('/api/cities?format=png&dpi=60').data != response.data
+
+
+def test_unsupported_format(client):
+    assert client.get('/api/cities?format=gif').status_code == 400
+    # binary charts cannot be embedded in the json of the dashboard
+    assert client.get('/api/dashboard?format=png').status_code == 400
+
+
+def test_dashboard_formats(client):
+    for fmt in ('base64', 'data', 'svg'):
+        data = client.get('/api/dashboard?req_tech=python&format=' + fmt).get_json()
+        assert set(data['charts']) == {'cities', 'techs', 'techs-tech'}
@@ -0,0 +1,64 @@
+from sqlalchemy import event
+from demitaja.database import db_session, engine
+from demitaja.utils import compare
+from demitaja.utils.backends import sql_backend
+from demitaja.utils.lookup import tech_cache
+
+
+def count_statements(func):
+    """Return number of SQL statements executed by func"""
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        func()
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return len(statements)
+
+
+def test_get_names():
+    assert compare.get_names('Python, java,,PYTHON , Node.js') == ['python', 'java', 'node.js']
+
+
+def test_comparison(postings_db):
+    comparison, not_found = compare.get_comparison(['python', 'java'], ['krakow', 'warszawa'])
+    assert not_found == []
+    assert [tech['name'] for tech in comparison['techs']] == ['Python', 'Java']
+    assert [city['name'] for city in comparison['cities']] == ['Kraków', 'Warszawa']
+    for tech in comparison['techs']:
+        assert tech['count'] == sql_backend.tech(tech['name_ascii'])[1]
+    for city in comparison['cities']:
+        assert city['count'] == sql_backend.city(city['name_ascii'])[1]
+    for tech, row in zip(comparison['techs'], comparison['tech_city']):
+        assert row == [(sql_backend.tech_city(tech['name_ascii'], city['name_ascii']) or (0, 0, 0))[2]
+                       for city in comparison['cities']]
+    # the diagonal holds the counts of the technologies
+    assert [comparison['tech_pairs'][i][i] for i in range(2)] == \
+        [tech['count'] for tech in comparison['techs']]
+    assert comparison['tech_pairs'][0][1] == comparison['tech_pairs'][1][0] > 0
+
+
+def test_unknown_names_are_reported(postings_db):
+    comparison, not_found = compare.get_comparison(['python', 'pythn', 'zzzzzz'], [])
+    assert [tech['name'] for tech in comparison['techs']] == ['Python']
+    assert not_found == [('pythn', 'Python'), ('zzzzzz', None)]
+
+
+def test_names_resolved_with_one_query(postings_db, monkeypatch):
+    # suggestions come from the in-memory name index
+    monkeypatch.setattr(compare, 'did_you_mean', lambda item_type, name: None)
+    names = ['python', 'pyton', 'java', 'zzzzzz', 'yyyyyy']
+    tech_cache.load()
+    tech_cache.aliases['pyton'] = 'python'
+    try:
+        statements = count_statements(lambda: compare.resolve('tech', names))
+        items, not_found = compare.resolve('tech', names)
+    finally:
+        tech_cache.invalidate()
+        db_session.remove()
+    assert statements == 1
+    assert [item[2] for item in items] == ['Python', 'Java']
+    assert not_found == [('zzzzzz', None), ('yyyyyy', None)]
@@ -0,0 +1,39 @@
+import json
+import zlib
+from sqlalchemy import text
+from demitaja.database import compress_postings, db_session
+from demitaja.models import Posting
+
+
+def get_raw_text(posting_id):
+    return db_session.execute(text('SELECT text FROM postings WHERE id=:id'), {'id': posting_id}).scalar()
+
+
+def test_bodies_stored_compressed(postings_db):
+    posting = Posting.query.order_by(Posting.id).first()
+    raw = get_raw_text(posting.id)
+    assert isinstance(raw, bytes)
+    assert zlib.decompress(raw).decode('utf-8') == posting.text
+    assert json.loads(posting.text)['id'] == posting.web_id
+
+
+def test_body_loaded_lazily(postings_db):
+    db_session.remove()
+    posting = Posting.query.first()
+    assert 'text' not in posting.__dict__
+    assert posting.text
+    db_session.remove()
+
+
+def test_compress_uncompressed_bodies(postings_db):
+    posting_id, body = db_session.query(Posting.id, Posting.text).order_by(Posting.id.desc()).first()
+    # stored before the bodies were compressed
+    db_session.execute(text('UPDATE postings SET text=:body WHERE id=:id'), {'body': body, 'id': posting_id})
+    db_session.commit()
+    assert get_raw_text(posting_id) == body
+    assert Posting.query.filter_by(id=posting_id).one().text == body
+    assert compress_postings(batch_size=50) == 1
+    assert isinstance(get_raw_text(posting_id), bytes)
+    db_session.remove()
+    assert Posting.query.filter_by(id=posting_id).one().text == body
+    assert compress_postings() == 0
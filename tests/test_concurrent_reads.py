@@ -0,0 +1,49 @@
+import threading
+import time
+from sqlalchemy import text
+from demitaja.database import engine, read_engine
+from demitaja.views import chart_cache
+
+# duration of the write transaction and max duration of a read [s]
+WRITE_SECONDS = 2.0
+MAX_READ_SECONDS = 1.0
+
+
+def test_database_in_wal_mode(postings_db):
+    with read_engine.connect() as conn:
+        assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+
+
+def test_reads_continue_while_writer_commits(client):
+    locked = threading.Event()
+    errors = []
+
+    def write():
+        try:
+            with engine.connect() as conn:
+                transaction = conn.begin()
+                # small page cache makes the transaction spill changes into
+                # the database file, as large ingest transactions do
+                conn.execute(text('PRAGMA cache_size=-64'))
+                conn.execute(text('UPDATE postings SET scraped=scraped+1'))
+                locked.set()
+                time.sleep(WRITE_SECONDS)
+                transaction.commit()
+        except Exception as err:
+            errors.append(err)
+        finally:
+            locked.set()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    locked.wait()
+    durations, statuses = [], []
+    while writer.is_alive():
+        chart_cache.clear()
+        start = time.perf_counter()
+        statuses.append(client.get('/api/dashboard?format=data').status_code)
+        durations.append(time.perf_counter() - start)
+    writer.join()
+    assert not errors
+    assert durations and set(statuses) == {200}
+    assert max(durations) < MAX_READ_SECONDS
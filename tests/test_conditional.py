@@ -0,0 +1,39 @@
+from demitaja.database import db_session
+from demitaja.utils.utils import bump_data_version
+
+URL = '/api/cities?format=data'
+
+
+def test_matching_etag_not_modified(client):
+    response = client.get(URL)
+    etag = response.headers['ETag']
+    assert response.status_code == 200 and response.headers['Cache-Control']
+    not_modified = client.get(URL, headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304
+    assert not_modified.data == b''
+    assert not_modified.headers['ETag'] == etag
+    assert client.get(URL, headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_data_version_bump_modifies(client):
+    response = client.get(URL)
+    bump_data_version()
+    db_session.commit()
+    modified = client.get(URL, headers={'If-None-Match': response.headers['ETag']})
+    assert modified.status_code == 200
+    assert modified.headers['ETag'] != response.headers['ETag']
+    assert client.get(URL, headers={'If-None-Match': modified.headers['ETag']}).status_code == 304
+
+
+def test_if_modified_since(client):
+    response = client.get(URL)
+    last_modified = response.headers['Last-Modified']
+    assert client.get(URL, headers={'If-Modified-Since': last_modified}).status_code == 304
+
+
+def test_uncached_endpoints_not_validated(client):
+    for url in ('/metrics', '/api/stats'):
+        assert 'ETag' not in client.get(url).headers
+    # errors are not validated either
+    response = client.get('/api/trends?req_tech=atlantis')
+    assert response.status_code == 404 and 'ETag' not in response.headers
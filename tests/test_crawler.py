@@ -0,0 +1,70 @@
+import json
+import types
+import pytest
+from demitaja.crawlers.state import get_last_crawls, set_last_crawl
+from demitaja.database import db_session
+from demitaja.models import crawl_state
+
+scrapy = pytest.importorskip('scrapy')
+from scrapy.http import Request, Response, TextResponse  # noqa: E402
+from scrapy.utils.test import get_crawler  # noqa: E402
+from demitaja.crawlers.crawlers import FluffSpider  # noqa: E402
+from demitaja.models import Posting  # noqa: E402
+
+SEARCHES = ['category=backend city=test', 'category=frontend city=test']
+
+
+@pytest.fixture
+def spider(postings_db):
+    db_session.execute(crawl_state.delete())
+    db_session.commit()
+    spider = FluffSpider.from_crawler(get_crawler(FluffSpider), categories='backend,frontend',
+                                      criteria='city=test')
+    spider.spider_opened(spider)
+    return spider
+
+
+def search_response(request, web_ids):
+    body = json.dumps({'postings': [{'id': web_id} for web_id in web_ids]})
+    return TextResponse(request.url, body=body, encoding='utf-8', request=request)
+
+
+def test_last_crawls(postings_db):
+    set_last_crawl(SEARCHES, 100)
+    set_last_crawl(SEARCHES[:1], 200)
+    assert get_last_crawls(SEARCHES + ['category=none']) == {SEARCHES[0]: 200, SEARCHES[1]: 100}
+
+
+def test_searches_requested_if_modified_since_last_crawl(spider):
+    set_last_crawl(SEARCHES[:1], 0)
+    requests = list(spider.start_requests())
+    assert [request.meta['search'] for request in requests] == SEARCHES
+    assert requests[0].headers.get('If-Modified-Since') == b'Thu, 01 Jan 1970 00:00:00 GMT'
+    assert requests[1].headers.get('If-Modified-Since') is None
+    # not modified search results have no new postings
+    assert list(spider.parse(Response(requests[0].url, status=304, request=requests[0]))) == []
+
+
+def test_only_new_postings_requested(spider):
+    request = list(spider.start_requests())[0]
+    known = Posting.query.first().web_id
+    spider.known_postings.add('SEEN-1')
+    requests = list(spider.parse(search_response(request, [known, 'NEW-1', 'SEEN-1', 'NEW-2'])))
+    assert [request.url.rsplit('/', 1)[1] for request in requests] == ['NEW-1', 'NEW-2']
+    assert all(request.meta['search'] == SEARCHES[0] for request in requests)
+
+
+def test_failed_search_not_recorded(spider):
+    set_last_crawl(SEARCHES, 0)
+    requests = list(spider.start_requests())
+    spider.download_failed(types.SimpleNamespace(request=requests[1], value='timeout'))
+    spider.closed('finished')
+    assert get_last_crawls(SEARCHES) == {SEARCHES[0]: spider.started, SEARCHES[1]: 0}
+
+
+def test_no_search_recorded_if_postings_not_saved(spider):
+    set_last_crawl(SEARCHES, 0)
+    list(spider.start_requests())
+    spider.crawler.stats.set_value('posting_writer/postings_failed', 1)
+    spider.closed('finished')
+    assert get_last_crawls(SEARCHES) == {SEARCHES[0]: 0, SEARCHES[1]: 0}
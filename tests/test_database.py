@@ -0,0 +1,19 @@
+from sqlalchemy import inspect, text
+from demitaja.database import engine, upgrade_db
+from demitaja.models import tech_counts
+
+
+def get_index_names(table_name):
+    return {index['name'] for index in inspect(engine).get_indexes(table_name)}
+
+
+def test_upgrade_drops_superseded_indexes(postings_db):
+    with engine.begin() as conn:
+        conn.execute(text('CREATE INDEX ix_tech_counts_count ON tech_counts (count)'))
+    assert 'ix_tech_counts_count' in get_index_names('tech_counts')
+    assert upgrade_db() == []
+    assert 'ix_tech_counts_count' not in get_index_names('tech_counts')
+    assert get_index_names('tech_counts') == {index.name for index in tech_counts.indexes}
+    # upgrading again neither fails nor brings the index back
+    upgrade_db()
+    assert 'ix_tech_counts_count' not in get_index_names('tech_counts')
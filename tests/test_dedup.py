@@ -0,0 +1,41 @@
+from demitaja import app
+from demitaja.crawlers.dedup import BloomFilter, KnownPostings, load_known_postings
+from demitaja.utils.utils import get_known_web_ids, get_posting_web_ids
+
+
+def test_bloom_filter_never_misses():
+    bloom = BloomFilter(1000, 0.01)
+    items = ['W{}'.format(i) for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+    false_positives = sum('X{}'.format(i) in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_known_web_ids_looked_up_in_batches(postings_db):
+    stored = list(get_posting_web_ids())
+    web_ids = stored + ['NEW-{}'.format(i) for i in range(1000)]
+    assert get_known_web_ids(web_ids, batch_size=7) == set(stored)
+    assert get_known_web_ids([]) == set()
+
+
+def test_bloom_positives_confirmed(postings_db, monkeypatch):
+    monkeypatch.setitem(app.config, 'KNOWN_POSTINGS_BLOOM_THRESHOLD', 0)
+    known = load_known_postings()
+    assert not known.exact
+    stored = list(get_posting_web_ids())
+    new = ['NEW-{}'.format(i) for i in range(2000)]
+    assert known.get_new(stored + new) == new
+    known.add('NEW-1')
+    assert 'NEW-1' in known and 'NEW-2' not in known
+
+
+def test_false_positives_not_skipped(postings_db):
+    # a full filter reports every web id as stored
+    bloom = BloomFilter(1, 0.5)
+    bloom.bits = bytearray(b'\xff' * len(bloom.bits))
+    known = KnownPostings(bloom, exact=False)
+    stored = next(get_posting_web_ids())
+    assert known.get_new([stored, 'NEW-1', 'NEW-2']) == ['NEW-1', 'NEW-2']
+    assert known.confirmed == 3
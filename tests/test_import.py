@@ -0,0 +1,37 @@
+import gzip
+import json
+from demitaja import app
+from demitaja.models import Posting
+from demitaja.utils.synthetic import PostingGenerator
+
+
+def import_postings(*args):
+    return app.test_cli_runner().invoke(args=['import-postings'] + list(args))
+
+
+def test_import_postings(postings_db, tmp_path):
+    raws = list(PostingGenerator(seed=7, techs=20, cities=8).generate(8))
+    lines = [json.dumps(raw) for raw in raws[:5]]
+    del raws[5]['title']
+    # malformed, missing title and wrong type lines; blank lines are skipped
+    lines[1:1] = ['{"id": ', '', json.dumps(raws[5]), json.dumps(dict(raws[6], title=7))]
+    path = tmp_path / 'dump.jsonl'
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    gz_path = tmp_path / 'dump.jsonl.gz'
+    with gzip.open(str(gz_path), 'wt', encoding='utf-8') as f:
+        # a posting already imported and a new one
+        f.write(json.dumps(raws[0]) + '\n' + json.dumps(raws[7]) + '\n')
+    result = import_postings('--batch-size', '2', str(path), str(gz_path))
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines() == [
+        '{}: 5 postings added, 3 invalid lines [2, 4, 5]'.format(path),
+        '{}: 1 postings added, 0 invalid lines'.format(gz_path)]
+    web_ids = {web_id for web_id, in Posting.query.with_entities(Posting.web_id).filter(
+        Posting.web_id.like('SYN-7-%'))}
+    assert web_ids == {'SYN-7-{}'.format(number) for number in (0, 1, 2, 3, 4, 7)}
+
+
+def test_import_from_stdin(postings_db):
+    raw = next(PostingGenerator(seed=8, techs=20, cities=8).generate(1))
+    result = app.test_cli_runner().invoke(args=['import-postings', '-'], input=json.dumps(raw) + '\n')
+    assert result.output == '-: 1 postings added, 0 invalid lines\n'
@@ -0,0 +1,71 @@
+from sqlalchemy import func
+from demitaja.database import db_session
+from demitaja.models import (City, Posting, Salary, Technology, cities_aliases, technologies_aliases,
+                             postings_cities_assoc, postings_must_assoc, postings_nice_assoc,
+                             salary_histograms)
+from demitaja.utils.aggregates import definitions
+from demitaja.utils.synthetic import PostingGenerator
+from demitaja.utils.utils import create_postings, extract_posting
+
+# cities and technologies which are not in the synthetic postings of conftest
+NEW_CITIES = ['Gdynia', 'Sopot']
+NEW_TECHS = ['Elixir', 'Haskell']
+
+
+def get_postings(count, seed=2, cities=NEW_CITIES, techs=NEW_TECHS):
+    """Return count posting dicts of new web ids, each in one of the
+    cities and requiring one of the technologies (if given) besides the
+    synthetic ones
+    """
+    postings = []
+    for number, raw in enumerate(PostingGenerator(seed=seed, techs=20, cities=8).generate(count)):
+        if cities:
+            raw['location']['places'].append({'city': cities[number % len(cities)]})
+        if techs:
+            raw['requirements']['musts'].append({'type': 'main', 'value': techs[number % len(techs)]})
+        postings.append(extract_posting(raw, scraped=0))
+    return postings
+
+
+def count_rows(*tables):
+    return [db_session.query(func.count()).select_from(table).scalar() for table in tables]
+
+
+def snapshot():
+    """Return rows of the postings, their items, association rows,
+    aggregates and salaries: table name -> set of rows
+    """
+    tables = [Posting.__table__, City.__table__, Technology.__table__, Salary.__table__,
+              postings_cities_assoc, postings_must_assoc, postings_nice_assoc,
+              salary_histograms] + list(definitions)
+    return {table.name: set(tuple(row) for row in db_session.execute(table.select()))
+            for table in tables}
+
+
+def test_failed_batch_leaves_no_new_items(postings_db):
+    tables = (City.__table__, Technology.__table__, cities_aliases, technologies_aliases)
+    before = count_rows(*tables)
+    postings = get_postings(4)
+    # NOT NULL violation after the new items were inserted
+    postings[-1]['title'] = None
+    assert create_postings(postings, batch_size=len(postings)) == 0
+    assert count_rows(*tables) == before
+    assert not db_session.query(City).filter(City.name.in_(NEW_CITIES)).count()
+    assert not db_session.query(Technology).filter(Technology.name.in_(NEW_TECHS)).count()
+
+
+def test_failed_batch_is_rolled_back(postings_db):
+    before = snapshot()
+    postings = get_postings(5, seed=3)
+    postings[2]['title'] = None
+    assert create_postings(postings, batch_size=len(postings)) == 0
+    assert snapshot() == before
+
+
+def test_failed_batch_rolls_back_only_itself(postings_db):
+    postings = get_postings(6, seed=4, cities=(), techs=())
+    postings[4]['title'] = None
+    assert create_postings(postings, batch_size=3) == 3
+    web_ids = {web_id for web_id, in db_session.query(Posting.web_id).filter(
+        Posting.web_id.like('SYN-4-%'))}
+    assert web_ids == {posting_d['web_id'] for posting_d in postings[:3]}
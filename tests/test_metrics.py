@@ -0,0 +1,58 @@
+import re
+from demitaja import app
+from demitaja.utils.metrics import Metrics, get_samples
+
+
+def get_sample(text, name, **labels):
+    """Return value of the sample in the Prometheus text or None"""
+    label_text = ','.join('{}="{}"'.format(key, value) for key, value in sorted(labels.items()))
+    pattern = re.escape(name + ('{' + label_text + '}' if labels else '')) + r' (\S+)$'
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def test_render():
+    metrics = Metrics(prefix='test_')
+    metrics.describe('requests', 'summary', 'Requests.')
+    metrics.describe('errors_total', 'counter', 'Errors.')
+    metrics.observe('requests', 0.5, path='/a"b')
+    metrics.observe('requests', 1.5, path='/a"b')
+    metrics.inc('errors_total')
+    metrics.register(lambda: get_samples('cache_', {'hits': 3, 'size': 2}, ('hits',)))
+    assert metrics.render().splitlines() == [
+        '# HELP test_cache_hits_total ',
+        '# TYPE test_cache_hits_total untyped',
+        'test_cache_hits_total 3',
+        '# HELP test_cache_size ',
+        '# TYPE test_cache_size untyped',
+        'test_cache_size 2',
+        '# HELP test_errors_total Errors.',
+        '# TYPE test_errors_total counter',
+        'test_errors_total 1',
+        '# HELP test_requests Requests.',
+        '# TYPE test_requests summary',
+        'test_requests_count{path="/a\\"b"} 2',
+        'test_requests_sum{path="/a\\"b"} 2.0']
+
+
+def test_metrics_endpoint(client):
+    before = client.get('/metrics').get_data(as_text=True)
+    client.get('/api/techs?format=data')
+    response = client.get('/metrics')
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    labels = {'endpoint': 'api_techs', 'status': '200'}
+    assert get_sample(text, 'demitaja_http_requests_count', **labels) == \
+        (get_sample(before, 'demitaja_http_requests_count', **labels) or 0) + 1
+    assert get_sample(text, 'demitaja_sql_statements_count') > 0
+    for name in ('http_requests', 'sql_statements', 'chart_cache_hits_total', 'name_cache_hits_total'):
+        assert '# TYPE demitaja_{} '.format(name) in text
+    # every counter is named *_total
+    for name in re.findall(r'^# TYPE (\S+) counter$', text, re.MULTILINE):
+        assert name.endswith('_total')
+
+
+def test_server_timing(client, monkeypatch):
+    monkeypatch.setitem(app.config, 'SERVER_TIMING', True)
+    timing = client.get('/api/cities?format=data').headers['Server-Timing']
+    assert re.match(r'sql;dur=[\d.]+;desc="\d+ statements", render;dur=[\d.]+, total;dur=[\d.]+$', timing)
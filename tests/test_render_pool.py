@@ -0,0 +1,54 @@
+import os
+import signal
+import time
+import pytest
+from demitaja.utils import charts
+from demitaja.utils.render_pool import RenderPool, RenderError
+
+ITEMS = [('Python', 30), ('Java', 20)]
+
+
+def sleep_chart(seconds, fmt=None, dpi=None):
+    time.sleep(seconds)
+    return 'slept'
+
+
+def kill_worker(fmt=None, dpi=None):
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # the workers are forked with the test charts
+    monkeypatch.setattr(charts, 'sleep_chart', sleep_chart, raising=False)
+    monkeypatch.setattr(charts, 'kill_worker', kill_worker, raising=False)
+    pool = RenderPool(workers=1, queue_size=4, timeout=5)
+    yield pool
+    pool.shutdown()
+
+
+def test_render_in_worker(pool):
+    assert pool.render('bar_single', ITEMS, 100, fmt='data') == \
+        charts.bar_single(ITEMS, 100, fmt='data')
+    assert pool.render('bar_single', ITEMS, 100, fmt='svg').startswith('<?xml')
+
+
+def test_dead_worker_is_replaced(pool):
+    with pytest.raises(RenderError):
+        pool.render('kill_worker')
+    assert pool.render('sleep_chart', 0) == 'slept'
+
+
+def test_hung_worker_is_terminated(pool):
+    pool.timeout = 0.5
+    pool.render('sleep_chart', 0)
+    executor, context = pool.get_executor()
+    start = time.perf_counter()
+    with pytest.raises(RenderError):
+        pool.render('sleep_chart', 60)
+    assert time.perf_counter() - start < 5
+    for process in context.processes:
+        process.join(5)
+        assert not process.is_alive()
+    pool.timeout = 5
+    assert pool.render('sleep_chart', 0) == 'slept'
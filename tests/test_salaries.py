@@ -0,0 +1,49 @@
+from demitaja import app
+from demitaja.database import db_session
+from demitaja.models import Salary, postings_must_assoc
+from demitaja.utils import salaries
+from demitaja.utils.lookup import tech_cache
+
+
+def get_exact_percentiles(tech_id, employment_type, percentiles=(25, 50, 75)):
+    """Return midpoints of the normalized salaries and the exact
+    percentiles of them as picked by get_quantile_bucket
+    """
+    query = db_session.query(Salary.salary_from_norm, Salary.salary_to_norm).filter(
+        Salary.employment_type_ascii == employment_type, Salary.salary_from_norm.isnot(None))
+    if tech_id:
+        query = query.join(postings_must_assoc, postings_must_assoc.c.posting_id == Salary.posting_id)\
+            .filter(postings_must_assoc.c.must_id == tech_id)
+    values = sorted((salary_from + salary_to) / 2 for salary_from, salary_to in query)
+    return values, {p: values[int(p / 100 * (len(values) - 1))] for p in percentiles}
+
+
+def test_normalize_salary(postings_db):
+    assert salaries.normalize_salary(100, 'EUR', 'Hour') == round(100 * 4.3 * 168)
+    assert salaries.normalize_salary(100, 'XYZ', 'Month') is None
+    assert salaries.normalize_salary(100, None, None) is None
+
+
+def test_percentiles_within_error(postings_db):
+    error = app.config['SALARY_HISTOGRAM_ERROR']
+    for tech_id in (0, tech_cache.get_id('python')):
+        stats = salaries.get_percentiles(tech_id)
+        assert set(stats) == {'b2b', 'permanent'}
+        for employment_type, percentiles in stats.items():
+            values, exact = get_exact_percentiles(tech_id, employment_type)
+            assert percentiles['count'] == len(values)
+            for p, value in exact.items():
+                assert abs(percentiles['p{}'.format(p)] - value) <= error * value + 1
+
+
+def test_rebuild_matches_incremental_histograms(postings_db):
+    stats = salaries.get_percentiles()
+    salaries.rebuild_salaries()
+    assert salaries.get_percentiles() == stats
+
+
+def test_api_salaries(client):
+    data = client.get('/api/salaries?req_tech=python').get_json()
+    assert (data['tech'], data['city'], data['currency'], data['period']) == ('Python', None, 'PLN', 'month')
+    assert data['salaries'] == salaries.get_percentiles(tech_cache.get_id('python'))
+    assert client.get('/api/salaries?req_city=atlantis').status_code == 404
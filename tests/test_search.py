@@ -0,0 +1,51 @@
+from sqlalchemy import text
+from demitaja.database import db_session
+from demitaja.utils import search
+
+
+def get_web_ids(tech, city):
+    """Return web ids of the postings requiring the tech in the city"""
+    return {row[0] for row in db_session.execute(text(
+        "SELECT postings.web_id FROM postings "
+        "JOIN postings_techs_must pt ON pt.posting_id=postings.id "
+        "JOIN technologies ON technologies.id=pt.must_id "
+        "JOIN postings_cities pc ON pc.posting_id=postings.id "
+        "JOIN cities ON cities.id=pc.city_id "
+        "WHERE technologies.name_ascii=:tech AND cities.name_ascii=:city"), {'tech': tech, 'city': city})}
+
+
+def test_build_match():
+    assert search.build_match('C# "OR" node.js') == '"C" "OR" "node" "js"'
+    assert search.build_match(' !? ') is None
+
+
+def test_strip_html():
+    assert search.strip_html('<p>Python &amp;\n<b>SQL</b></p>') == 'Python & SQL'
+
+
+def test_search_filters(postings_db):
+    # every synthetic posting is looking for a developer
+    postings = search.search('looking developer', tech='python', city='krakow', limit=10000)
+    assert {posting['web_id'] for posting in postings} == get_web_ids('python', 'krakow')
+
+
+def test_search_ranks_titles_first(postings_db):
+    postings = search.search('python', limit=5)
+    assert len(postings) == 5
+    assert all('Python' in posting['title'] for posting in postings)
+    assert '<mark>' in postings[0]['snippet']
+
+
+def test_rebuilt_index_finds_the_same_postings(postings_db):
+    postings = search.search('java', limit=10000)
+    search.rebuild_index()
+    assert search.search('java', limit=10000) == postings
+
+
+def test_api_search(client):
+    first = client.get('/api/search?q=developer&per_page=5').get_json()
+    second = client.get('/api/search?q=developer&per_page=5&page=2').get_json()
+    assert first['has_next'] and len(first['postings']) == len(second['postings']) == 5
+    assert not {p['web_id'] for p in first['postings']} & {p['web_id'] for p in second['postings']}
+    assert client.get('/api/search?q=...').status_code == 400
+    assert client.get('/api/search?q=developer&req_tech=cobol').status_code == 404
@@ -0,0 +1,40 @@
+from demitaja.utils.suggest import did_you_mean, suggest
+
+
+def test_suggest_completes_words(postings_db):
+    names = [name for name_ascii, name, count in suggest('tech', 'pyt')]
+    assert names[0] == 'Python'
+
+
+def test_did_you_mean(postings_db):
+    assert did_you_mean('tech', 'pythn') == 'Python'
+    assert did_you_mean('city', 'krakuw') == 'Kraków'
+    # known names and names like no other are not suggested
+    assert did_you_mean('tech', 'python') is None
+    assert did_you_mean('tech', 'zzzzzz') is None
+
+
+def test_unknown_names_are_suggested_not_substituted(client):
+    response = client.get('/api/cities?req_tech=pythn&req_city=krakuw&format=data')
+    assert response.status_code == 200
+    assert response.get_json()['did_you_mean'] == {'tech': 'Python', 'city': 'Kraków'}
+    assert client.get('/api/trends?req_tech=pythn').status_code == 404
+
+
+def test_known_names_get_no_suggestions(client):
+    response = client.get('/api/cities?req_tech=python&req_city=krakow&format=data')
+    assert 'did_you_mean' not in response.get_json()
+
+
+def test_compare_several_known_names_gets_no_suggestions(client):
+    response = client.get('/api/compare?req_tech=python,java&req_city=krakow,warszawa&format=data')
+    assert response.status_code == 200
+    assert 'did_you_mean' not in response.get_json()
+
+
+def test_compare_reports_unknown_names(client):
+    response = client.get('/api/compare?req_tech=python,pythn,zzzzzz&format=data')
+    assert response.status_code == 404
+    message = response.get_data(as_text=True)
+    assert 'pythn (did you mean Python?)' in message
+    assert 'zzzzzz' in message
@@ -0,0 +1,43 @@
+from datetime import date, timedelta
+from demitaja.utils import trends
+from demitaja.utils.backends import sql_backend
+
+
+def test_buckets():
+    # weeks start on Monday; months roll over the year
+    assert trends.get_buckets(date(2019, 12, 4), date(2019, 12, 16), 'week') == \
+        [date(2019, 12, 2), date(2019, 12, 9), date(2019, 12, 16)]
+    assert trends.get_buckets(date(2019, 11, 30), date(2020, 1, 1), 'month') == \
+        [date(2019, 11, 1), date(2019, 12, 1), date(2020, 1, 1)]
+    for granularity in trends.GRANULARITIES:
+        buckets = trends.get_buckets(date(2019, 1, 31), date(2020, 3, 1), granularity)
+        assert trends.number_of_buckets(date(2019, 1, 31), date(2020, 3, 1), granularity) == len(buckets)
+
+
+def test_trend_adds_up_to_the_counts(postings_db):
+    oldest, newest = trends.get_date_range()
+    for granularity in trends.GRANULARITIES:
+        buckets = trends.get_trend(oldest, newest, granularity, tech='python')
+        assert sum(total for d, count, total in buckets) == sql_backend.total()
+        assert sum(count for d, count, total in buckets) == sql_backend.tech('python')[1]
+        assert all(count <= total for d, count, total in buckets)
+
+
+def test_partial_buckets_count_only_days_in_range(postings_db):
+    oldest, newest = trends.get_date_range()
+    # the oldest postings are in the first week but out of the range
+    start = oldest + timedelta(days=1)
+    daily = trends.get_trend(start, newest, 'day')
+    weekly = trends.get_trend(start, newest, 'week')
+    assert weekly[0][0] <= start
+    assert sum(total for d, count, total in weekly) == sum(total for d, count, total in daily)
+
+
+def test_api_trends(client):
+    data = client.get('/api/trends?req_tech=python&req_city=krakow&granularity=month').get_json()
+    assert (data['tech'], data['city'], data['granularity']) == ('Python', 'Kraków', 'month')
+    assert sum(bucket['count'] for bucket in data['buckets']) == \
+        sql_backend.tech_city('python', 'krakow')[2]
+    assert client.get('/api/trends?start=2019-02-01&end=2019-01-01').get_json()['buckets'] == []
+    assert client.get('/api/trends?granularity=year').status_code == 400
+    assert client.get('/api/trends?start=yesterday').status_code == 400